@@ -10,16 +10,17 @@ import os
 import sys
 import argparse
 
-from flask import current_app
-
-from beagle.beagle import beagle
+from beagle.beagle import beagle, configure
+from beagle.drivers.errors import DriverError
+from beagle.routers import RouterRegistry
+from beagle.server import serve
 from schemed_yaml_config import get_config
 
 def main():
     """
     Main function for the module.
 
-    Starts Flask servers
+    Starts the Flask development server or the production server, see beagle.server
     """
     # Parse the arguments
     parser = argparse.ArgumentParser()
@@ -30,6 +31,11 @@ def main():
         nargs='?',
         help="configuration filename (default: beagle.conf)"
     )
+    parser.add_argument(
+        "--mode",
+        choices=["development", "production"],
+        help="server to run, overrides the server mode of the configuration"
+    )
     args = parser.parse_args()
 
     # Read configuration
@@ -37,14 +43,37 @@ def main():
     schema_file = os.path.join(
         os.path.dirname(os.path.realpath(__file__)), 'configuration.yml'
     )
-    try:
+
+    def load():
         config = get_config(args.config, schema_file)
+        if args.mode:
+            config['server']['mode'] = args.mode
+        return config
+
+    try:
+        config = load()
+        if config['server']['mode'] == 'production':
+            # Workers configure themselves after the fork. Drivers are imported
+            # here to report errors early and to share the modules with the workers
+            RouterRegistry().load(config['routers'])
+        else:
+            # With debug on, the reloader runs the server in a child process
+            # and the parent only watches the files
+            configure(
+                config,
+                pollers=not config['debug'] or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+            )
     except (IOError, SyntaxError) as error:
         sys.exit(error)
+    except DriverError as error:
+        sys.exit("Unable to load driver: %s" % error.driver)
 
-    with beagle.app_context():
-        for key, value in config.items():
-            current_app.config[key] = value
+    if config['server']['mode'] == 'production':
+        try:
+            serve(load)
+        except ImportError as error:
+            sys.exit("%s, install it with: pip install beagle[production]" % error)
+        return
 
     beagle.run(
         debug=config['debug'],
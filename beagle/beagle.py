@@ -1,44 +1,97 @@
 from __future__ import absolute_import
 
 import os
+import json
 import socket
+import threading
+import time
 import ipaddress
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from datetime import datetime, timedelta
+from functools import wraps
 
-from flask import Flask, render_template_string, current_app
-from flask_restplus import Api, Resource, fields
+from flask import Flask, Response, render_template_string, current_app, g, request
+from flask_restplus import Api, Resource, fields, marshal_with
 
 from werkzeug.contrib.fixers import ProxyFix
+from werkzeug.wrappers import BaseResponse
+
+from Exscript.protocols.exception import ProtocolException, TimeoutException
 
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_limiter.errors import RateLimitExceeded
 
-from beagle.drivers import get_driver
-from beagle.drivers.errors import ConnectionError, LoginError, CommandError, DriverError
+from beagle.cache import ResponseCache
+from beagle.commands import CommandCatalogue, PLACEHOLDER
+from beagle.concurrency import ConcurrencyLimiter
+from beagle.drivers.findreplace import FindReplace
+from beagle.drivers.loopbacks import LoopbackCache
+from beagle.drivers.parsers import bgp_table_header, iter_bgp_table, iter_route_table
+from beagle.drivers.pool import SessionPool
+from beagle.drivers.errors import ConnectionError, LoginError, CommandError, DriverError, RouterBusyError
+from beagle.jobs import JobManager, QueueFullError
+from beagle.metrics import REGISTRY, Counter, Gauge, Histogram, Timer
+from beagle.poller import Poller
+from beagle.ratelimit import storage_uri
+from beagle.resolver import Resolver
+from beagle.rib import RibSnapshot
+from beagle.routers import RouterRegistry
+from beagle.runtime import private_directory, runtime_directory
+from beagle.singleflight import SingleFlight
 
 
 try:
     text = unicode
 except NameError:
-    text = str.encode
+    text = str
 
 
-def validate_address(address):
-    # Check if it's an hostname
-    try:
-        socket.gethostbyname(address)
-    # Assume it's a prefix or and address
-    except socket.gaierror:
+def validate_address(address, afi=1, timer=None):
+    """
+    Validates the address provided by the client, resolving it if it's an hostname.
+
+    Addresses and prefixes are recognized without querying the DNS. Hostnames
+    are resolved through the caching resolver, which gives up after a few seconds.
+
+    Args:
+        address: Hostname, address or prefix
+        afi: BGP AFI identifier, selects the address family of the hostname
+        timer: Timer measuring the validation as the resolve stage, if any
+
+    Returns:
+        str: The address or prefix to be sent to the router
+
+    Raises:
+        SyntaxError: The address is neither a prefix nor a resolvable hostname
+    """
+    with (timer or Timer()).stage('resolve'):
         try:
-            ipaddress.ip_network(unicode(address))
+            ipaddress.ip_network(u'%s' % address)
+            return address
         except ValueError:
-            raise SyntaxError(
-                "Unrecognized host or address: %s" % str(address)
-            )
+            pass
 
-    return True
+        family = socket.AF_INET6 if afi == 2 else socket.AF_INET
+        return resolver.resolve(address, family)
+
+def start_timer(router_id, command):
+    """
+    Returns the Timer measuring the stages of the current request.
+
+    The timer is stored in the request context too, so that marshal_or_stream()
+    can measure the marshal stage.
+
+    Args:
+        router_id: ID of the router, used as label of the histogram
+        command: Name of the command, for instance show bgp
+
+    Returns:
+        obj: The Timer object
+    """
+    g.timer = Timer(stage_duration, router=router_id, command=command)
+    return g.timer
 
 def get_limit():
     with beagle.app_context():
@@ -49,15 +102,181 @@ def get_limit_key():
         args = parser.parse_args()
         return args['id']
 
+def next_page(command):
+    """
+    Returns a function telling apart the requests of the next pages of an output, which are not rate limited.
+
+    Only cursors of existing jobs of the same command and router qualify, see paginate().
+
+    Args:
+        command: Name of the command of the endpoint, for instance show bgp
+
+    Returns:
+        function: The function, for exempt_when
+    """
+    def exempt():
+        try:
+            job_id, offset = request.args.get('cursor', '').split('.')
+            int(offset)
+            router = routers.get(int(request.args.get('id', '')))
+        except ValueError:
+            return False
+        if router is None:
+            return False
+
+        job = jobs.state(job_id)
+        return job is not None and job['command'] == command and job['router'] == router.name
+
+    return exempt
+
 
 beagle = Flask(__name__)
 beagle.wsgi_app = ProxyFix(beagle.wsgi_app)
 
-limiter = Limiter(
-    beagle,
-    key_func=get_remote_address
+# Initialized by configure(), once the storage of the counters is known
+limiter = Limiter(key_func=get_remote_address)
+
+pool = SessionPool()
+
+findreplace = FindReplace()
+
+cache = ResponseCache()
+
+singleflight = SingleFlight()
+
+concurrency = ConcurrencyLimiter()
+
+resolver = Resolver()
+
+loopbacks = LoopbackCache()
+
+poller = Poller()
+
+rib = Poller()
+
+routers = RouterRegistry()
+
+catalogue = CommandCatalogue()
+
+jobs = JobManager()
+
+# Runs the commands of all the fan-out requests, replaced by configure()
+fanout_executor = ThreadPoolExecutor(max_workers=8)
+
+coalesced_requests = Counter(
+    'beagle_coalesced_requests_total',
+    'Requests served by the execution of an identical concurrent request',
+    ('router', 'command')
 )
 
+stage_duration = Histogram(
+    'beagle_stage_duration_seconds',
+    'Time spent in each stage of the commands: resolve, queue, connect, login, '
+    'autoinit, execute, sub, parse and marshal',
+    ('router', 'command', 'stage')
+)
+
+router_errors = Counter(
+    'beagle_router_errors_total',
+    'Commands failed because of the router: ConnectionError, LoginError or CommandError',
+    ('router', 'command', 'error')
+)
+
+rate_limited_requests = Counter(
+    'beagle_rate_limited_requests_total',
+    'Requests refused by the rate limiter',
+    ('endpoint', )
+)
+
+rib_prefixes = Gauge(
+    'beagle_rib_prefixes',
+    'Prefixes in the in memory copies of the tables',
+    ('router', 'command', 'vrf', 'afi')
+)
+
+rib_memory = Gauge(
+    'beagle_rib_memory_bytes',
+    'Approximate memory used by the in memory copies of the tables',
+    ('router', 'command', 'vrf', 'afi')
+)
+
+
+def configure(config, pollers=True):
+    """
+    Loads the configuration into the application and sets up the shared objects.
+
+    Args:
+        config: Dictionary validated against configuration.yml
+        pollers: Start the pollers. False in the processes which don't serve \
+        requests, like the parent process of the reloader of the development server
+
+    Raises:
+        SyntaxError: Some findreplace rules don't compile
+        DriverError: A driver can't be loaded
+    """
+    global fanout_executor
+
+    with beagle.app_context():
+        for key, value in config.items():
+            current_app.config[key] = value
+
+    # Flask-Limiter can't be initialized twice, the storage is picked only once
+    if 'limiter' not in beagle.extensions:
+        beagle.config['RATELIMIT_STORAGE_URL'] = storage_uri(config)
+        limiter.init_app(beagle)
+
+    # The workers of the production server share the router slots, the pollers
+    # and the loopback addresses
+    shared = dict.fromkeys(('concurrency', 'poller', 'rib', 'loopbacks'))
+    if config['server']['mode'] == 'production':
+        directory = private_directory(runtime_directory(config['port']))
+        for name in shared:
+            shared[name] = private_directory(os.path.join(directory, name))
+
+    routers.load(config['routers'])
+    catalogue.load(routers, config['commands'])
+    findreplace.load(config.get('findreplace', []))
+    pool.configure(**config['pool'])
+    cache.configure(**config['cache'])
+    concurrency.configure(directory=shared['concurrency'], **config['concurrency'])
+    # Commands already submitted keep running
+    previous, fanout_executor = fanout_executor, ThreadPoolExecutor(
+        max_workers=config['fanout']['workers']
+    )
+    previous.shutdown(wait=False)
+    resolver.configure(**config['resolver'])
+    loopbacks.configure(directory=shared['loopbacks'], **config['loopbacks'])
+    jobs.configure(
+        directory=config['jobs']['directory'] or os.path.join(
+            private_directory(runtime_directory(config['port'])), 'jobs'
+        ),
+        **dict((_, config['jobs'][_]) for _ in ('workers', 'queue', 'retention'))
+    )
+
+    poller.configure(directory=shared['poller'], **dict(
+        (_, config['poller'][_]) for _ in ('interval', 'jitter', 'workers', 'max_age')
+    ))
+    if pollers and 'show bgp summary' in config['commands']:
+        poller.start([
+            (router.id, 'show bgp summary', None, vrf, afi, 1, _format)
+            for router in routers
+            for vrf in router.vrfs
+            for afi in config['poller']['afis']
+            for _format in config['poller']['formats'] if _format in router.drivers
+        ], poll_bgp_summary)
+
+    rib.configure(directory=shared['rib'], **dict(
+        (_, config['rib'][_]) for _ in ('interval', 'jitter', 'workers', 'max_age')
+    ))
+    if pollers:
+        rib.start([
+            (router.id, command, vrf, afi)
+            for router in routers if 'text/plain' in router.drivers
+            for command in config['rib']['commands'] if command in config['commands']
+            for vrf in router.vrfs
+            for afi in config['rib']['afis']
+        ], build_rib)
+
 # HTML Routes
 @beagle.route('/')
 def index_html():
@@ -74,6 +293,10 @@ def index_html():
 
     return render_template_string(content, data=data)
 
+@beagle.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 
 # Init APIs
 beagle_api = Api(
@@ -88,17 +311,37 @@ ns = beagle_api.namespace('api', description='Looking glass operations')
 
 error_model = beagle_api.model('ErrorModel', {
     'status': fields.String(default='success'),
-    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow()),
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
     'message': fields.String
 })
 
+timing_model = beagle_api.model('TimingModel', {
+    'cache': fields.String(description='HIT, MISS, BYPASS, SNAPSHOT, RIB or null'),
+    'resolve': fields.Float,
+    'queue': fields.Float,
+    'connect': fields.Float,
+    'login': fields.Float,
+    'autoinit': fields.Float,
+    'execute': fields.Float,
+    'sub': fields.Float,
+    'parse': fields.Float
+})
+
+page_model = beagle_api.model('PageModel', {
+    'cursor': fields.String(description='Pass it as cursor to receive the next page, null after the last one'),
+    'complete': fields.Boolean(description='True when the output is complete up to this page')
+})
+
 command_data_model = beagle_api.model('CommandDataModel', {
-    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow()),
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
     'runtime': fields.Float,
     'router': fields.String,
-    'output': fields.String,
+    # Text or parsed records, depending on the format
+    'output': fields.Raw,
     'format': fields.String,
-    'loopback': fields.Boolean(default=False)
+    'loopback': fields.Boolean(default=False),
+    'timing': fields.Nested(timing_model, allow_null=True),
+    'page': fields.Nested(page_model, allow_null=True)
 })
 
 command_model = beagle_api.model('CommandModel', {
@@ -108,15 +351,11 @@ command_model = beagle_api.model('CommandModel', {
 
 router_data_model = beagle_api.model('RouterDataModel', {
     'name': fields.String(),
-    'formats': fields.List(
-        fields.String(attribute=lambda _: _['format'])
-    ),
-    'vrfs': fields.List(
-        fields.String(attribute=lambda _: _['name'])
-    ),
+    'formats': fields.List(fields.String),
+    'vrfs': fields.List(fields.String),
     'location': fields.String,
     'asn': fields.Integer,
-    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow()),
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
 })
 
 router_model = beagle_api.model('RouterModel', {
@@ -126,12 +365,8 @@ router_model = beagle_api.model('RouterModel', {
 
 router_list_data_router_model = beagle_api.model('RouterListDataRouterModel', {
     'name': fields.String(),
-    'formats': fields.List(
-        fields.String(attribute=lambda _: _['format'])
-    ),
-    'vrfs': fields.List(
-        fields.String(attribute=lambda _: _['name'])
-    ),
+    'formats': fields.List(fields.String),
+    'vrfs': fields.List(fields.String),
     'location': fields.String,
     'asn': fields.Integer,
     'id': fields.Integer
@@ -141,7 +376,7 @@ router_list_data_model = beagle_api.model('RouterListDataModel', {
     'routers': fields.List(
         fields.Nested(router_list_data_router_model)
     ),
-    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow()),
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
 })
 
 router_list_model = beagle_api.model('RouterListModel', {
@@ -149,21 +384,72 @@ router_list_model = beagle_api.model('RouterListModel', {
     'data': fields.Nested(router_list_data_model)
 })
 
+command_template_model = beagle_api.model('CommandTemplateModel', {
+    'afi': fields.Integer,
+    'safi': fields.Integer,
+    'template': fields.String(description='CLI command, with {address} in place of the address')
+})
+
+router_command_plan_model = beagle_api.model('RouterCommandPlanModel', {
+    'id': fields.Integer,
+    'router': fields.String,
+    'format': fields.String,
+    'vrf': fields.String,
+    'templates': fields.List(fields.Nested(command_template_model))
+})
+
 router_command_data_model = beagle_api.model('RouterCommandDataModel', {
     'href': fields.String,
     'arguments': fields.String,
     'description': fields.String,
     'command': fields.String,
+    'plans': fields.List(fields.Nested(router_command_plan_model))
 })
 
 router_commands_data_model = beagle_api.model('RouterCommandsDataModel', {
     'commands': fields.List(fields.Nested(router_command_data_model)),
-    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow()),
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
+})
+
+router_loopbacks_data_model = beagle_api.model('RouterLoopbacksDataModel', {
+    'purged': fields.Integer,
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
+})
+
+router_loopbacks_model = beagle_api.model('RouterLoopbacksModel', {
+    'status': fields.String(default='success'),
+    'data': fields.Nested(router_loopbacks_data_model)
 })
 
 router_commands_model = beagle_api.model('RouterCommandsModel', {
     'status': fields.String(default='success'),
-    'data': fields.Nested(router_data_model)
+    'data': fields.Nested(router_commands_data_model)
+})
+
+job_data_model = beagle_api.model('JobDataModel', {
+    'id': fields.String,
+    'href': fields.String,
+    'state': fields.String(description='queued, running, success, error or fail'),
+    'message': fields.String,
+    'command': fields.String,
+    'address': fields.String,
+    'router': fields.String,
+    'format': fields.String,
+    'loopback': fields.Raw(default=False),
+    'created_at': fields.DateTime(dt_format='iso8601'),
+    'started_at': fields.DateTime(dt_format='iso8601'),
+    'finished_at': fields.DateTime(dt_format='iso8601'),
+    'runtime': fields.Float,
+    # Text written after offset, or parsed records once the job is done
+    'output': fields.Raw,
+    'offset': fields.Integer(default=0, description='Offset of the next output'),
+    'complete': fields.Boolean(default=False, description='True when the output is complete up to offset'),
+    'performed_at': fields.DateTime(dt_format='iso8601', default=datetime.utcnow),
+})
+
+job_model = beagle_api.model('JobModel', {
+    'status': fields.String(default='success'),
+    'data': fields.Nested(job_data_model)
 })
 
 
@@ -238,6 +524,26 @@ parser.add_argument(
     store_missing=True
 )
 
+parser.add_argument(
+    'stream',
+    type=int,
+    required=False,
+    location='args',
+    help='Send the output while the command runs, as Server-Sent Events if accepted by the client or as chunked plain text otherwise. (Treated as boolean)',
+    default=False,
+    store_missing=True
+)
+
+parser.add_argument(
+    'cache',
+    type=int,
+    required=False,
+    location='args',
+    help='Serve the output from the server side cache when available. A value of 0 forces the command to run on the router. (Treated as boolean)',
+    default=True,
+    store_missing=True
+)
+
 parser.add_argument(
     'format',
     type=text,
@@ -249,6 +555,123 @@ parser.add_argument(
     trim=True
 )
 
+parser.add_argument(
+    'timing',
+    type=int,
+    required=False,
+    location='args',
+    help='Add the seconds spent in each stage of the command to the response. (Treated as boolean)',
+    default=False,
+    store_missing=True
+)
+
+parser.add_argument(
+    'lines',
+    type=int,
+    required=False,
+    location='args',
+    help='Send the output in pages of up to the specified lines. The first page is sent as soon as it\'s available',
+    default=0,
+    store_missing=True
+)
+
+parser.add_argument(
+    'bytes',
+    type=int,
+    required=False,
+    location='args',
+    help='Send the output in pages of up to the specified bytes, made of whole lines',
+    default=0,
+    store_missing=True
+)
+
+parser.add_argument(
+    'cursor',
+    type=text,
+    required=False,
+    location='args',
+    help='Send the page of the output identified by the cursor returned with the previous page',
+    default=None,
+    trim=True,
+    store_missing=True
+)
+
+fanout_parser = parser.copy()
+fanout_parser.remove_argument('id')
+fanout_parser.remove_argument('stream')
+for argument in ('lines', 'bytes', 'cursor'):
+    fanout_parser.remove_argument(argument)
+fanout_parser.add_argument(
+    'ids',
+    type=str,
+    required=False,
+    location='args',
+    help='Run the command on the routers identified by these IDs (divided by comma) or on all of them',
+    default='all',
+    trim=True,
+    store_missing=True
+)
+
+job_parser = parser.copy()
+job_parser.remove_argument('stream')
+job_parser.remove_argument('cache')
+job_parser.remove_argument('timing')
+for argument in ('lines', 'bytes', 'cursor'):
+    job_parser.remove_argument(argument)
+
+batch_parser = parser.copy()
+batch_parser.remove_argument('stream')
+for argument in ('lines', 'bytes', 'cursor'):
+    batch_parser.remove_argument(argument)
+batch_parser.add_argument(
+    'addresses',
+    type=list,
+    required=True,
+    location='json',
+    help='Look these addresses up, in the same order, on a single session with the router'
+)
+
+job_output_parser = beagle_api.parser()
+job_output_parser.add_argument(
+    'offset',
+    type=int,
+    required=False,
+    location='args',
+    help='Send the output after this offset, as returned by the previous request',
+    default=0,
+    store_missing=True
+)
+
+job_output_parser.add_argument(
+    'lines',
+    type=int,
+    required=False,
+    location='args',
+    help='Send up to the specified lines of output',
+    default=0,
+    store_missing=True
+)
+
+job_output_parser.add_argument(
+    'bytes',
+    type=int,
+    required=False,
+    location='args',
+    help='Send up to the specified bytes of output, made of whole lines',
+    default=0,
+    store_missing=True
+)
+
+job_output_parser.add_argument(
+    'wait',
+    type=int,
+    required=False,
+    location='args',
+    help='Wait up to the specified seconds for new output or for the job to finish',
+    default=0,
+    store_missing=True
+)
+
 
 @beagle_api.errorhandler(ConnectionError)
 @beagle_api.errorhandler(LoginError)
@@ -261,9 +684,24 @@ def router_exceptions(error):
 def router_command_exceptions(error):
     return {'status': 'error', 'message': error}, getattr(error, 'code', 502)
 
+@beagle_api.errorhandler(RouterBusyError)
+@beagle_api.marshal_with(error_model)
+def router_busy_error(error):
+    return {'status': 'fail', 'message': error}, getattr(error, 'code', 503), {
+        'Retry-After': '%d' % error.retry_after
+    }
+
+@beagle_api.errorhandler(QueueFullError)
+@beagle_api.marshal_with(error_model)
+def queue_full_error(error):
+    return {'status': 'fail', 'message': error}, getattr(error, 'code', 503), {
+        'Retry-After': '%d' % error.retry_after
+    }
+
 @beagle_api.errorhandler(RateLimitExceeded)
 @beagle_api.marshal_with(error_model)
 def limit_exceeded_error(error):
+    rate_limited_requests.inc(endpoint=request.endpoint)
     return {'status': 'error', 'message': error}, getattr(error, 'code', 429)
 
 @beagle_api.errorhandler(SyntaxError)
@@ -272,16 +710,555 @@ def parsing_error(error):
     return {'status': 'error', 'message': error}, getattr(error, 'code', 400)
 
 
+def marshal_or_stream(model):
+    """
+    Same as ns.marshal_with() except for Response objects, which are returned as they are.
+
+    Marshalling is measured as the marshal stage of the timer of the request, if any.
+
+    Args:
+        model: The model to marshal the results with
+
+    Returns:
+        function: The decorator
+    """
+    def decorator(func):
+        documented = ns.marshal_with(model)(func)
+
+        @wraps(documented)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if isinstance(result, BaseResponse):
+                return result
+            with getattr(g, 'timer', Timer()).stage('marshal'):
+                return marshal_with(model)(lambda: result)()
+        return wrapper
+    return decorator
+
+def accepts_events():
+    """
+    Returns True if the client prefers Server-Sent Events over plain text.
+    """
+    mimetype = request.accept_mimetypes.best_match(['text/plain', 'text/event-stream'])
+    return mimetype == 'text/event-stream'
+
+def sse_event(data, name=None):
+    """
+    Returns data formatted as a Server-Sent Event.
+
+    Args:
+        data: The payload of the event. It can span multiple lines
+        name: The name of the event, if any
+
+    Returns:
+        str: The event
+    """
+    lines = ['data: %s' % _ for _ in data.split('\n')]
+    if name:
+        lines.insert(0, 'event: %s' % name)
+    return '\n'.join(lines) + '\n\n'
+
+def stream(key, device, method, *args):
+    """
+    Returns a Response sending the output of a driver method while it runs.
+
+    Output is sent as Server-Sent Events when the client accepts them, as
+    chunked plain text otherwise. Errors are sent as an "error" event or as
+    a final line respectively.
+
+    Args:
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+        device: The driver object. It must not be opened yet
+        method: Name of the driver method, for instance ping
+        *args: Arguments for the method
+
+    Returns:
+        obj: The Response object
+
+    Raises:
+        SyntaxError: The driver returns parsed records, which can't be streamed
+    """
+    if device.structured:
+        raise SyntaxError("Streaming is not available for format: %s" % key[6])
+
+    events = accepts_events()
+
+    # Busy routers are reported before the response starts
+    acquired = concurrency.acquire(key[0])
+    released = threading.Lock()
+    started = threading.Event()
+
+    def release():
+        if acquired and released.acquire(False):
+            concurrency.release(key[0])
+
+    def close():
+        # The command keeps running after the client goes away, it releases
+        # the router once it's done. It doesn't start if the client goes away
+        # before the first chunk
+        if not started.is_set():
+            release()
+
+    def generate():
+        if events:
+            yield ': %s\n\n' % method
+        # No chunk is sent until the command starts, the client can't go away in between
+        started.set()
+        try:
+            for line in device.stream(method, *args, done=release):
+                yield sse_event(line) if events else line + '\n'
+        except CommandError as error:
+            router_errors.inc(router=key[0], command=key[1], error=type(error).__name__)
+            # The output of the device has been streamed already
+            if events:
+                yield sse_event(str(error), 'error')
+        except (ConnectionError, LoginError, SyntaxError) as error:
+            if not isinstance(error, SyntaxError):
+                router_errors.inc(router=key[0], command=key[1], error=type(error).__name__)
+            yield sse_event(str(error), 'error') if events else str(error) + '\n'
+        except Exception:
+            beagle.logger.exception('Streaming %s failed on %s', key[1], key[0])
+            yield sse_event('Internal Server Error', 'error') if events else 'Internal Server Error\n'
+
+    response = Response(
+        generate(),
+        mimetype='text/event-stream' if events else 'text/plain',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Prevents reverse proxies from buffering the response
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    response.call_on_close(close)
+
+    return response
+
+def add_timing(data, timer, headers, args):
+    """
+    Adds the execution timestamp, the runtime and, if asked, the timing breakdown to the data of a response.
+
+    Outputs served from the cache or from the snapshots were performed Age seconds ago.
+
+    Args:
+        data: The data dictionary of the response
+        timer: Timer of the command
+        headers: Headers returned by execute()
+        args: Parsed arguments of the request
+
+    Returns:
+        dict: The data dictionary
+    """
+    data['performed_at'] = datetime.utcfromtimestamp(timer.timestamp) - \
+        timedelta(seconds=int(headers.get('Age', 0)))
+    data['runtime'] = timer.elapsed()
+    if args['timing']:
+        data['timing'] = dict(timer.stages, cache=headers.get('X-Cache'))
+    return data
+
+def get_device(router, args, timer=None, command=None):
+    """
+    Returns the driver object for the router and the format requested by the client.
+
+    Args:
+        router: Router object from the registry
+        args: Parsed arguments of the request
+        timer: Timer measuring the stages of the command, if any
+        command: Name of the command, selects the maximum size of the output. \
+        None means no limit
+
+    Returns:
+        obj: The driver object, not opened yet
+    """
+    with beagle.app_context():
+        config = current_app.config
+
+    try:
+        driver = router.drivers[args['format']]
+    except KeyError:
+        raise SyntaxError("Invalid format: %(format)s" % args)
+
+    return driver(
+        args['format'],
+        hostname=router.address,
+        username=config['username'],
+        password=config['password'],
+        findreplace=findreplace,
+        timeout=args['runtime'],
+        transport=router.transport,
+        pool=pool,
+        loopbacks=loopbacks,
+        timer=timer,
+        max_output=config['output']['max_size'].get(command, 0)
+    )
+
+def get_loopback(router, vrf):
+    """
+    Returns the name of the loopback interface of the router for the VRF.
+
+    Args:
+        router: Router object from the registry
+        vrf: Name of the VRF
+
+    Returns:
+        str: Name of the interface
+    """
+    try:
+        return router.loopbacks[vrf]
+    except KeyError:
+        raise SyntaxError(
+            "Invalid vrf table name: %s" % vrf
+        )
+
+def cache_bypassed(args):
+    """
+    Returns True when the client asked not to be served from the response cache.
+
+    That is when the cache argument is 0 or when the client sends "Cache-Control: no-cache".
+
+    Args:
+        args: Parsed arguments of the request
+    """
+    return not args['cache'] or 'no-cache' in request.headers.get('Cache-Control', '')
+
+def poll_bgp_summary(key):
+    """
+    Refreshes the BGP summary identified by key. Called by the poller.
+
+    Args:
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+
+    Returns:
+        The output of the command
+    """
+    with beagle.app_context():
+        config = current_app.config
+
+    device = get_device(
+        routers.get(key[0]), {'format': key[6], 'runtime': config['runtime']['max']},
+        Timer(stage_duration, router=key[0], command=key[1]), key[1]
+    )
+    output, _ = execute(key, device, 'show_bgp_summary', key[3], key[4], key[5], bypass=True)
+    return output
+
+def build_rib(key):
+    """
+    Builds the in memory copy of a table. Called by the rib poller.
+
+    Args:
+        key: Tuple identifying the table: (router id, command, vrf, afi)
+
+    Returns:
+        obj: The RibSnapshot object
+    """
+    with beagle.app_context():
+        config = current_app.config
+
+    router_id, command, vrf, afi = key
+    device = get_device(
+        routers.get(router_id), {'format': 'text/plain', 'runtime': config['rib']['runtime']},
+        Timer(stage_duration, router=router_id, command=command)
+    )
+
+    acquired = concurrency.acquire(router_id)
+    try:
+        with device:
+            if command == 'show route':
+                output = device.show_route_table(vrf, afi)
+            else:
+                output = device.show_bgp_table(vrf, afi)
+    finally:
+        if acquired:
+            concurrency.release(router_id)
+
+    if command == 'show route':
+        snapshot = RibSnapshot(iter_route_table(output))
+    else:
+        snapshot = RibSnapshot(iter_bgp_table(output), bgp_table_header(output))
+    del output
+
+    rib_prefixes.set(snapshot.prefixes, router=router_id, command=command, vrf=vrf, afi=afi)
+    rib_memory.set(snapshot.memory, router=router_id, command=command, vrf=vrf, afi=afi)
+    return snapshot
+
+def lookup_rib(key):
+    """
+    Answers show route and show bgp from the in memory copy of the table, if any.
+
+    Args:
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+
+    Returns:
+        tuple: The text of the entry with the longest prefix covering the address \
+        and its age in seconds. (None, None) if there is no copy of the table
+    """
+    if key[1] not in ('show route', 'show bgp') or key[5] != 1 or key[6] != 'text/plain':
+        return None, None
+
+    snapshot, age = rib.get((key[0], key[1], key[3], key[4]))
+    if snapshot is None:
+        return None, None
+
+    _, text = snapshot.lookup(key[2])
+    if text is None:
+        text = '% Network not in table'
+    elif snapshot.header:
+        text = snapshot.header + '\n' + text
+    return findreplace.sub(text), age
+
+def lookup(key, bypass=False):
+    """
+    Returns the output identified by key from the poller snapshots, from the
+    in memory copies of the tables or from the response cache, if any.
+
+    Args:
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+        bypass: Don't serve the output from the snapshots and from the response cache
+
+    Returns:
+        tuple: The output, None when the command must run on the router, and \
+        a dictionary of headers for the response
+    """
+    if not bypass:
+        output, age = poller.get(key)
+        if output is not None:
+            return output, {'X-Cache': 'SNAPSHOT', 'Age': '%d' % age}
+        output, age = lookup_rib(key)
+        if output is not None:
+            return output, {'X-Cache': 'RIB', 'Age': '%d' % age}
+
+    headers = {}
+    if cache.cacheable(key):
+        if bypass:
+            headers['X-Cache'] = 'BYPASS'
+        else:
+            output, age = cache.get(key)
+            if output is not None:
+                return output, {'X-Cache': 'HIT', 'Age': '%d' % age}
+            headers['X-Cache'] = 'MISS'
+
+    return None, headers
+
+def execute(key, device, method, *args, **kwargs):
+    """
+    Runs a driver method, serving its output from the poller snapshots, from the
+    in memory copies of the tables or from the response cache when possible.
+
+    Concurrent requests with the same key share a single execution on the router.
+
+    Args:
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+        device: The driver object. It must not be opened yet
+        method: Name of the driver method, for instance show_bgp
+        *args: Arguments for the method
+        bypass: Don't serve the output from the snapshots and from the response cache. \
+        It's stored in the cache anyway
+
+    Returns:
+        tuple: The output and a dictionary of headers for the response
+    """
+    output, headers = lookup(key, kwargs.get('bypass', False))
+    if output is not None:
+        return output, headers
+
+    def run():
+        with device.timer.stage('queue'):
+            acquired = concurrency.acquire(key[0])
+        try:
+            with device:
+                output = getattr(device, method)(*args)
+        except (ConnectionError, LoginError, CommandError) as error:
+            router_errors.inc(router=key[0], command=key[1], error=type(error).__name__)
+            raise
+        finally:
+            if acquired:
+                concurrency.release(key[0])
+        cache.set(key, output)
+        return output
+
+    output, shared = singleflight.do(key, run)
+    if shared:
+        coalesced_requests.inc(router=key[0], command=key[1])
+
+    return output, headers
+
+def run_job(key, device, method, *args):
+    """
+    Returns a function running a driver method as a job. See JobManager.submit()
+
+    Text is written to the job while the device sends it, parsed records are
+    stored once the command is done.
+
+    Args:
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+        device: The driver object. It must not be opened yet
+        method: Name of the driver method, for instance traceroute
+        *args: Arguments for the method
+
+    Returns:
+        function: The function
+    """
+    def run(job):
+        try:
+            if device.structured:
+                # Errors are counted by execute()
+                output, _ = execute(key, device, method, *args, bypass=True)
+                return {'state': 'success', 'output': output}
+
+            with device.timer.stage('queue'):
+                acquired = concurrency.acquire(key[0])
+            try:
+                for line in device.stream(method, *args):
+                    job.write(line)
+            except (ConnectionError, LoginError, CommandError) as error:
+                router_errors.inc(router=key[0], command=key[1], error=type(error).__name__)
+                raise
+            finally:
+                if acquired:
+                    concurrency.release(key[0])
+        except RouterBusyError as error:
+            return {
+                'state': 'fail', 'message': str(error), 'error': type(error).__name__,
+                'retry_after': error.retry_after
+            }
+        except (ConnectionError, LoginError) as error:
+            return {'state': 'fail', 'message': str(error), 'error': type(error).__name__}
+        except (CommandError, SyntaxError) as error:
+            return {'state': 'error', 'message': str(error)}
+        return {'state': 'success'}
+
+    return run
+
+def paginated(args):
+    """
+    Returns True when the client asked for the output in pages.
+
+    Args:
+        args: Parsed arguments of the request
+    """
+    if args['lines'] < 0 or args['bytes'] < 0:
+        raise SyntaxError("Invalid page size: %(lines)d lines, %(bytes)d bytes" % args)
+    return bool(args['lines'] or args['bytes'] or args['cursor'])
+
+def paginate(args, router, key, device, method, *arguments):
+    """
+    Returns a page of the output of a driver method.
+
+    Without a cursor the method runs as a job, see run_job(), and the first page
+    is returned as soon as it's available. Requests wait for a page for up to
+    max_wait seconds of the jobs section, then return what's available. Outputs available from the snapshots,
+    the in memory tables or the response cache are copied to a job instead.
+    The cursor returned with each page selects the next one, which is read from
+    the output kept by the job.
+
+    Args:
+        args: Parsed arguments of the request
+        router: Router object from the registry
+        key: Tuple identifying the output: (router id, command, address, vrf, afi, safi, format)
+        device: The driver object. It must not be opened yet
+        method: Name of the driver method, for instance show_bgp
+        *arguments: Arguments for the method
+
+    Returns:
+        tuple: The result, the status code and the headers
+    """
+    if device.structured:
+        raise SyntaxError("Pagination is not available for format: %(format)s" % args)
+    if args['stream']:
+        raise SyntaxError("Pagination is not available for streamed outputs")
+
+    headers = {}
+    if args['cursor']:
+        try:
+            job_id, offset = args['cursor'].split('.')
+            offset = int(offset)
+        except ValueError:
+            raise SyntaxError("Invalid cursor: %(cursor)s" % args)
+    else:
+        output = None
+        if not cache_bypassed(args):
+            output, found = lookup(key)
+            if output is not None:
+                headers = found
+
+        if output is None:
+            function = run_job(key, device, method, *arguments)
+        else:
+            def function(job):
+                for line in output.splitlines():
+                    job.write(line)
+                return {'state': 'success'}
+
+        job = jobs.submit(
+            function, command=key[1], address=key[2], router=router.name, format=args['format']
+        )
+        job_id, offset = job['id'], 0
+
+    with beagle.app_context():
+        wait = min(args['runtime'], current_app.config['jobs']['max_wait'])
+
+    job = jobs.get(job_id, offset, wait, args['lines'], args['bytes'])
+    if job is None or job['command'] != key[1] or job['router'] != router.name:
+        beagle_api.abort(404, "Invalid cursor: %s" % args['cursor'])
+    if job['state'] == 'error' and job['complete']:
+        raise CommandError(router.name, job['message'])
+    if job['state'] == 'fail' and job['complete']:
+        # Same status as the outputs which are not paged
+        if job.get('error') == 'RouterBusyError':
+            raise RouterBusyError(router.name, job['retry_after'])
+        if job.get('error') == 'LoginError':
+            raise LoginError(router.name)
+        raise ConnectionError(router.name)
+
+    data = {
+        'router': router.name,
+        'format': args['format'],
+        'output': job['output'],
+        'loopback': key[7] if len(key) > 7 else False,
+        'performed_at': datetime.utcfromtimestamp(job['started'] or job['created']) - \
+            timedelta(seconds=int(headers.get('Age', 0))),
+        'page': {
+            'cursor': None if job['complete'] else '%s.%d' % (job['id'], job['offset']),
+            'complete': job['complete']
+        }
+    }
+    if job['finished'] is not None and job['started'] is not None:
+        data['runtime'] = job['finished'] - job['started']
+
+    return {'status': 'success', 'data': data}, 200, headers
+
+def job_data(job):
+    """
+    Returns the data of a response about a job.
+
+    Args:
+        job: The state of the job, as returned by JobManager
+
+    Returns:
+        dict: The data dictionary
+    """
+    data = dict(job, href=beagle_api.url_for(JobById, job_id=job['id']))
+    for attribute in ('created', 'started', 'finished'):
+        if job[attribute] is not None:
+            data['%s_at' % attribute] = datetime.utcfromtimestamp(job[attribute])
+    if job['started'] is not None and job['finished'] is not None:
+        data['runtime'] = job['finished'] - job['started']
+    return data
+
+
 @ns.route('/v1/ping/<address>')
 class Ping(Resource):
-    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+    decorators = [
+        limiter.limit(get_limit, key_func=get_limit_key, exempt_when=next_page('ping')),
+        limiter.limit(get_limit, exempt_when=next_page('ping'))
+    ]
     @ns.expect(parser)
-    @ns.marshal_with(command_model)
+    @marshal_or_stream(command_model)
     def get(self, address):
         '''
         :raises Error when the request can't be fulfilled
         '''
         args = parser.parse_args()
+        timer = start_timer(args['id'], 'ping')
         with beagle.app_context():
             config = current_app.config
 
@@ -289,66 +1266,59 @@ class Ping(Resource):
             beagle_api.abort(404, "Command disabled")
 
         # Validate input
-        validate_address(address)
+        address = validate_address(address, args['afi'], timer)
 
         if args['runtime'] > config['runtime']['max'] or \
             args['runtime'] < config['runtime']['min']:
             raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
 
-        try:
-            router = config['routers'][args['id']-1]
-        except IndexError:
+        router = routers.get(args['id'])
+        if router is None:
             raise SyntaxError("Invalid router id: %(id)d" % args)
+        catalogue.template(router.id, args['format'], args['vrf'], 'ping', args['afi'], args['safi'])
 
         loopback = False
         if args['loopback']:
-            try:
-                loopback = next(iter(([_['loopback'] for _ in router['vrfs'] if _['name'] == args['vrf']])))
-            except (IndexError, StopIteration):
-                raise SyntaxError(
-                    "Invalid vrf table name: %(vrf)s" % args
-                )
-
-        findreplace = []
-        if 'findreplace' in config:
-            findreplace = config['findreplace']
-
-        driver_name = next(iter(_['driver'] for _ in router['formats'] if args['format'] == _['format']))
-        driver = get_driver(driver_name)
-        if not driver:
-            raise DriverError(driver_name)
-        with driver(
-            'text/plain',
-            hostname=router['address'],
-            username=config['username'],
-            password=config['password'],
-            findreplace=findreplace,
-            timeout=args['runtime'],
-            transport=router['transport']
-        ) as device:
-            output = device.ping(address, args['vrf'], args['afi'], args['safi'], loopback)
+            loopback = get_loopback(router, args['vrf'])
+
+        key = (args['id'], 'ping', address, args['vrf'], args['afi'], args['safi'], args['format'], loopback)
+        device = get_device(router, args, timer, key[1])
+        if paginated(args):
+            return paginate(args, router, key, device, 'ping', address, args['vrf'], args['afi'], args['safi'], loopback)
+        if args['stream']:
+            return stream(key, device, 'ping', address, args['vrf'], args['afi'], args['safi'], loopback)
+
+        output, headers = execute(
+            key, device, 'ping', address, args['vrf'], args['afi'], args['safi'], loopback,
+            bypass=cache_bypassed(args)
+        )
 
         result = {
             'status': 'success',
             'data': {
-                'router': router['name'],
+                'router': router.name,
                 'format': args['format'],
                 'output': output,
                 'loopback': loopback
             }
         }
-        return result
+        add_timing(result['data'], timer, headers, args)
+        return result, 200, headers
 
 @ns.route('/v1/traceroute/<address>')
 class Traceroute(Resource):
-    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+    decorators = [
+        limiter.limit(get_limit, key_func=get_limit_key, exempt_when=next_page('traceroute')),
+        limiter.limit(get_limit, exempt_when=next_page('traceroute'))
+    ]
     @ns.expect(parser)
-    @ns.marshal_with(command_model)
+    @marshal_or_stream(command_model)
     def get(self, address):
         '''
         :raises Error when the request can't be fulfilled
         '''
         args = parser.parse_args()
+        timer = start_timer(args['id'], 'traceroute')
         with beagle.app_context():
             config = current_app.config
 
@@ -356,67 +1326,60 @@ class Traceroute(Resource):
             beagle_api.abort(404, "Command disabled")
 
         # Validate input
-        validate_address(address)
+        address = validate_address(address, args['afi'], timer)
 
         if args['runtime'] > config['runtime']['max'] or \
             args['runtime'] < config['runtime']['min']:
             raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
 
-        try:
-            router = config['routers'][args['id']-1]
-        except IndexError:
+        router = routers.get(args['id'])
+        if router is None:
             raise SyntaxError("Invalid router id: %(id)d" % args)
-
-        findreplace = []
-        if 'findreplace' in config:
-            findreplace = config['findreplace']
+        catalogue.template(router.id, args['format'], args['vrf'], 'traceroute', args['afi'], args['safi'])
 
         loopback = False
         if args['loopback']:
-            try:
-                loopback = next(iter(([_['loopback'] for _ in router['vrfs'] if _['name'] == args['vrf']])))
-            except (IndexError, StopIteration):
-                raise SyntaxError(
-                    "Invalid vrf table name: %(vrf)s" % args
-                )
-
-        driver_name = next(iter(_['driver'] for _ in router['formats'] if args['format'] == _['format']))
-        driver = get_driver(driver_name)
-        if not driver:
-            raise DriverError(driver_name)
-        with driver(
-            'text/plain',
-            hostname=router['address'],
-            username=config['username'],
-            password=config['password'],
-            findreplace=findreplace,
-            timeout=args['runtime'],
-            transport=router['transport']
-        ) as device:
-            output = device.traceroute(address, args['vrf'], args['afi'], args['safi'], loopback)
+            loopback = get_loopback(router, args['vrf'])
+
+        key = (args['id'], 'traceroute', address, args['vrf'], args['afi'], args['safi'], args['format'], loopback)
+        device = get_device(router, args, timer, key[1])
+        if paginated(args):
+            return paginate(args, router, key, device, 'traceroute', address, args['vrf'], args['afi'], args['safi'], loopback)
+        if args['stream']:
+            return stream(key, device, 'traceroute', address, args['vrf'], args['afi'], args['safi'], loopback)
+
+        output, headers = execute(
+            key, device, 'traceroute', address, args['vrf'], args['afi'], args['safi'], loopback,
+            bypass=cache_bypassed(args)
+        )
 
         result = {
             'status': 'success',
             'data': {
-                'router': router['name'],
+                'router': router.name,
                 'format': args['format'],
                 'output': output,
                 'loopback': loopback
             }
         }
-        return result
+        add_timing(result['data'], timer, headers, args)
+        return result, 200, headers
 
 @ns.route('/v1/show/route/<address>')
 @ns.route('/v1/show/route/<path:address>')
 class ShowRoute(Resource):
-    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+    decorators = [
+        limiter.limit(get_limit, key_func=get_limit_key, exempt_when=next_page('show route')),
+        limiter.limit(get_limit, exempt_when=next_page('show route'))
+    ]
     @ns.expect(parser)
-    @ns.marshal_with(command_model)
+    @marshal_or_stream(command_model)
     def get(self, address):
         '''
         :raises Error when the request can't be fulfilled
         '''
         args = parser.parse_args()
+        timer = start_timer(args['id'], 'show route')
         with beagle.app_context():
             config = current_app.config
 
@@ -424,56 +1387,54 @@ class ShowRoute(Resource):
             beagle_api.abort(404, "Command disabled")
 
         # Validate input
-        validate_address(address)
+        address = validate_address(address, args['afi'], timer)
 
         if args['runtime'] > config['runtime']['max'] or \
             args['runtime'] < config['runtime']['min']:
             raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
 
-        try:
-            router = config['routers'][args['id']-1]
-        except IndexError:
+        router = routers.get(args['id'])
+        if router is None:
             raise SyntaxError("Invalid router id: %(id)d" % args)
+        catalogue.template(router.id, args['format'], args['vrf'], 'show route', args['afi'], args['safi'])
+
+        key = (args['id'], 'show route', address, args['vrf'], args['afi'], args['safi'], args['format'])
+        device = get_device(router, args, timer, key[1])
+        if paginated(args):
+            return paginate(args, router, key, device, 'show_route', address, args['vrf'], args['afi'], args['safi'])
+        if args['stream']:
+            return stream(key, device, 'show_route', address, args['vrf'], args['afi'], args['safi'])
 
-        findreplace = []
-        if 'findreplace' in config:
-            findreplace = config['findreplace']
-
-        driver_name = next(iter(_['driver'] for _ in router['formats'] if args['format'] == _['format']))
-        driver = get_driver(driver_name)
-        if not driver:
-            raise DriverError(driver_name)
-        with driver(
-            'text/plain',
-            hostname=router['address'],
-            username=config['username'],
-            password=config['password'],
-            findreplace=findreplace,
-            timeout=args['runtime'],
-            transport=router['transport']
-        ) as device:
-            output = device.show_route(address, args['vrf'], args['afi'], args['safi'])
+        output, headers = execute(
+            key, device, 'show_route', address, args['vrf'], args['afi'], args['safi'],
+            bypass=cache_bypassed(args)
+        )
 
         result = {
             'status': 'success',
             'data': {
-                'router': router['name'],
+                'router': router.name,
                 'format': args['format'],
                 'output': output
             }
         }
-        return result
+        add_timing(result['data'], timer, headers, args)
+        return result, 200, headers
 
 @ns.route('/v1/show/bgp/summary')
 class ShowBgpSummary(Resource):
-    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+    decorators = [
+        limiter.limit(get_limit, key_func=get_limit_key, exempt_when=next_page('show bgp summary')),
+        limiter.limit(get_limit, exempt_when=next_page('show bgp summary'))
+    ]
     @ns.expect(parser)
-    @ns.marshal_with(command_model)
+    @marshal_or_stream(command_model)
     def get(self):
         '''
         :raises Error when the request can't be fulfilled
         '''
         args = parser.parse_args()
+        timer = start_timer(args['id'], 'show bgp summary')
         with beagle.app_context():
             config = current_app.config
 
@@ -484,50 +1445,48 @@ class ShowBgpSummary(Resource):
             args['runtime'] < config['runtime']['min']:
             raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
 
-        try:
-            router = config['routers'][args['id']-1]
-        except IndexError:
+        router = routers.get(args['id'])
+        if router is None:
             raise SyntaxError("Invalid router id: %(id)d" % args)
+        catalogue.template(router.id, args['format'], args['vrf'], 'show bgp summary', args['afi'], args['safi'])
+
+        key = (args['id'], 'show bgp summary', None, args['vrf'], args['afi'], args['safi'], args['format'])
+        device = get_device(router, args, timer, key[1])
+        if paginated(args):
+            return paginate(args, router, key, device, 'show_bgp_summary', args['vrf'], args['afi'], args['safi'])
+        if args['stream']:
+            return stream(key, device, 'show_bgp_summary', args['vrf'], args['afi'], args['safi'])
 
-        findreplace = []
-        if 'findreplace' in config:
-            findreplace = config['findreplace']
-
-        driver_name = next(iter(_['driver'] for _ in router['formats'] if args['format'] == _['format']))
-        driver = get_driver(driver_name)
-        if not driver:
-            raise DriverError(driver_name)
-        with driver(
-            'text/plain',
-            hostname=router['address'],
-            username=config['username'],
-            password=config['password'],
-            findreplace=findreplace,
-            timeout=args['runtime'],
-            transport=router['transport']
-        ) as device:
-            output = device.show_bgp_summary(args['vrf'], args['afi'], args['safi'])
+        output, headers = execute(
+            key, device, 'show_bgp_summary', args['vrf'], args['afi'], args['safi'],
+            bypass=cache_bypassed(args)
+        )
 
         result = {
             'status': 'success',
             'data': {
-                'router': router['name'],
+                'router': router.name,
                 'format': args['format'],
                 'output': output
             }
         }
-        return result
+        add_timing(result['data'], timer, headers, args)
+        return result, 200, headers
 
 @ns.route('/v1/show/bgp/neighbors/<address>')
 class ShowBgpNeighbors(Resource):
-    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+    decorators = [
+        limiter.limit(get_limit, key_func=get_limit_key, exempt_when=next_page('show bgp neighbors')),
+        limiter.limit(get_limit, exempt_when=next_page('show bgp neighbors'))
+    ]
     @ns.expect(parser)
-    @ns.marshal_with(command_model)
+    @marshal_or_stream(command_model)
     def get(self, address):
         '''
         :raises Error when the request can't be fulfilled
         '''
         args = parser.parse_args()
+        timer = start_timer(args['id'], 'show bgp neighbors')
         with beagle.app_context():
             config = current_app.config
 
@@ -535,57 +1494,55 @@ class ShowBgpNeighbors(Resource):
             beagle_api.abort(404, "Command disabled")
 
         # Validate input
-        validate_address(address)
+        address = validate_address(address, args['afi'], timer)
 
         if args['runtime'] > config['runtime']['max'] or \
             args['runtime'] < config['runtime']['min']:
             raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
 
-        try:
-            router = config['routers'][args['id']-1]
-        except IndexError:
+        router = routers.get(args['id'])
+        if router is None:
             raise SyntaxError("Invalid router id: %(id)d" % args)
+        catalogue.template(router.id, args['format'], args['vrf'], 'show bgp neighbors', args['afi'], args['safi'])
 
-        findreplace = []
-        if 'findreplace' in config:
-            findreplace = config['findreplace']
-
-        driver_name = next(iter(_['driver'] for _ in router['formats'] if args['format'] == _['format']))
-        driver = get_driver(driver_name)
-        if not driver:
-            raise DriverError(driver_name)
-        with driver(
-            'text/plain',
-            hostname=router['address'],
-            username=config['username'],
-            password=config['password'],
-            findreplace=findreplace,
-            timeout=args['runtime'],
-            transport=router['transport']
-        ) as device:
-            output = device.show_bgp_neighbors(address, args['vrf'], args['afi'], args['safi'])
+        key = (args['id'], 'show bgp neighbors', address, args['vrf'], args['afi'], args['safi'], args['format'])
+        device = get_device(router, args, timer, key[1])
+        if paginated(args):
+            return paginate(args, router, key, device, 'show_bgp_neighbors', address, args['vrf'], args['afi'], args['safi'])
+        if args['stream']:
+            return stream(key, device, 'show_bgp_neighbors', address, args['vrf'], args['afi'], args['safi'])
+
+        output, headers = execute(
+            key, device, 'show_bgp_neighbors', address, args['vrf'], args['afi'], args['safi'],
+            bypass=cache_bypassed(args)
+        )
 
         result = {
             'status': 'success',
             'data': {
-                'router': router['name'],
+                'router': router.name,
                 'format': args['format'],
                 'output': output
             }
         }
-        return result
+        add_timing(result['data'], timer, headers, args)
+        return result, 200, headers
 
 @ns.route('/v1/show/bgp/<address>')
 @ns.route('/v1/show/bgp/<path:address>')
 class ShowBgp(Resource):
-    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+    decorators = [
+        limiter.limit(get_limit, key_func=get_limit_key, exempt_when=next_page('show bgp')),
+        limiter.limit(get_limit, exempt_when=next_page('show bgp'))
+    ]
     @ns.expect(parser)
-    @ns.marshal_with(command_model)
+    @marshal_or_stream(command_model)
     def get(self, address):
         '''
         :raises Error when the request can't be fulfilled
         '''
         args = parser.parse_args()
+        timer = start_timer(args['id'], 'show bgp')
         with beagle.app_context():
             config = current_app.config
 
@@ -593,60 +1550,528 @@ class ShowBgp(Resource):
             beagle_api.abort(404, "Command disabled")
 
         # Validate input
-        validate_address(address)
+        address = validate_address(address, args['afi'], timer)
 
         if args['runtime'] > config['runtime']['max'] or \
             args['runtime'] < config['runtime']['min']:
             raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
 
-        try:
-            router = config['routers'][args['id']-1]
-        except IndexError:
+        router = routers.get(args['id'])
+        if router is None:
             raise SyntaxError("Invalid router id: %(id)d" % args)
+        catalogue.template(router.id, args['format'], args['vrf'], 'show bgp', args['afi'], args['safi'])
+
+        key = (args['id'], 'show bgp', address, args['vrf'], args['afi'], args['safi'], args['format'])
+        device = get_device(router, args, timer, key[1])
+        if paginated(args):
+            return paginate(args, router, key, device, 'show_bgp', address, args['vrf'], args['afi'], args['safi'])
+        if args['stream']:
+            return stream(key, device, 'show_bgp', address, args['vrf'], args['afi'], args['safi'])
 
-        findreplace = []
-        if 'findreplace' in config:
-            findreplace = config['findreplace']
-
-        driver_name = next(iter(_['driver'] for _ in router['formats'] if args['format'] == _['format']))
-        driver = get_driver(driver_name)
-        if not driver:
-            raise DriverError(driver_name)
-        with driver(
-            'text/plain',
-            hostname=router['address'],
-            username=config['username'],
-            password=config['password'],
-            findreplace=findreplace,
-            timeout=args['runtime'],
-            transport=router['transport']
-        ) as device:
-            output = device.show_bgp(address, args['vrf'], args['afi'], args['safi'])
+        output, headers = execute(
+            key, device, 'show_bgp', address, args['vrf'], args['afi'], args['safi'],
+            bypass=cache_bypassed(args)
+        )
 
         result = {
             'status': 'success',
             'data': {
-                'router': router['name'],
+                'router': router.name,
                 'format': args['format'],
                 'output': output
             }
         }
+        add_timing(result['data'], timer, headers, args)
+        return result, 200, headers
+
+class FanOut(Resource):
+    """
+    Base class for the resources running a command on several routers in parallel.
+
+    Results are streamed as soon as each router is done, one JSON object per line
+    or one Server-Sent Event each, if accepted by the client.
+    The runtime argument is the deadline for the whole request: the commands
+    get the time left as timeout, those not started yet are dropped. The
+    commands of all the requests share a pool of fanout workers.
+    """
+    decorators = [limiter.limit(get_limit)]
+
+    def fanout(self, command, method, address=None):
+        """
+        Runs a driver method on the routers selected by the ids argument.
+
+        Args:
+            command: Name of the command, for instance show bgp
+            method: Name of the driver method, for instance show_bgp
+            address: The address argument of the method, if any
+
+        Returns:
+            obj: The Response object
+        """
+        args = fanout_parser.parse_args()
+        # Driver stages are measured per router, below
+        timer = start_timer('fanout', command)
+        with beagle.app_context():
+            config = current_app.config
+
+        if command not in config['commands']:
+            beagle_api.abort(404, "Command disabled")
+
+        # Validate input
+        if address is not None:
+            address = validate_address(address, args['afi'], timer)
+
+        if args['runtime'] > config['runtime']['max'] or \
+            args['runtime'] < config['runtime']['min']:
+            raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
+
+        selected = list(routers)
+        if args['ids'] != 'all':
+            try:
+                selected = [routers.get(int(_)) for _ in args['ids'].split(',')]
+            except ValueError:
+                raise SyntaxError("Invalid router ids: %(ids)s" % args)
+            if None in selected:
+                raise SyntaxError("Invalid router ids: %(ids)s" % args)
+
+        bypass = cache_bypassed(args)
+        events = accepts_events()
+        deadline = time.time() + args['runtime']
+
+        def expired(router):
+            return {
+                'id': router.id,
+                'router': router.name,
+                'format': args['format'],
+                'status': 'fail',
+                'message': 'Runtime limit exceeded'
+            }
+
+        def run(router):
+            result = {'id': router.id, 'router': router.name, 'format': args['format']}
+            timer = Timer(stage_duration, router=router.id, command=command)
+            remaining = int(deadline - time.time())
+            if remaining < 1:
+                return expired(router)
+            try:
+                catalogue.template(router.id, args['format'], args['vrf'], command, args['afi'], args['safi'])
+                arguments = [args['vrf'], args['afi'], args['safi']]
+                if address is not None:
+                    arguments.insert(0, address)
+                if method in ('ping', 'traceroute'):
+                    loopback = False
+                    if args['loopback']:
+                        loopback = get_loopback(router, args['vrf'])
+                    arguments.append(loopback)
+                    result['loopback'] = loopback
+                key = (router.id, command, address, args['vrf'], args['afi'], args['safi'], args['format'])
+                if method in ('ping', 'traceroute'):
+                    key += (loopback, )
+                device = get_device(router, dict(args, runtime=remaining), timer, command)
+                result['output'], headers = execute(key, device, method, *arguments, bypass=bypass)
+                add_timing(result, timer, headers, args)
+                result['performed_at'] = result['performed_at'].isoformat()
+                result['status'] = 'success'
+            except (ConnectionError, LoginError, DriverError, RouterBusyError) as error:
+                result.update({'status': 'fail', 'message': str(error)})
+            except (CommandError, SyntaxError) as error:
+                result.update({'status': 'error', 'message': str(error)})
+            except Exception:
+                # A single router must not break the whole response
+                beagle.logger.exception('Fan-out %s failed on %s', command, router.name)
+                result.update({'status': 'fail', 'message': 'Internal Server Error'})
+            return result
+
+        def encode(result):
+            data = json.dumps(result)
+            return sse_event(data) if events else data + '\n'
+
+        def generate():
+            futures = dict((fanout_executor.submit(run, router), router) for router in selected)
+            pending = set(futures)
+            try:
+                for future in as_completed(futures, timeout=max(deadline - time.time(), 0)):
+                    pending.discard(future)
+                    yield encode(future.result())
+            except FutureTimeoutError:
+                for future in pending:
+                    if future.done():
+                        yield encode(future.result())
+                        continue
+                    # Running commands stop on their own, they got the time left as timeout
+                    future.cancel()
+                    yield encode(expired(futures[future]))
+            finally:
+                # The client went away
+                for future in pending:
+                    future.cancel()
+            if events:
+                yield sse_event(str(len(futures)), 'end')
+
+        return Response(
+            generate(),
+            mimetype='text/event-stream' if events else 'application/x-ndjson',
+            headers={
+                'Cache-Control': 'no-cache',
+                # Prevents reverse proxies from buffering the response
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+@ns.route('/v1/fanout/ping/<address>')
+class FanOutPing(FanOut):
+    @ns.expect(fanout_parser)
+    def get(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.fanout('ping', 'ping', address)
+
+@ns.route('/v1/fanout/traceroute/<address>')
+class FanOutTraceroute(FanOut):
+    @ns.expect(fanout_parser)
+    def get(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.fanout('traceroute', 'traceroute', address)
+
+@ns.route('/v1/fanout/show/route/<address>')
+@ns.route('/v1/fanout/show/route/<path:address>')
+class FanOutShowRoute(FanOut):
+    @ns.expect(fanout_parser)
+    def get(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.fanout('show route', 'show_route', address)
+
+@ns.route('/v1/fanout/show/bgp/summary')
+class FanOutShowBgpSummary(FanOut):
+    @ns.expect(fanout_parser)
+    def get(self):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.fanout('show bgp summary', 'show_bgp_summary')
+
+@ns.route('/v1/fanout/show/bgp/neighbors/<address>')
+class FanOutShowBgpNeighbors(FanOut):
+    @ns.expect(fanout_parser)
+    def get(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.fanout('show bgp neighbors', 'show_bgp_neighbors', address)
+
+@ns.route('/v1/fanout/show/bgp/<address>')
+@ns.route('/v1/fanout/show/bgp/<path:address>')
+class FanOutShowBgp(FanOut):
+    @ns.expect(fanout_parser)
+    def get(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.fanout('show bgp', 'show_bgp', address)
+
+class Batch(Resource):
+    """
+    Base class for the resources looking several addresses up on the same router.
+
+    Addresses are validated before connecting to the router, then looked up on
+    a single session, in chunks of commands sent at once when the driver
+    supports pipelining. Results are streamed as soon as each chunk is done, one
+    JSON object per line or one Server-Sent Event each, if accepted by the
+    client. Errors of the router about an address don't stop the batch.
+    """
+    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+
+    def batch(self, command, method):
+        """
+        Runs a driver method for each address of the request.
+
+        Args:
+            command: Name of the command, for instance show bgp
+            method: Name of the driver method, for instance show_bgp
+
+        Returns:
+            obj: The Response object
+        """
+        args = batch_parser.parse_args()
+        # Driver stages are measured per address, below
+        timer = start_timer(args['id'], command)
+        with beagle.app_context():
+            config = current_app.config
+
+        if command not in config['commands']:
+            beagle_api.abort(404, "Command disabled")
+
+        # Validate input
+        if not args['addresses']:
+            raise SyntaxError("No addresses")
+        if len(args['addresses']) > config['batch']['max_addresses']:
+            raise SyntaxError("Too many addresses: %d" % len(args['addresses']))
+
+        if args['runtime'] > config['runtime']['max'] or \
+            args['runtime'] < config['runtime']['min']:
+            raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
+
+        router = routers.get(args['id'])
+        if router is None:
+            raise SyntaxError("Invalid router id: %(id)d" % args)
+        template = catalogue.template(router.id, args['format'], args['vrf'], command, args['afi'], args['safi'])
+
+        addresses = [
+            (address, validate_address(address, args['afi'], timer))
+            for address in [text(_).strip() for _ in args['addresses']]
+        ]
+
+        device = get_device(router, args, None, command)
+        bypass = cache_bypassed(args)
+        events = accepts_events()
+
+        # Busy routers are reported before the response starts
+        acquired = concurrency.acquire(router.id)
+        released = threading.Lock()
+
+        def release():
+            if acquired and released.acquire(False):
+                concurrency.release(router.id)
+
+        def run(chunk):
+            # Returns the output, or the error, and the headers for each address of the chunk
+            keys = [
+                (router.id, command, address, args['vrf'], args['afi'], args['safi'], args['format'])
+                for address in chunk
+            ]
+            found = [lookup(key, bypass) for key in keys]
+            pending = [index for index, (output, _) in enumerate(found) if output is None]
+            if not pending:
+                return found
+
+            if device.structured:
+                outputs = list()
+                for index in pending:
+                    try:
+                        outputs.append(getattr(device, method)(chunk[index], args['vrf'], args['afi'], args['safi']))
+                    except CommandError as error:
+                        outputs.append(error)
+            else:
+                # The commands of the chunk are pipelined when the driver supports it
+                outputs = device.run_many([template.replace(PLACEHOLDER, chunk[_]) for _ in pending])
+
+            for index, output in zip(pending, outputs):
+                if isinstance(output, CommandError):
+                    router_errors.inc(router=router.id, command=command, error=type(output).__name__)
+                else:
+                    cache.set(keys[index], output)
+                found[index] = (output, found[index][1])
+            return found
+
+        def encode(result):
+            data = json.dumps(result)
+            return sse_event(data) if events else data + '\n'
+
+        def generate():
+            # Once the router can't be reached the remaining addresses are not tried
+            failure = None
+            size = config['batch']['pipeline']
+            try:
+                with device.session():
+                    for offset in range(0, len(addresses), size):
+                        chunk = addresses[offset:offset + size]
+                        timer = Timer(stage_duration, router=router.id, command=command)
+                        device.timer = timer
+                        try:
+                            if failure is not None:
+                                raise failure
+                            found = run([resolved for _, resolved in chunk])
+                        except (ConnectionError, LoginError) as error:
+                            if failure is None:
+                                router_errors.inc(router=router.id, command=command, error=type(error).__name__)
+                            failure = error
+                            found = [(error, None)] * len(chunk)
+                        except SyntaxError as error:
+                            found = [(error, None)] * len(chunk)
+                        except ProtocolException as error:
+                            # The session has been dropped, the next chunk runs on a new one
+                            router_errors.inc(router=router.id, command=command, error=type(error).__name__)
+                            found = [(error, None)] * len(chunk)
+                        except Exception:
+                            # A single chunk must not break the whole response
+                            beagle.logger.exception('Batch %s failed on %s', command, router.name)
+                            found = [(None, None)] * len(chunk)
+
+                        for (address, _), (output, headers) in zip(chunk, found):
+                            result = {'address': address, 'router': router.name, 'format': args['format']}
+                            if isinstance(output, (ConnectionError, LoginError)):
+                                result.update({'status': 'fail', 'message': str(output)})
+                            elif isinstance(output, TimeoutException):
+                                result.update({'status': 'fail', 'message': 'Runtime limit exceeded'})
+                            elif isinstance(output, ProtocolException):
+                                result.update({'status': 'fail', 'message': str(output) or type(output).__name__})
+                            elif isinstance(output, (CommandError, SyntaxError)):
+                                result.update({'status': 'error', 'message': str(output)})
+                            elif output is None:
+                                result.update({'status': 'fail', 'message': 'Internal Server Error'})
+                            else:
+                                result['output'] = output
+                                add_timing(result, timer, headers, args)
+                                result['performed_at'] = result['performed_at'].isoformat()
+                                result['status'] = 'success'
+                            yield encode(result)
+            finally:
+                release()
+            if events:
+                yield sse_event(str(len(addresses)), 'end')
+
+        response = Response(
+            generate(),
+            mimetype='text/event-stream' if events else 'application/x-ndjson',
+            headers={
+                'Cache-Control': 'no-cache',
+                # Prevents reverse proxies from buffering the response
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        # The generator doesn't run if the client goes away before the first chunk
+        response.call_on_close(release)
+
+        return response
+
+@ns.route('/v1/batch/show/route')
+class BatchShowRoute(Batch):
+    @ns.expect(batch_parser)
+    def post(self):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.batch('show route', 'show_route')
+
+@ns.route('/v1/batch/show/bgp')
+class BatchShowBgp(Batch):
+    @ns.expect(batch_parser)
+    def post(self):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.batch('show bgp', 'show_bgp')
+
+class JobSubmit(Resource):
+    """
+    Base class for the resources running a command as a job.
+
+    The job is queued and its ID returned at once, the output is read from
+    JobById while the command runs.
+    """
+    decorators = [limiter.limit(get_limit, key_func=get_limit_key), limiter.limit(get_limit)]
+
+    def submit(self, command, method, address):
+        """
+        Queues a job running a driver method on the router selected by the id argument.
+
+        Args:
+            command: Name of the command, for instance traceroute
+            method: Name of the driver method, for instance traceroute
+            address: The address argument of the method
+
+        Returns:
+            tuple: The result, the status code and the headers
+        """
+        args = job_parser.parse_args()
+        timer = start_timer(args['id'], command)
+        with beagle.app_context():
+            config = current_app.config
+
+        if command not in config['commands']:
+            beagle_api.abort(404, "Command disabled")
+
+        # Validate input
+        address = validate_address(address, args['afi'], timer)
+
+        if args['runtime'] > config['runtime']['max'] or \
+            args['runtime'] < config['runtime']['min']:
+            raise SyntaxError("Invalid runtime value: %(runtime)d" % args)
+
+        router = routers.get(args['id'])
+        if router is None:
+            raise SyntaxError("Invalid router id: %(id)d" % args)
+        catalogue.template(router.id, args['format'], args['vrf'], command, args['afi'], args['safi'])
+
+        loopback = False
+        if args['loopback']:
+            loopback = get_loopback(router, args['vrf'])
+
+        key = (args['id'], command, address, args['vrf'], args['afi'], args['safi'], args['format'], loopback)
+        # The timer of the request is done once the job is queued
+        device = get_device(router, args, Timer(stage_duration, router=args['id'], command=command), command)
+        job = jobs.submit(
+            run_job(key, device, method, address, args['vrf'], args['afi'], args['safi'], loopback),
+            command=command, address=address, router=router.name, format=args['format'], loopback=loopback
+        )
+
+        result = {
+            'status': 'success',
+            'data': job_data(job)
+        }
+        return result, 202, {'Location': result['data']['href']}
+
+@ns.route('/v1/jobs/ping/<address>')
+class JobPing(JobSubmit):
+    @ns.expect(job_parser)
+    @ns.marshal_with(job_model, code=202)
+    def post(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.submit('ping', 'ping', address)
+
+@ns.route('/v1/jobs/traceroute/<address>')
+class JobTraceroute(JobSubmit):
+    @ns.expect(job_parser)
+    @ns.marshal_with(job_model, code=202)
+    def post(self, address):
+        '''
+        :raises Error when the request can't be fulfilled
+        '''
+        return self.submit('traceroute', 'traceroute', address)
+
+@ns.route('/v1/jobs/<job_id>')
+class JobById(Resource):
+    @ns.expect(job_output_parser)
+    @ns.marshal_with(job_model)
+    def get(self, job_id):
+        '''
+        Returns the state of the job and the output written after offset
+        '''
+        args = job_output_parser.parse_args()
+        with beagle.app_context():
+            config = current_app.config
+
+        if args['offset'] < 0:
+            raise SyntaxError("Invalid offset value: %(offset)d" % args)
+        if args['wait'] < 0 or args['wait'] > config['jobs']['max_wait']:
+            raise SyntaxError("Invalid wait value: %(wait)d" % args)
+
+        job = jobs.get(job_id, args['offset'], args['wait'])
+        if job is None:
+            beagle_api.abort(404, "Invalid job id: %s" % job_id)
+
+        result = {
+            'status': 'success',
+            'data': job_data(job)
+        }
+
         return result
 
 @ns.route('/v1/routers')
 class RouterList(Resource):
     @ns.marshal_with(router_list_model)
     def get(self):
-        with beagle.app_context():
-            routers = current_app.config['routers']
-
-        for _ in range(len(routers)):
-            routers[_]['id'] = _ + 1
-
         result = {
             'status': 'success',
             'data': {
-                'routers': routers
+                'routers': [_._asdict() for _ in routers]
             }
         }
 
@@ -656,25 +2081,50 @@ class RouterList(Resource):
 class RouterById(Resource):
     @ns.marshal_with(router_model)
     def get(self, id):
-        with beagle.app_context():
-            routers = current_app.config['routers']
+        router = routers.get(id)
+        if router is None:
+            beagle_api.abort(404, "Invalid router id: %d" % id)
 
-        try:
-            data = routers[id-1]
-            data['id'] = id
-        except IndexError:
+        result = {
+            'status': 'success',
+            'data': router._asdict()
+        }
+
+        return result
+
+@ns.route('/v1/routers/<int:id>/loopbacks')
+class RouterLoopbacks(Resource):
+    decorators = [limiter.limit(get_limit)]
+    @ns.marshal_with(router_loopbacks_model)
+    def delete(self, id):
+        '''
+        Drops the cached loopback addresses, so that they are looked up again on next use
+        '''
+        router = routers.get(id)
+        if router is None:
             beagle_api.abort(404, "Invalid router id: %d" % id)
 
         result = {
             'status': 'success',
-            'data': data
+            'data': {
+                'purged': loopbacks.purge(router.address)
+            }
         }
 
         return result
 
-# TODO
 @ns.route('/v1/commands')
 class CommandsList(Resource):
     @ns.marshal_with(router_commands_model)
     def get(self):
-        beagle_api.abort(501, "Not Implemented YET!")
\ No newline at end of file
+        '''
+        Returns the enabled commands and the CLI commands they run on each router
+        '''
+        result = {
+            'status': 'success',
+            'data': {
+                'commands': catalogue.commands
+            }
+        }
+
+        return result
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+In memory cache for the output of the commands.
+"""
+
+from __future__ import absolute_import
+
+import json
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class ResponseCache(object):
+    """
+    Thread safe LRU cache with per command TTL and bounded memory usage.
+
+    Keys are tuples whose second item is the command, for instance:
+    (router id, command, address, vrf, afi, safi, format)
+
+    Attributes:
+        size: Maximum size in bytes of the cached outputs, 0 disables the cache
+        ttl: Dictionary mapping commands to the seconds their outputs are cached for
+        usage: Current size in bytes of the cached outputs
+    """
+    def __init__(self, size=0, ttl=None):
+        """
+        Init method of the Class.
+
+        Args:
+            size: Maximum size in bytes of the cached outputs, 0 disables the cache
+            ttl: Dictionary mapping commands to the seconds their outputs are cached for
+        """
+        self.size = size
+        self.ttl = ttl or {}
+        self.usage = 0
+
+        self._lock = threading.Lock()
+        # key: (expiration timestamp, creation timestamp, size, value)
+        self._items = OrderedDict()
+
+    def configure(self, size=0, ttl=None):
+        """
+        Changes the cache settings and drops the cached items.
+
+        Args:
+            size: Maximum size in bytes of the cached outputs, 0 disables the cache
+            ttl: Dictionary mapping commands to the seconds their outputs are cached for
+        """
+        with self._lock:
+            self.size = size
+            self.ttl = ttl or {}
+            self._items.clear()
+            self.usage = 0
+
+    def cacheable(self, key):
+        """
+        Returns True if the output for key is going to be cached.
+
+        Args:
+            key: The tuple identifying the output
+        """
+        return self.size > 0 and self.ttl.get(key[1], 0) > 0
+
+    def get(self, key):
+        """
+        Returns the cached output for key.
+
+        Args:
+            key: The tuple identifying the output
+
+        Returns:
+            tuple: The output and its age in seconds. (None, None) if not found
+        """
+        now = time.time()
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None, None
+            expiration, creation, size, value = item
+            if expiration <= now:
+                self.usage -= size
+                return None, None
+            # Most recently used items are on the right
+            self._items[key] = item
+
+        return value, now - creation
+
+    def set(self, key, value):
+        """
+        Stores the output for key, evicting the least recently used items if needed.
+
+        Args:
+            key: The tuple identifying the output
+            value: The output of the command, either text or parsed records
+        """
+        if not self.cacheable(key):
+            return
+
+        # Parsed records are accounted for as much as their JSON encoding
+        if not isinstance(value, (bytes, type(u''))):
+            size = len(json.dumps(value))
+        else:
+            size = len(value)
+        size += sum(len(str(_)) for _ in key)
+        if size > self.size:
+            return
+
+        now = time.time()
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.usage -= old[2]
+            while self._items and self.usage + size > self.size:
+                _, item = self._items.popitem(last=False)
+                self.usage -= item[2]
+            self._items[key] = (now + self.ttl[key[1]], now, size, value)
+            self.usage += size
@@ -0,0 +1,189 @@
+"""
+Catalogue of the commands the routers can run.
+
+The catalogue is built once per configuration. For each router, format, VRF
+and enabled command it holds the CLI command of every supported AFI/SAFI pair,
+with {address} in place of the address. Commands are rendered by the drivers
+themselves, so that the catalogue can't drift from what the routers run.
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+
+# Name: (driver method, takes an address, href, description)
+COMMANDS = OrderedDict([
+    ('ping', (
+        'ping', True, '/api/v1/ping/{address}',
+        'Sends ICMP echo requests to the address'
+    )),
+    ('traceroute', (
+        'traceroute', True, '/api/v1/traceroute/{address}',
+        'Traces the path towards the address'
+    )),
+    ('show route', (
+        'show_route', True, '/api/v1/show/route/{address}',
+        'Looks the address up in the routing table'
+    )),
+    ('show bgp summary', (
+        'show_bgp_summary', False, '/api/v1/show/bgp/summary',
+        'Shows the state of the BGP sessions'
+    )),
+    ('show bgp neighbors', (
+        'show_bgp_neighbors', True, '/api/v1/show/bgp/neighbors/{address}',
+        'Shows the state of the BGP session with the neighbor'
+    )),
+    ('show bgp', (
+        'show_bgp', True, '/api/v1/show/bgp/{address}',
+        'Looks the address up in the BGP table'
+    ))
+])
+
+# AFI/SAFI pairs the drivers are asked for
+AFI_SAFI = ((1, 1), (1, 2), (2, 1), (2, 2))
+
+PLACEHOLDER = '{address}'
+
+
+class _Rendered(Exception):
+    """
+    Interrupts a driver method once it has rendered its command.
+    """
+    def __init__(self, command):
+        super(_Rendered, self).__init__(command)
+        self.command = command
+
+
+def render(driver, _format, method, vrf, afi, safi, address=True):
+    """
+    Returns the CLI command a driver method runs, without running it.
+
+    Args:
+        driver: Primary class of the driver
+        _format: Format of the driver
+        method: Name of the driver method, for instance show_bgp
+        vrf: Name of the VRF
+        afi: BGP AFI identifier
+        safi: BGP SAFI identifier
+        address: The method takes an address, replaced by PLACEHOLDER
+
+    Returns:
+        str: The command, None if the method doesn't run any
+
+    Raises:
+        SyntaxError: The driver doesn't support the AFI/SAFI pair
+    """
+    def run(command, **kwargs):
+        raise _Rendered(command)
+
+    device = driver(_format)
+    device.run = run
+
+    args = [vrf, afi, safi]
+    if address:
+        args.insert(0, PLACEHOLDER)
+    try:
+        getattr(device, method)(*args)
+    except _Rendered as rendered:
+        return rendered.command
+    return None
+
+
+class CommandCatalogue(object):
+    """
+    Immutable catalogue of the commands, indexed by router, format, VRF and command.
+
+    Loading a new configuration swaps the whole catalogue at once, like RouterRegistry.
+
+    Attributes:
+        commands: List of dictionaries describing the enabled commands and their templates
+    """
+    def __init__(self):
+        """
+        Init method of the Class.
+        """
+        self.commands = list()
+        self._routers = dict()
+        self._templates = dict()
+
+    def load(self, routers, commands):
+        """
+        Renders the templates of the commands for the routers.
+
+        Args:
+            routers: RouterRegistry object
+            commands: Names of the enabled commands
+        """
+        router_ids = dict()
+        templates = dict()
+        catalogue = list()
+        for command in commands:
+            if command not in COMMANDS:
+                continue
+            method, address, href, description = COMMANDS[command]
+            plans = list()
+            for router in routers:
+                router_ids[router.id] = router
+                for _format in router.formats:
+                    for vrf in router.vrfs:
+                        rendered = OrderedDict()
+                        for afi, safi in AFI_SAFI:
+                            try:
+                                template = render(
+                                    router.drivers[_format], _format, method, vrf, afi, safi, address
+                                )
+                            except SyntaxError:
+                                continue
+                            if template is not None:
+                                rendered[(afi, safi)] = template
+                        templates[(router.id, _format, vrf, command)] = rendered
+                        plans.append({
+                            'id': router.id,
+                            'router': router.name,
+                            'format': _format,
+                            'vrf': vrf,
+                            'templates': [
+                                {'afi': afi, 'safi': safi, 'template': template}
+                                for (afi, safi), template in rendered.items()
+                            ]
+                        })
+            catalogue.append({
+                'command': command,
+                'href': href,
+                'arguments': 'address' if address else None,
+                'description': description,
+                'plans': plans
+            })
+
+        self._routers, self._templates, self.commands = router_ids, templates, catalogue
+
+    def template(self, router_id, _format, vrf, command, afi, safi):
+        """
+        Returns the CLI command run by the router, with {address} in place of the address.
+
+        Args:
+            router_id: Identifier of the router
+            _format: Format of the output
+            vrf: Name of the VRF
+            command: Name of the command, for instance show bgp
+            afi: BGP AFI identifier
+            safi: BGP SAFI identifier
+
+        Returns:
+            str: The template
+
+        Raises:
+            SyntaxError: The router doesn't support the format, the VRF or the AFI/SAFI pair
+        """
+        templates = self._templates.get((router_id, _format, vrf, command))
+        if templates is None:
+            router = self._routers.get(router_id)
+            if router is not None and _format not in router.formats:
+                raise SyntaxError("Invalid format: %s" % _format)
+            raise SyntaxError("Invalid vrf table name: %s" % vrf)
+
+        try:
+            return templates[(afi, safi)]
+        except KeyError:
+            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
@@ -0,0 +1,218 @@
+"""
+Per router cap of the commands running at the same time.
+
+Each process queues its own commands. When the processes of the production
+server share a directory, a command also takes one of the limit slot files of
+the router in there, so that the cap applies to the whole server rather than
+to each worker.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import os
+import threading
+import time
+
+from collections import deque
+
+from beagle.drivers.errors import RouterBusyError
+from beagle.metrics import Counter, Gauge, Histogram
+from beagle.runtime import lock_file
+
+
+active_commands = Gauge(
+    'beagle_router_active_commands',
+    'Commands running on the router',
+    ('router', )
+)
+
+queue_depth = Gauge(
+    'beagle_router_queue_depth',
+    'Commands waiting for the router to be available',
+    ('router', )
+)
+
+queue_wait = Histogram(
+    'beagle_router_queue_wait_seconds',
+    'Time spent waiting for the router to be available',
+    ('router', )
+)
+
+rejected_commands = Counter(
+    'beagle_router_rejected_commands_total',
+    'Commands rejected because the router was busy',
+    ('router', )
+)
+
+# Seconds between attempts to take a slot file held by other processes
+SLOT_POLL = 0.05
+
+
+class _Router(object):
+    """
+    State of a router.
+    """
+    def __init__(self):
+        self.active = 0
+        self.waiters = deque()
+        # Descriptors of the slot files held by the commands
+        self.slots = []
+
+
+class ConcurrencyLimiter(object):
+    """
+    Thread safe limiter of the commands running at the same time on each router.
+
+    Commands in excess wait in a bounded FIFO queue. When the queue is full,
+    or the wait is too long, RouterBusyError is raised.
+
+    Attributes:
+        limit: Maximum amount of commands running on each router, 0 disables the limiter
+        queue: Maximum amount of commands waiting for each router
+        wait: Maximum amount of seconds a command waits in the queue
+        retry: Seconds the client is asked to wait before retrying
+        directory: Private directory of the slot files shared with the other \
+        processes, None limits the commands of this process only
+    """
+    def __init__(self, limit=0, queue=0, wait=30, retry=5, directory=None):
+        """
+        Init method of the Class.
+
+        Args:
+            limit: Maximum amount of commands running on each router, 0 disables the limiter
+            queue: Maximum amount of commands waiting for each router
+            wait: Maximum amount of seconds a command waits in the queue
+            retry: Seconds the client is asked to wait before retrying
+            directory: Private directory of the slot files shared with the other processes
+        """
+        self.limit = limit
+        self.queue = queue
+        self.wait = wait
+        self.retry = retry
+        self.directory = directory
+
+        self._lock = threading.Lock()
+        self._routers = dict()
+
+    def configure(self, limit=0, queue=0, wait=30, retry=5, directory=None):
+        """
+        Changes the limiter settings.
+
+        Args:
+            limit: Maximum amount of commands running on each router, 0 disables the limiter
+            queue: Maximum amount of commands waiting for each router
+            wait: Maximum amount of seconds a command waits in the queue
+            retry: Seconds the client is asked to wait before retrying
+            directory: Private directory of the slot files shared with the other processes
+        """
+        with self._lock:
+            self.limit = limit
+            self.queue = queue
+            self.wait = wait
+            self.retry = retry
+            self.directory = directory
+
+    def acquire(self, key):
+        """
+        Waits for the router to be available.
+
+        Args:
+            key: Identifier of the router
+
+        Returns:
+            bool: True if a slot has been acquired and must be released, \
+            False if the limiter is disabled
+
+        Raises:
+            RouterBusyError: The queue is full or the wait was too long
+        """
+        if self.limit <= 0:
+            return False
+
+        start = time.time()
+        with self._lock:
+            router = self._routers.setdefault(key, _Router())
+            if router.active < self.limit:
+                router.active += 1
+                active_commands.set(router.active, router=key)
+                waiter = None
+            elif len(router.waiters) >= self.queue:
+                rejected_commands.inc(router=key)
+                raise RouterBusyError(key, self.retry)
+            else:
+                waiter = threading.Event()
+                router.waiters.append(waiter)
+                queue_depth.set(len(router.waiters), router=key)
+
+        if waiter is not None:
+            waiter.wait(self.wait)
+
+            with self._lock:
+                # The slot may have been handed over after the timeout expired
+                if not waiter.is_set():
+                    router.waiters.remove(waiter)
+                    queue_depth.set(len(router.waiters), router=key)
+                    rejected_commands.inc(router=key)
+                    raise RouterBusyError(key, self.retry)
+
+        directory = self.directory
+        if directory is not None:
+            try:
+                slot = self._lock_slot(directory, key, start + self.wait)
+            except Exception:
+                self._hand_over(key)
+                raise
+            if slot is None:
+                self._hand_over(key)
+                rejected_commands.inc(router=key)
+                raise RouterBusyError(key, self.retry)
+            with self._lock:
+                router.slots.append(slot)
+
+        queue_wait.observe(time.time() - start, router=key)
+        return True
+
+    def _lock_slot(self, directory, key, deadline):
+        """
+        Takes one of the slot files of the router, waiting for the other processes until deadline.
+
+        Returns:
+            int: The descriptor holding the slot. None if the wait was too long
+        """
+        name = hashlib.sha1(('%s' % key).encode('utf-8')).hexdigest()
+        while True:
+            for index in range(self.limit):
+                slot = lock_file(os.path.join(directory, '%s-%d' % (name, index)))
+                if slot is not None:
+                    return slot
+            if time.time() >= deadline:
+                return None
+            time.sleep(SLOT_POLL)
+
+    def release(self, key):
+        """
+        Frees the slot, handing it over to the first command in the queue if any.
+
+        Args:
+            key: Identifier of the router
+        """
+        with self._lock:
+            router = self._routers[key]
+            slot = router.slots.pop() if router.slots else None
+        if slot is not None:
+            os.close(slot)
+        self._hand_over(key)
+
+    def _hand_over(self, key):
+        """
+        Hands the slot of this process over to the first command in the queue, or frees it.
+        """
+        with self._lock:
+            router = self._routers[key]
+            if router.waiters:
+                router.waiters.popleft().set()
+                queue_depth.set(len(router.waiters), router=key)
+            else:
+                router.active -= 1
+                active_commands.set(router.active, router=key)
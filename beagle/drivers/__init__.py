@@ -12,18 +12,70 @@ from __future__ import absolute_import
 import importlib
 import re
 import sys
+import threading
 
-try:
-    from StringIO import StringIO # Python 2
-except ImportError:
-    from io import StringIO # Python 3
+from contextlib import contextmanager
 
 from Exscript import Account
 from Exscript.protocols import SSH2
 from Exscript.protocols import Telnet
-from Exscript.protocols.exception import InvalidCommandException, DriverReplacedException
+from Exscript.protocols.exception import InvalidCommandException, DriverReplacedException, \
+    ExpectCancelledException
 
-from beagle.drivers.errors import CommandError, ConnectionError, LoginError
+from beagle.drivers.errors import CommandError, ConnectionError, DriverError, LoginError
+from beagle.drivers.findreplace import FindReplace
+from beagle.drivers.stream import StreamBuffer
+from beagle.metrics import Gauge, Timer
+
+
+open_sessions = Gauge(
+    'beagle_router_sessions',
+    'Authenticated sessions open towards the devices',
+    ('host', )
+)
+
+# Last line of the outputs cut at max_output
+TRUNCATED = '%% Output truncated after %d characters'
+
+
+# Module name: primary class
+_drivers = dict()
+_drivers_lock = threading.Lock()
+
+
+def load_driver(name, _format=None):
+    """
+    Imports the module identified by the name argument and registers its primary class.
+
+    The module must define the primary class and a FORMATS dictionary mapping
+    formats to BeagleDriver subclasses defined in the module.
+
+    Args:
+        name: The name of the module
+        _format: Format the module must support, if any
+
+    Returns:
+        obj: The primary class of the module
+
+    Raises:
+        DriverError: The module can't be imported or is not a valid driver
+    """
+    try:
+        module = importlib.import_module(name)
+        obj = getattr(module, name.split('.')[-1].upper())
+        formats = [getattr(module, _) for _ in module.FORMATS.values()]
+    except Exception:
+        raise DriverError(name)
+
+    if not callable(obj) or not formats or \
+        not all(isinstance(_, type) and issubclass(_, BeagleDriver) for _ in formats):
+        raise DriverError(name)
+    if _format is not None and _format not in module.FORMATS:
+        raise DriverError(name)
+
+    with _drivers_lock:
+        _drivers[name] = obj
+    return obj
 
 
 def get_driver(name):
@@ -32,6 +84,7 @@ def get_driver(name):
 
     Primary classes are usually functions that return a Class on a per format basis.
     For a definition of "format", please take a look at RFC6838.
+    Modules are imported the first time only, see load_driver().
 
     Args:
         name: The name of the module
@@ -41,11 +94,13 @@ def get_driver(name):
         obj: The primary class of the module
     """
     try:
-        module = importlib.import_module(name)
-        class_name = name.split('.')[-1].upper()
-        obj = getattr(module, class_name)
-        return obj
-    except Exception:
+        return _drivers[name]
+    except KeyError:
+        pass
+
+    try:
+        return load_driver(name)
+    except DriverError:
         return False
 
 
@@ -60,10 +115,26 @@ class BeagleDriver(object):
         drivername: Name of the Exscript protocol driver
         username_prompt: REGEX to match the login prompt as defined by Exscript
         password_prompt REGEX to match the login prompt as defined by Exscript
-        findreplace: List of findreplace dictionaries. See sub() for more details
+        findreplace: FindReplace object. See sub() for more details
         error_re: List of REGEXes to match errors on the device
         timeout: Timeout for the command in seconds
+        pool: SessionPool to borrow authenticated sessions from
+        loopbacks: LoopbackCache for the addresses of the loopback interfaces
+        timer: Timer measuring connect, login, autoinit, execute and sub
+        max_output: Characters of output after which the command is interrupted, 0 means no limit
+        truncated: True when the output of the last command was cut at max_output
+
+    Subclasses set drivername and error_re as class attributes, so that REGEXes
+    are compiled once and shared by all the instances. Subclasses returning
+    parsed records instead of text set structured to True. Subclasses for
+    devices which hold the commands sent ahead until they print the prompt,
+    and then echo them after it, set pipelining to True, see execute_many().
     """
+    drivername = None
+    error_re = None
+    structured = False
+    pipelining = False
+
     def __init__(self, **kwargs):
         """
         Init method of the Class.
@@ -75,30 +146,141 @@ class BeagleDriver(object):
             drivername: Name of the Exscript protocol driver for the device
             username_prompt: REGEX to match the login prompt as defined by Exscript
             password_prompt REGEX to match the login prompt as defined by Exscript
-            findreplace: List of findreplace dictionaries. See sub() for more details
+            findreplace: FindReplace object or list of findreplace dictionaries. \
+            See sub() for more details
             error_re: List of REGEXes to match errors on the device
             timeout: Timeout for the command in seconds
+            pool: SessionPool to borrow authenticated sessions from
+            loopbacks: LoopbackCache for the addresses of the loopback interfaces
+            timer: Timer measuring connect, login, autoinit, execute and sub
+            incremental_buffer: File like object the output is written to while it's received
+            max_output: Characters of output after which the command is interrupted, 0 means no limit
         """
         self.hostname = kwargs.get('hostname', None)
         self.username = kwargs.get('username', None)
         self.password = kwargs.get('password', None)
-        self.drivername = kwargs.get('drivername', None)
+        self.drivername = kwargs.get('drivername', self.drivername)
         self.username_prompt = kwargs.get('username_prompt', '[Uu]sername.*:')
         self.password_prompt = kwargs.get('password_prompt', '[Pp]assword.*:')
-        self.findreplace = kwargs.get('findreplace', [])
-        self.error_re = kwargs.get('error_re', None)
+        self.findreplace = self.compile(kwargs.get('findreplace', []))
+        self.error_re = kwargs.get('error_re', self.error_re)
         self.timeout = kwargs.get('timeout', None)
         self.transport = kwargs.get('transport', None)
-        self.incremental_buffer = kwargs.get('incremental_buffer', StringIO())
+        self.incremental_buffer = kwargs.get('incremental_buffer', None)
+        self.pool = kwargs.get('pool', None)
+        self.loopbacks = kwargs.get('loopbacks', None)
+        self.timer = kwargs.get('timer', None) or Timer()
+        self.max_output = kwargs.get('max_output', 0)
+        self.truncated = False
 
         self.device = None
+        # Pooled session kept by session() between the commands
+        self._holding = False
+        self._held = None
 
     def __enter__(self):
-        self.open()
+        # Pooled sessions are borrowed by run()
+        if not self.pooled:
+            self.open()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        self.close()
+        if not self.pooled:
+            self.close()
+
+    @contextmanager
+    def session(self):
+        """
+        Runs the commands of the block on a single authenticated session.
+
+        The session is opened by the first command, if any, and closed at the
+        end of the block. Pooled sessions are kept until then instead of being
+        given back after every command. Sessions left in an unknown state, for
+        instance by a truncated output, are replaced before the next command.
+
+        Returns:
+            obj: The driver object
+        """
+        if not self.pooled:
+            try:
+                yield self
+            finally:
+                self.close()
+            return
+
+        self._holding = True
+        try:
+            yield self
+        finally:
+            self._holding = False
+            if self._held is not None:
+                self.pool.release(self.session_key, self._held)
+                self._held = None
+
+    def _give_back(self, key, device, discard=False):
+        # Keeps the session for the next command within session()
+        if self._holding and not discard:
+            self._held = device
+            return
+        self._held = None
+        self.pool.release(key, device, discard=discard)
+
+    @property
+    def pooled(self):
+        """
+        bool: True when sessions are borrowed from a SessionPool
+        """
+        return bool(self.pool and self.pool.enabled)
+
+    @property
+    def session_key(self):
+        """
+        tuple: Identifies sessions that can be shared in the SessionPool
+        """
+        return (
+            str(self.transport).lower(),
+            self.hostname,
+            self.drivername,
+            self.username
+        )
+
+    @staticmethod
+    def compile(findreplace):
+        """
+        Returns a FindReplace object for findreplace.
+
+        Rules that don't compile are skipped. Use FindReplace directly to have them reported.
+
+        Args:
+            findreplace: FindReplace object or list of findreplace dictionaries
+
+        Returns:
+            obj: FindReplace object
+        """
+        if isinstance(findreplace, FindReplace):
+            return findreplace
+        return FindReplace(findreplace or [], strict=False)
+
+    @staticmethod
+    def afi_safi(table, afi, safi):
+        """
+        Returns the keyword identifying the AFI/SAFI pair in the commands.
+
+        Args:
+            table: Dictionary mapping (AFI, SAFI) tuples to keywords
+            afi: BGP AFI identifier
+            safi: BGP SAFI identifier
+
+        Returns:
+            str: The keyword
+
+        Raises:
+            SyntaxError: The AFI/SAFI pair is not supported
+        """
+        try:
+            return table[(afi, safi)]
+        except KeyError:
+            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
 
     def sub(self, text, findreplace=None):
         """
@@ -106,7 +288,7 @@ class BeagleDriver(object):
 
         Args:
             text: Text to be transformed
-            findreplace: List od dicts with the following keys:
+            findreplace: FindReplace object or list od dicts with the following keys:
                 find: is regular expression that can contain named \
                 group identified by (?P<name>...)
                 replace: is a string and supports printf() format. \
@@ -116,39 +298,9 @@ class BeagleDriver(object):
             str: Transformed text
         """
         if findreplace:
-            self.findreplace = findreplace
-        if not self.findreplace:
-            return text
+            self.findreplace = self.compile(findreplace)
 
-        result = list()
-        for line in text.splitlines():
-            for item in self.findreplace:
-                try:
-                    regex = re.compile(r'%s' % item['find'])
-                except re.error:
-                    continue
-                matches = [
-                    # start, end, dictionary with matches
-                    [_.start(), _.end(), _.groupdict()]
-                    for _ in regex.finditer(line)
-                ]
-                if matches:
-                    end = 0
-                    oldend = 0
-                    _ = list()
-                    for start, end, groupdict, in matches:
-                        # append from oldend (at first run equals to 0) up to the matched dict
-                        _.append(line[oldend:start])
-                        # replaces matches from groupdict with "replace"
-                        # we have to replace boolean False matches (like None) with empty strings
-                        _.append(item['replace'] % {k: (v or "") for k, v in groupdict.items()})
-                        # oldend is equal to end
-                        oldend = end
-                    _.append(line[end:])
-                    line = ''.join(_)
-            result.append(line)
-
-        return '\n'.join(result)
+        return self.findreplace.sub(text)
 
     def open(self, **kwargs):
         """
@@ -183,43 +335,62 @@ class BeagleDriver(object):
         self.transport = transport
         self.incremental_buffer = incremental_buffer
 
-        transport = str(transport).lower()
+        self.device = self.connect()
+
+        return self.device
+
+    def connect(self):
+        """
+        Creates a new session with the device using the attributes of the instance.
+
+        Returns:
+            obj: The authenticated Exscript protocol object
+        """
+        transport = str(self.transport).lower()
         if transport == "ssh":
-            self.device = SSH2()
+            device = SSH2()
         elif transport == 'telnet':
-            self.device = Telnet()
+            device = Telnet()
         else:
             raise RuntimeError('Unrecognized transport protocol: %s' % self.transport)
 
-        self.device.set_driver(drivername)
-        self.device.set_username_prompt(username_prompt)
-        self.device.set_password_prompt(password_prompt)
+        device.set_driver(self.drivername)
+        device.set_username_prompt(self.username_prompt)
+        device.set_password_prompt(self.password_prompt)
         if self.error_re:
-            self.device.set_error_prompt(self.error_re)
+            device.set_error_prompt(self.error_re)
         else:
-            self.error_re = self.device.get_error_prompt()
+            self.error_re = device.get_error_prompt()
 
         if self.timeout:
-            self.device.set_timeout(self.timeout)
-        else:
-            self.device.get_timeout()
+            device.set_timeout(self.timeout)
 
         # Connect
-        try:
-            self.device.connect(hostname)
-        except:
-            raise ConnectionError(hostname)
+        with self.timer.stage('connect'):
+            try:
+                device.connect(self.hostname)
+            except:
+                raise ConnectionError(self.hostname)
 
         # Authenticate
-        try:
-            self.device.login(Account(self.username, self.password))
-        except:
-            raise LoginError(hostname)
+        with self.timer.stage('login'):
+            try:
+                device.login(Account(self.username, self.password))
+            except:
+                device.close(force=True)
+                raise LoginError(self.hostname)
+        open_sessions.inc(host=self.hostname)
 
         # Init terminal length and width
-        self.device.autoinit()
+        with self.timer.stage('autoinit'):
+            try:
+                device.autoinit()
+            except:
+                device.close(force=True)
+                open_sessions.dec(host=self.hostname)
+                raise
 
-        return self.device
+        return device
 
     def close(self):
         """
@@ -228,12 +399,17 @@ class BeagleDriver(object):
         Returns:
             bool: Always returns True
         """
+        if not self.device:
+            return True
+
         try:
             self.device.send('exit\n')
             self.device.send('exit\n')
         except Exception:
             pass
         self.device.close(force=True)
+        open_sessions.dec(host=self.device.get_host())
+        self.device = None
 
         return True
 
@@ -243,6 +419,8 @@ class BeagleDriver(object):
 
         Args:
             command: String of the command to be executed
+            incremental: Write the output to incremental_buffer. Default: True
+            substitute: Apply sub() to the output. Default: True
             hostname: Hostname of the device
             username: Uername to login onto the device
             password: Password to login onto the device
@@ -250,26 +428,335 @@ class BeagleDriver(object):
             username_prompt: REGEX to match the login prompt as defined by Exscript
             password_prompt REGEX to match the login prompt as defined by Exscript
 
+        When a SessionPool is set, the session is borrowed from it and given back
+        afterwards, or at the end of the session() block. Reused sessions which
+        turn out to be broken are transparently replaced by a new one.
+
         Returns:
             str: Output of the command after sub() has been applied
         """
-        if not self.device or not self.device.proto_authenticated:
-            self.open(**kwargs)
+        incremental = kwargs.pop('incremental', True)
+        substitute = kwargs.pop('substitute', True)
 
-        def event_handler(arg):
-            self.incremental_buffer.write(arg)
+        result = self._call(lambda device: self.execute(device, command, incremental), **kwargs)
+        if not substitute:
+            return result
+        with self.timer.stage('sub'):
+            return self.sub(result)
+
+    def run_many(self, commands, **kwargs):
+        """
+        Executes several commands on the same session, see execute_many().
+
+        Commands after a truncated output run on a new session.
+
+        Args:
+            commands: List of the commands to be executed
+            substitute: Apply sub() to the outputs. Default: True
+            **kwargs: Same as run()
+
+        Returns:
+            list: For each command, its output after sub() has been applied or the CommandError it raised
+        """
+        kwargs.pop('incremental', None)
+        substitute = kwargs.pop('substitute', True)
+
+        results = list()
+        while len(results) < len(commands):
+            pending = commands[len(results):]
+            results.extend(self._call(lambda device: self.execute_many(device, pending, False), **kwargs))
+
+        if not substitute:
+            return results
+        with self.timer.stage('sub'):
+            return [
+                _ if isinstance(_, CommandError) else self.sub(_) for _ in results
+            ]
+
+    def _call(self, function, **kwargs):
+        """
+        Returns function(device) called on an authenticated session. See run().
+        """
+        if not self.pooled:
+            if not self.device or not self.device.proto_authenticated:
+                # Drops the session closed by the remote end, if any
+                self.close()
+                self.open(**kwargs)
+            try:
+                result = function(self.device)
+            except CommandError:
+                raise
+            except Exception:
+                # Unknown state, for instance after a timeout
+                self.close()
+                raise
+            if self.truncated:
+                # The device is still sending the rest of the output
+                self.close()
+            return result
+
+        for attribute in ('hostname', 'username', 'password', 'drivername', 'transport'):
+            if attribute in kwargs:
+                setattr(self, attribute, kwargs[attribute])
+
+        key = self.session_key
+        while True:
+            if self._held is not None:
+                device, reused = self._held, True
+            else:
+                device, reused = self.pool.acquire(key, self.connect)
+            if self.timeout:
+                device.set_timeout(self.timeout)
+            try:
+                result = function(device)
+            except CommandError:
+                self._give_back(key, device)
+                raise
+            except (EOFError, IOError, OSError):
+                # The session was closed by the remote end while idle
+                self._give_back(key, device, discard=True)
+                if reused:
+                    continue
+                raise ConnectionError(self.hostname)
+            except Exception:
+                # Unknown state, for instance after a timeout
+                self._give_back(key, device, discard=True)
+                raise
+            self._give_back(key, device, discard=self.truncated)
+            return result
+
+    def execute(self, device, command, incremental=True):
+        """
+        Executes command on an authenticated session.
+
+        The output is not buffered again, except by incremental_buffer if any.
+        When it exceeds max_output the command is interrupted: the complete
+        lines received so far are returned, followed by the TRUNCATED line, and
+        the truncated attribute is set. The session is left in an unknown state
+        and must not be reused.
+
+        Args:
+            device: Exscript protocol object
+            command: String of the command to be executed
+            incremental: Write the output to incremental_buffer
+
+        Returns:
+            str: Raw output of the command
+        """
+        incremental = incremental and self.incremental_buffer is not None
+        received = [0]
+        self.truncated = False
+        # The buffer can still hold data received before the command
+        start = device.buffer.size()
 
+        def event_handler(arg):
+            if self.max_output:
+                if received[0] + len(arg) > self.max_output:
+                    arg = arg[:max(self.max_output - received[0], 0)]
+                    device.cancel_expect()
+                received[0] += len(arg)
+            if incremental:
+                self.incremental_buffer.write(arg)
+
+        # Connect a data event listener
+        listening = incremental or bool(self.max_output)
+        if listening:
+            device.data_received_event.connect(event_handler)
         try:
-            # Connect a data event listener
-            self.device.data_received_event.connect(event_handler)
-            self.device.execute(command)
-            result = self.device.response
-            # Disconnect data event listener
-            self.device.data_received_event.disconnect(event_handler)
+            with self.timer.stage('execute'):
+                device.execute(command)
+            return device.response
+        except ExpectCancelledException:
+            # Interrupted by the listener, the output received so far is still buffered
+            self.truncated = True
+            return self._truncate(device.buffer.tail(device.buffer.size() - start))
         except InvalidCommandException:
-            raise CommandError(self.hostname, self.device.response)
+            raise CommandError(self.hostname, device.response)
+        finally:
+            # Disconnect data event listener
+            if listening:
+                device.data_received_event.disconnect(event_handler)
+
+    def execute_many(self, device, commands, incremental=True):
+        """
+        Executes several commands on an authenticated session.
+
+        When the driver supports pipelining, all the commands are sent at once
+        and the output is split where the prompt is followed by the echo of the
+        next command: they cost about one round trip instead of one each.
+        Otherwise each command is sent after the prompt of the previous one.
+
+        Each output is capped at max_output like by execute(). The commands
+        after a truncated output are not run, the session must not be reused.
+
+        Args:
+            device: Exscript protocol object
+            commands: List of the commands to be executed
+            incremental: Write the output to incremental_buffer
+
+        Returns:
+            list: For each command run, its raw output or the CommandError it raised
+        """
+        if not self.pipelining or len(commands) < 2:
+            results = list()
+            for command in commands:
+                try:
+                    results.append(self.execute(device, command, incremental))
+                except CommandError as error:
+                    results.append(error)
+                if self.truncated:
+                    break
+            return results
+
+        incremental = incremental and self.incremental_buffer is not None
+        self.truncated = False
+
+        # The prompt regexes of Exscript match at the end of the data only
+        prompts = '|'.join(
+            '(?:%s)' % (_.pattern[:-1] if _.pattern.endswith('$') else _.pattern)
+            for _ in device.get_prompt()
+        )
+        boundaries = [
+            re.compile(r'(?:%s) ?(?P<echo>%s)' % (prompts, re.escape(_))) for _ in commands[1:]
+        ]
+        received = list()
+        # Index of the command being output, its length and the data the next boundary can start with
+        current = {'index': 0, 'size': 0, 'carry': ''}
+        carry = 256 + max(len(_) for _ in commands)
+
+        def event_handler(arg):
+            received.append(arg)
+            if incremental:
+                self.incremental_buffer.write(arg)
+            if not self.max_output:
+                return
+            window = current['carry'] + arg
+            current['size'] += len(arg)
+            while current['index'] < len(boundaries):
+                match = boundaries[current['index']].search(window)
+                if match is None:
+                    break
+                window = window[match.start('echo'):]
+                current.update({'index': current['index'] + 1, 'size': len(window)})
+            current['carry'] = window[-carry:]
+            if current['size'] > self.max_output:
+                device.cancel_expect()
+
+        def split(text):
+            # Offsets of the echoes of the commands and of the prompts before them
+            starts, ends = [0], list()
+            for boundary in boundaries:
+                match = boundary.search(text, starts[-1])
+                if match is None:
+                    break
+                starts.append(match.start('echo'))
+                ends.append(match.start())
+            return starts, ends
+
+        device.data_received_event.connect(event_handler)
+        try:
+            with self.timer.stage('execute'):
+                device.send(''.join(_ + '\r' for _ in commands))
+                while True:
+                    # Prompts are matched at the end of the data received so far
+                    device.expect(device.get_prompt())
+                    text = ''.join(received)
+                    starts, ends = split(text)
+                    if len(starts) == len(commands):
+                        break
+        except ExpectCancelledException:
+            # Interrupted by the listener, the last command is being output
+            self.truncated = True
+            text = ''.join(received)
+            starts, ends = split(text)
+        finally:
+            device.data_received_event.disconnect(event_handler)
+        del received[:]
+
+        ends.append(len(text))
+        for prompt in device.get_prompt() if not self.truncated else []:
+            match = prompt.search(text, starts[-1])
+            if match is not None:
+                ends[-1] = match.start()
+                break
+
+        results = list()
+        for index, (start, end) in enumerate(zip(starts, ends)):
+            # The listener follows the commands chunk by chunk, outputs can exceed max_output a little
+            if (self.truncated and index == len(starts) - 1) or \
+                (self.max_output and end - start > self.max_output):
+                results.append(self._truncate(text[start:end]))
+            else:
+                results.append(self._check(device, text[start:end]))
+        return results
+
+    def _truncate(self, output):
+        """
+        Returns the complete lines of output within max_output, followed by the TRUNCATED line.
+        """
+        output = output[:self.max_output]
+        return output[:output.rfind('\n') + 1] + TRUNCATED % self.max_output
+
+    def _check(self, device, output):
+        """
+        Returns output, or the CommandError for it when it contains an error of the device.
+        """
+        # Like Exscript, skips the first line, which is the echo of the command
+        for line in output.split('\n')[1:]:
+            for error in device.get_error_prompt():
+                if error.search(line):
+                    return CommandError(self.hostname, output)
+        return output
+
+    def stream(self, method, *args, **kwargs):
+        """
+        Yields the output of a method line by line, while the device sends it.
+
+        The method runs in a separate thread which opens and closes the session.
+        sub() is applied to every line. The thread starts with the first line
+        asked for and keeps running if the generator is closed before the end.
+
+        Args:
+            method: Name of the method, for instance ping
+            *args: Positional arguments for the method
+            done: Called without arguments once the thread is done, whatever the outcome
+            **kwargs: Keyword arguments for the method
+
+        Returns:
+            generator: Lines of the output. Raises the error of the method, if any, \
+            once the lines are exhausted
+        """
+        done = kwargs.pop('done', None)
+        buffer = StreamBuffer()
+        self.incremental_buffer = buffer
+
+        def target():
+            try:
+                with self:
+                    getattr(self, method)(*args, **kwargs)
+                if self.truncated:
+                    buffer.write('\n%s\n' % (TRUNCATED % self.max_output))
+            except Exception as error:
+                buffer.fail(error)
+            finally:
+                buffer.close()
+                if done is not None:
+                    done()
+
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        try:
+            thread.start()
+        except Exception:
+            if done is not None:
+                done()
+            raise
+
+        for line in buffer:
+            yield self.findreplace.sub_line(line)
 
-        return self.sub(result)
+        if buffer.error:
+            raise buffer.error
 
     def ping(self, address, vrf='global', afi=1, safi=1, loopback=False):
         """
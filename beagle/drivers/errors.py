@@ -50,3 +50,16 @@ class LoginError(Exception):
 
     def __repr__(self):
         return "%s: %s" % (self.__name__, "Unable to login on remote host: %s" % self.router)
+
+class RouterBusyError(Exception):
+    def __init__(self, router, retry_after):
+        self.router = router
+        self.retry_after = retry_after
+        self.timestamp = datetime.utcnow()
+        self.code = 503
+
+    def __str__(self):
+        return repr("Too many requests for the device")
+
+    def __repr__(self):
+        return "%s: %s" % (self.__name__, "Too many concurrent requests for: %s" % self.router)
@@ -0,0 +1,154 @@
+"""
+Compiled findreplace rules.
+
+Rules are compiled once and shared by the drivers. Every line is first scanned
+with a single REGEX made of all the rules: lines which don't match any of them,
+which are the vast majority, are returned untouched. The remaining lines go
+through the rules one after the other, so that the output is the same as of
+applying them in sequence.
+"""
+
+from __future__ import absolute_import
+
+import re
+
+
+# Named groups, unless the parenthesis is escaped
+NAMED_GROUP_RE = re.compile(r'(?<!\\)((?:\\\\)*)\(\?P<\w+>')
+
+# Backreferences and conditionals can't survive the renaming of groups
+BACKREFERENCE_RE = re.compile(r'\(\?P=|\(\?\(|\\[1-9]')
+
+
+def _replacement(replace):
+    """
+    Returns the function computing the replacement for a match.
+    """
+    def function(match):
+        # we have to replace boolean False matches (like None) with empty strings
+        return replace % {k: (v or "") for k, v in match.groupdict().items()}
+    return function
+
+
+class FindReplace(object):
+    """
+    Compiled list of findreplace rules.
+
+    Attributes:
+        rules: List of (compiled REGEX, replace, replacement function) tuples
+        errors: List of (find, error message) tuples for the rules that don't compile
+        prefilter: Compiled REGEX matching any of the rules, None if not available
+    """
+    def __init__(self, findreplace=None, strict=True):
+        """
+        Init method of the Class.
+
+        Args:
+            findreplace: List of dicts with the keys find and replace. See load()
+            strict: Raise SyntaxError when some rules don't compile
+        """
+        self.rules = list()
+        self.errors = list()
+        self.prefilter = None
+
+        if findreplace:
+            self.load(findreplace, strict)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    __nonzero__ = __bool__
+
+    def load(self, findreplace, strict=True):
+        """
+        Compiles the rules.
+
+        Args:
+            findreplace: List od dicts with the following keys:
+                find: is regular expression that can contain named \
+                group identified by (?P<name>...)
+                replace: is a string and supports printf() format. \
+                Group names can be used as a reference
+            strict: Raise SyntaxError when some rules don't compile
+
+        Returns:
+            list: The rules which don't compile as (find, error message) tuples
+        """
+        rules = list()
+        errors = list()
+        for item in findreplace:
+            try:
+                regex = re.compile(r'%s' % item['find'])
+            except re.error as error:
+                errors.append((item['find'], str(error)))
+                continue
+            rules.append((regex, item['replace'], _replacement(item['replace'])))
+
+        if errors and strict:
+            raise SyntaxError(
+                "Invalid findreplace rules: %s" % ', '.join(
+                    "%s (%s)" % (find, message) for find, message in errors
+                )
+            )
+
+        self.rules = rules
+        self.errors = errors
+        self.prefilter = self._compile_prefilter(rules)
+
+        return errors
+
+    @staticmethod
+    def _compile_prefilter(rules):
+        """
+        Joins the rules into a single REGEX.
+
+        Returns:
+            obj: The compiled REGEX or None when rules can't be joined
+        """
+        if not rules:
+            return None
+
+        patterns = list()
+        for regex, _, _ in rules:
+            if regex.flags & ~re.UNICODE or BACKREFERENCE_RE.search(regex.pattern):
+                return None
+            # Group names must be unique across the whole REGEX
+            patterns.append('(?:%s)' % NAMED_GROUP_RE.sub(r'\1(?:', regex.pattern))
+
+        try:
+            return re.compile('|'.join(patterns))
+        except re.error:
+            return None
+
+    def sub_line(self, line):
+        """
+        Returns the line obtained by applying the rules.
+
+        Args:
+            line: Line to be transformed, without line terminators
+
+        Returns:
+            str: Transformed line
+        """
+        if self.prefilter is not None and not self.prefilter.search(line):
+            return line
+
+        for regex, _, replacement in self.rules:
+            line = regex.sub(replacement, line)
+
+        return line
+
+    def sub(self, text):
+        """
+        Returns the text obtained by applying the rules to each line.
+
+        Args:
+            text: Text to be transformed
+
+        Returns:
+            str: Transformed text
+        """
+        if not self.rules:
+            return text
+
+        return '\n'.join(self.sub_line(line) for line in text.splitlines())
@@ -3,12 +3,14 @@ from __future__ import absolute_import
 import datetime, sys, re
 
 from beagle.drivers import BeagleDriver
+from beagle.drivers.parsers import JSONMixin
 
 from Exscript.protocols.drivers.ios import _error_re
 
 
 FORMATS = {
-    'text/plain': 'IOS_text'
+    'text/plain': 'IOS_text',
+    'application/json': 'IOS_json'
 }
 
 
@@ -29,26 +31,31 @@ def IOS(_format='text/plain', **kwargs):
 
 
 class IOS_text(BeagleDriver):
-    def __init__(self, **kwargs):
-        self.drivername = 'ios'
-        super(IOS_text, self).__init__(**kwargs)
+    drivername = 'ios'
+    pipelining = True
 
-        self.error_re = _error_re + [
-            re.compile(r'^% Un', re.I)
-        ]
+    error_re = _error_re + [
+        re.compile(r'^% Un', re.I)
+    ]
+
+    # (AFI, SAFI): keyword
+    AFI_SAFI = {
+        (1, 1): 'ip',
+        (2, 1): 'ipv6'
+    }
+
+    BGP_AFI_SAFI = {
+        (1, 1): 'ipv4 unicast',
+        (2, 1): 'ipv6 unicast'
+    }
+
+    VPN_AFI_SAFI = {
+        (1, 1): 'vpnv4 unicast',
+        (2, 1): 'vpnv6 unicast'
+    }
 
     def ping(self, address, vrf='global', afi=1, safi=1, loopback=False):
-        try:
-            afi_safi_string = {
-                1: {
-                    1: 'ip'
-                },
-                2: {
-                    1: 'ipv6'
-                }
-            }[afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
 
         command = "ping"
         if vrf == 'global':
@@ -62,17 +69,7 @@ class IOS_text(BeagleDriver):
         return self.run(command)
 
     def traceroute(self, address, vrf='global', afi=1, safi=1, loopback=False):
-        try:
-            afi_safi_string = {
-                1: {
-                    1: 'ip'
-                },
-                2: {
-                    1: 'ipv6'
-                }
-            }[afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
 
         command = "traceroute"
         if vrf == 'global':
@@ -86,17 +83,7 @@ class IOS_text(BeagleDriver):
         return self.run(command)
 
     def show_route(self, address, vrf='global', afi=1, safi=1):
-        try:
-            afi_safi_string = {
-                1: {
-                    1: 'ip'
-                },
-                2: {
-                    1: 'ipv6'
-                }
-            }[afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
         
         command = "show"
         if vrf == 'global':
@@ -107,27 +94,9 @@ class IOS_text(BeagleDriver):
         return self.run(command)
 
     def show_bgp(self, address, vrf='global', afi=1, safi=1):
-        try:
-            afi_safi_string = {
-                True: {
-                    1: {
-                        1: 'ipv4 unicast'
-                    },
-                    2: {
-                        1: 'ipv6 unicast'
-                    }
-                },
-                False: {
-                    1: {
-                        1: 'vpnv4 unicast'
-                    },
-                    2: {
-                        1: 'vpnv6 unicast'
-                    }
-                }
-            }[vrf == 'global'][afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(
+            self.BGP_AFI_SAFI if vrf == 'global' else self.VPN_AFI_SAFI, afi, safi
+        )
         
         command = "show bgp"
         if vrf == 'global':
@@ -138,27 +107,9 @@ class IOS_text(BeagleDriver):
         return self.run(command)
 
     def show_bgp_neighbors(self, address, vrf='global', afi=1, safi=1):
-        try:
-            afi_safi_string = {
-                True: {
-                    1: {
-                        1: 'ipv4 unicast'
-                    },
-                    2: {
-                        1: 'ipv6 unicast'
-                    }
-                },
-                False: {
-                    1: {
-                        1: 'vpnv4 unicast'
-                    },
-                    2: {
-                        1: 'vpnv6 unicast'
-                    }
-                }
-            }[vrf == 'global'][afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(
+            self.BGP_AFI_SAFI if vrf == 'global' else self.VPN_AFI_SAFI, afi, safi
+        )
 
         command = "show bgp"
         if vrf == 'global':
@@ -171,3 +122,33 @@ class IOS_text(BeagleDriver):
 
     def show_bgp_summary(self, vrf='global', afi=1, safi=1):
         return self.show_bgp('summary', vrf, afi, safi)
+
+    def show_route_table(self, vrf='global', afi=1, safi=1):
+        """
+        Returns the raw output of the whole routing table. See parsers.iter_route_table()
+        """
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
+
+        command = "show %s route" % afi_safi_string
+        if vrf != 'global':
+            command += ' vrf %s' % vrf
+
+        return self.run(command, incremental=False, substitute=False)
+
+    def show_bgp_table(self, vrf='global', afi=1, safi=1):
+        """
+        Returns the raw output of the whole BGP table. See parsers.iter_bgp_table()
+        """
+        afi_safi_string = self.afi_safi(
+            self.BGP_AFI_SAFI if vrf == 'global' else self.VPN_AFI_SAFI, afi, safi
+        )
+
+        command = "show bgp %s" % afi_safi_string
+        if vrf != 'global':
+            command += ' vrf %s' % vrf
+
+        return self.run(command, incremental=False, substitute=False)
+
+
+class IOS_json(JSONMixin, IOS_text):
+    pass
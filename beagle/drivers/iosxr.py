@@ -3,10 +3,13 @@ from __future__ import absolute_import
 import datetime, sys, re
 
 from beagle.drivers import BeagleDriver
+from beagle.drivers.parsers import JSONMixin
+from beagle.drivers.errors import CommandError
 
 
 FORMATS = {
-    'text/plain': 'IOSXR_text'
+    'text/plain': 'IOSXR_text',
+    'application/json': 'IOSXR_json'
 }
 
 
@@ -27,70 +30,96 @@ def IOSXR(_format='text/plain', **kwargs):
 
 
 class IOSXR_text(BeagleDriver):
-    def __init__(self, **kwargs):
-        self.drivername = 'ios_xr'
-        super(IOSXR_text, self).__init__(**kwargs)
-
-        self.error_re = [
-            re.compile(r'%Error'),
-            re.compile(r'invalid input', re.I),
-            re.compile(r'(?:incomplete|ambiguous) command', re.I),
-            re.compile(r'connection timed out', re.I),
-            re.compile(r'[^\r\n]+ not found', re.I),
-            re.compile(r'bad hostname or protocol', re.I),
-            re.compile(r'unknown getaddrinfo()', re.I)
-        ]
+    drivername = 'ios_xr'
+    pipelining = True
+
+    error_re = [
+        re.compile(r'%Error'),
+        re.compile(r'invalid input', re.I),
+        re.compile(r'(?:incomplete|ambiguous) command', re.I),
+        re.compile(r'connection timed out', re.I),
+        re.compile(r'[^\r\n]+ not found', re.I),
+        re.compile(r'bad hostname or protocol', re.I),
+        re.compile(r'unknown getaddrinfo()', re.I)
+    ]
+
+    # (AFI, SAFI): keyword
+    AFI_SAFI = {
+        (1, 1): 'ipv4',
+        (2, 1): 'ipv6'
+    }
+
+    BGP_AFI_SAFI = {
+        (1, 1): 'ipv4 unicast',
+        (2, 1): 'ipv6 unicast'
+    }
+
+    VPN_AFI_SAFI = {
+        (1, 1): 'vpnv4 unicast',
+        (2, 1): 'vpnv6 unicast'
+    }
+
+    def source_address(self, loopback, afi=1):
+        """
+        Returns the address of the loopback interface, to be used as source.
+
+        IOS-XR doesn't accept interface names as source, so the address is
+        looked up on the device and kept in the LoopbackCache, if any.
+
+        Args:
+            loopback: Name of the loopback interface
+            afi: BGP AFI identifier
+
+        Returns:
+            str: The address of the interface
+
+        Raises:
+            CommandError: The interface has no address for the AFI
+        """
+        key = (self.hostname, loopback, afi)
+        if self.loopbacks is not None:
+            address = self.loopbacks.get(key)
+            if address is not None:
+                return address
 
-    def ping(self, address, vrf='global', afi=1, safi=1, loopback=False):
         try:
-            afi_safi_string = {
-                1: {
-                    1: 'ipv4'
-                },
-                2: {
-                    1: 'ipv6'
-                }
-            }[afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
-
-        command = "ping"
-        if vrf == 'global':
-            command += ' %s %s' % (afi_safi_string, address)
-        else:
-            command += ' vrf %s %s %s' % (vrf, afi_safi_string, address)
-
-        if loopback:
             if afi == 1:
-                output = self.run('show ipv4 interface %s' % loopback)
+                output = self.run('show ipv4 interface %s' % loopback, incremental=False)
                 address = next(iter([
                     next(iter(_.split(' ')[-1].split('/')))
                     for _ in output.splitlines()
                     if _.lstrip().startswith('Internet address is ')
                 ]))
             else:
-                output = self.run('show ipv6 interface %s' % loopback)
+                output = self.run('show ipv6 interface %s' % loopback, incremental=False)
                 address = next(iter([
                     next(iter(_.split(','))).lstrip()
                     for _ in output.splitlines()
                     if "subnet is" in _
                 ]))
-            command += " source %s" % address
+        except StopIteration:
+            raise CommandError(self.hostname, "No address found on %s" % loopback)
+
+        if self.loopbacks is not None:
+            self.loopbacks.set(key, address)
+        return address
+
+    def ping(self, address, vrf='global', afi=1, safi=1, loopback=False):
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
+
+        command = "ping"
+        if vrf == 'global':
+            command += ' %s %s' % (afi_safi_string, address)
+        else:
+            command += ' vrf %s %s %s' % (vrf, afi_safi_string, address)
+
+        if loopback:
+            command += " source %s" % self.source_address(loopback, afi)
 
         return self.run(command)
 
     def traceroute(self, address, vrf='global', afi=1, safi=1, loopback=False):
-        try:
-            afi_safi_string = {
-                1: {
-                    1: 'ipv4'
-                },
-                2: {
-                    1: 'ipv6'
-                }
-            }[afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
 
         command = "traceroute"
         if vrf == 'global':
@@ -99,36 +128,12 @@ class IOSXR_text(BeagleDriver):
             command += ' vrf %s %s %s' % (vrf, afi_safi_string, address)
 
         if loopback:
-            if afi == 1:
-                output = self.run('show ipv4 interface %s' % loopback)
-                address = next(iter([
-                    next(iter(_.split(' ')[-1].split('/')))
-                    for _ in output.splitlines()
-                    if _.lstrip().startswith('Internet address is ')
-                ]))
-            else:
-                output = self.run('show ipv6 interface %s' % loopback)
-                address = next(iter([
-                    next(iter(_.split(','))).lstrip()
-                    for _ in output.splitlines()
-                    if "subnet is" in _
-                ]))
-            command += " source %s" % address
+            command += " source %s" % self.source_address(loopback, afi)
 
         return self.run(command)
 
     def show_route(self, address, vrf='global', afi=1, safi=1):
-        try:
-            afi_safi_string = {
-                1: {
-                    1: 'ipv4'
-                },
-                2: {
-                    1: 'ipv6'
-                }
-            }[afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
         
         command = "show"
         if vrf == 'global':
@@ -139,27 +144,9 @@ class IOSXR_text(BeagleDriver):
         return self.run(command)
 
     def show_bgp(self, address, vrf='global', afi=1, safi=1):
-        try:
-            afi_safi_string = {
-                True: {
-                    1: {
-                        1: 'ipv4 unicast'
-                    },
-                    2: {
-                        1: 'ipv6 unicast'
-                    }
-                },
-                False: {
-                    1: {
-                        1: 'vpnv4 unicast'
-                    },
-                    2: {
-                        1: 'vpnv6 unicast'
-                    }
-                }
-            }[vrf == 'global'][afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(
+            self.BGP_AFI_SAFI if vrf == 'global' else self.VPN_AFI_SAFI, afi, safi
+        )
         
         command = "show bgp"
         if vrf == 'global':
@@ -170,27 +157,9 @@ class IOSXR_text(BeagleDriver):
         return self.run(command)
 
     def show_bgp_neighbors(self, address, vrf='global', afi=1, safi=1):
-        try:
-            afi_safi_string = {
-                True: {
-                    1: {
-                        1: 'ipv4 unicast'
-                    },
-                    2: {
-                        1: 'ipv6 unicast'
-                    }
-                },
-                False: {
-                    1: {
-                        1: 'vpnv4 unicast'
-                    },
-                    2: {
-                        1: 'vpnv6 unicast'
-                    }
-                }
-            }[vrf == 'global'][afi][safi]
-        except KeyError:
-            raise SyntaxError('Protocol not running: AFI=%s SAFI=%s' % (str(afi), str(safi)))
+        afi_safi_string = self.afi_safi(
+            self.BGP_AFI_SAFI if vrf == 'global' else self.VPN_AFI_SAFI, afi, safi
+        )
 
         command = "show bgp"
         if vrf == 'global':
@@ -203,3 +172,35 @@ class IOSXR_text(BeagleDriver):
 
     def show_bgp_summary(self, vrf='global', afi=1, safi=1):
         return self.show_bgp('summary', vrf, afi, safi)
+
+    def show_route_table(self, vrf='global', afi=1, safi=1):
+        """
+        Returns the raw output of the whole routing table. See parsers.iter_route_table()
+        """
+        afi_safi_string = self.afi_safi(self.AFI_SAFI, afi, safi)
+
+        command = "show route"
+        if vrf == 'global':
+            command += ' %s' % afi_safi_string
+        else:
+            command += ' vrf %s %s' % (vrf, afi_safi_string)
+
+        return self.run(command, incremental=False, substitute=False)
+
+    def show_bgp_table(self, vrf='global', afi=1, safi=1):
+        """
+        Returns the raw output of the whole BGP table. See parsers.iter_bgp_table()
+        """
+        afi_safi_string = self.afi_safi(
+            self.BGP_AFI_SAFI if vrf == 'global' else self.VPN_AFI_SAFI, afi, safi
+        )
+
+        command = "show bgp %s" % afi_safi_string
+        if vrf != 'global':
+            command += ' vrf %s' % vrf
+
+        return self.run(command, incremental=False, substitute=False)
+
+
+class IOSXR_json(JSONMixin, IOSXR_text):
+    pass
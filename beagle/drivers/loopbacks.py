@@ -0,0 +1,152 @@
+"""
+Cache of the source addresses of the loopback interfaces.
+
+Drivers which need to look up the address of the loopback interface before
+sourcing a ping or a traceroute from it store the result here, so that the
+lookup costs one command every ttl seconds instead of one per request.
+
+The processes of the production server share the addresses through a
+directory, one JSON file per address, so that purging them applies to all
+the workers.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class LoopbackCache(object):
+    """
+    Thread safe cache of loopback addresses.
+
+    Keys are (hostname, interface, afi) tuples.
+
+    Attributes:
+        ttl: Seconds the addresses are cached for, 0 disables the cache
+        directory: Private directory sharing the addresses with the other \
+        processes, None keeps them in memory
+    """
+    def __init__(self, ttl=0, directory=None):
+        """
+        Init method of the Class.
+
+        Args:
+            ttl: Seconds the addresses are cached for, 0 disables the cache
+            directory: Private directory sharing the addresses with the other processes
+        """
+        self.ttl = ttl
+        self.directory = directory
+
+        self._lock = threading.Lock()
+        # key: (expiration timestamp, address)
+        self._items = dict()
+
+    def configure(self, ttl=0, directory=None):
+        """
+        Changes the cache settings and drops the cached addresses.
+
+        The addresses in the directory are kept, the other processes may still use them.
+
+        Args:
+            ttl: Seconds the addresses are cached for, 0 disables the cache
+            directory: Private directory sharing the addresses with the other processes
+        """
+        with self._lock:
+            self.ttl = ttl
+            self.directory = directory
+            self._items.clear()
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        """
+        Returns the path of the file of key. The name starts with the digest of the hostname.
+        """
+        return os.path.join(self.directory, '%s-%s' % (self._digest(key[0]), self._digest(key)))
+
+    def get(self, key):
+        """
+        Returns the cached address for key.
+
+        Args:
+            key: Tuple (hostname, interface, afi)
+
+        Returns:
+            str: The address, None if not found or expired
+        """
+        if self.directory is not None:
+            try:
+                with open(self._path(key)) as stream:
+                    item = json.load(stream)
+            except (IOError, OSError, ValueError):
+                return None
+            if item['expires'] <= time.time():
+                return None
+            return item['address']
+
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self._items[key]
+                return None
+            return item[1]
+
+    def set(self, key, address):
+        """
+        Stores the address for key.
+
+        Args:
+            key: Tuple (hostname, interface, afi)
+            address: The address of the interface
+        """
+        if self.ttl <= 0:
+            return
+
+        if self.directory is not None:
+            path = self._path(key)
+            # Readers never see a partially written file
+            temporary = '%s.%d.tmp' % (path, os.getpid())
+            with open(temporary, 'w') as stream:
+                json.dump({'expires': time.time() + self.ttl, 'address': address}, stream)
+            os.rename(temporary, path)
+            return
+
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, address)
+
+    def purge(self, hostname=None):
+        """
+        Drops the cached addresses so that they are looked up again on next use.
+
+        Args:
+            hostname: Drops the addresses of this device only. None means all of them
+
+        Returns:
+            int: Amount of addresses dropped
+        """
+        if self.directory is not None:
+            prefix = '' if hostname is None else self._digest(hostname) + '-'
+            purged = 0
+            for filename in os.listdir(self.directory):
+                if not filename.startswith(prefix) or filename.endswith('.tmp'):
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    continue
+                purged += 1
+            return purged
+
+        with self._lock:
+            keys = [_ for _ in self._items if hostname is None or _[0] == hostname]
+            for key in keys:
+                del self._items[key]
+        return len(keys)
@@ -0,0 +1,395 @@
+"""
+Parsers turning the output of IOS and IOS-XR commands into structured records.
+
+Each parser reads the output line by line, once, and keeps only the state
+needed for the record being built. Lines that are not understood are ignored,
+so that new or optional fields in the output don't break the parsers.
+"""
+
+from __future__ import absolute_import
+
+import re
+
+
+ROUTER_ID_RE = re.compile(
+    r'^BGP router identifier (?P<router_id>\S+), local AS number (?P<asn>[\d.]+)'
+)
+PATHS_RE = re.compile(r'^Paths: \((?P<available>\d+) available(?:, best #(?P<best>\d+))?')
+NEXT_HOP_RE = re.compile(
+    r'^\s+(?P<next_hop>\S+)(?: \(metric (?P<igp_metric>\d+)\)| \([^)]*\))* from (?P<peer>\S+)'
+    r' \((?P<peer_router_id>\S+)\)'
+)
+KNOWN_VIA_RE = re.compile(
+    r'^\s+Known via "(?P<protocol>[^"]+)", distance (?P<distance>\d+), metric (?P<metric>\d+)'
+)
+DESCRIPTOR_RE = re.compile(
+    r'^\s+\*?\s*(?P<next_hop>[^\s,]+)(?:, from (?P<source>[^\s,]+))?(?:, .*?)?(?:, via (?P<interface>\S+))?\s*$'
+)
+CONNECTED_RE = re.compile(r'^\s+\*?\s*directly connected, via (?P<interface>\S+)')
+
+
+def _number(value):
+    """
+    Returns value as int if it's made of digits only, value otherwise.
+    """
+    return int(value) if value.isdigit() else value
+
+
+def _as_path(line):
+    """
+    Returns the AS path found on the line preceding the next hop of a BGP path.
+    """
+    # 64497 64498, (received & used) / Local, (Received from a RR-client)
+    path = line.strip().split(',')[0].split()
+    if path == ['Local']:
+        return []
+    return [_number(_) for _ in path]
+
+
+def parse_bgp_summary(output):
+    """
+    Parses the output of show bgp summary.
+
+    Args:
+        output: The output of the command
+
+    Returns:
+        dict: router_id, asn and the list of the neighbors with their state, \
+        counters and the amount of prefixes received
+    """
+    result = {
+        'router_id': None,
+        'asn': None,
+        'neighbors': []
+    }
+
+    in_table = False
+    neighbor = None
+    for line in output.splitlines():
+        if not in_table:
+            match = ROUTER_ID_RE.match(line)
+            if match:
+                result['router_id'] = match.group('router_id')
+                result['asn'] = _number(match.group('asn'))
+            elif line.startswith('Neighbor '):
+                in_table = True
+            continue
+
+        fields = line.split()
+        if not fields:
+            continue
+        if not line[0].isspace():
+            if len(fields) == 1:
+                # Long addresses push the counters to the next line
+                neighbor = fields[0]
+                continue
+            neighbor = fields.pop(0)
+        # Version (IOS) or Speaker (IOS-XR), AS, MsgRcvd, MsgSent, TblVer, InQ, OutQ, Up/Down, State
+        if neighbor is None or len(fields) < 9 or not fields[2].isdigit():
+            continue
+
+        state = ' '.join(fields[8:])
+        record = {
+            'neighbor': neighbor,
+            'asn': _number(fields[1]),
+            'messages_received': int(fields[2]),
+            'messages_sent': int(fields[3]),
+            'table_version': _number(fields[4]),
+            'input_queue': _number(fields[5]),
+            'output_queue': _number(fields[6]),
+            'up_down': fields[7],
+            'state': 'Established' if state.isdigit() else state,
+            'prefixes_received': int(state) if state.isdigit() else None
+        }
+        result['neighbors'].append(record)
+        neighbor = None
+
+    return result
+
+
+def parse_bgp_prefix(output):
+    """
+    Parses the output of show bgp <prefix>.
+
+    Args:
+        output: The output of the command
+
+    Returns:
+        dict: prefix, amount of paths, index of the best one and the list of the \
+        paths with their attributes
+    """
+    result = {
+        'prefix': None,
+        'available': 0,
+        'best': None,
+        'paths': []
+    }
+
+    path = None
+    previous = ''
+    for line in output.splitlines():
+        stripped = line.strip()
+
+        if stripped.startswith('BGP routing table entry for '):
+            result['prefix'] = stripped.split()[5].rstrip(',')
+        elif stripped.startswith('Paths: ('):
+            match = PATHS_RE.match(stripped)
+            if match:
+                result['available'] = int(match.group('available'))
+                if match.group('best'):
+                    result['best'] = int(match.group('best'))
+        elif ' from ' in line and NEXT_HOP_RE.match(line):
+            match = NEXT_HOP_RE.match(line)
+            path = {
+                'as_path': _as_path(previous),
+                'next_hop': match.group('next_hop'),
+                'igp_metric': int(match.group('igp_metric')) if match.group('igp_metric') else None,
+                'peer': match.group('peer'),
+                'peer_router_id': match.group('peer_router_id'),
+                'origin': None,
+                'med': None,
+                'local_preference': None,
+                'weight': None,
+                'valid': False,
+                'best': False,
+                'type': None,
+                'communities': [],
+                'extended_communities': [],
+                'large_communities': []
+            }
+            result['paths'].append(path)
+        elif path is not None and stripped.startswith('Origin '):
+            for attribute in stripped.split(','):
+                words = attribute.split()
+                if not words:
+                    continue
+                if words[0] == 'Origin':
+                    path['origin'] = words[-1]
+                elif words[0] == 'metric':
+                    path['med'] = int(words[-1])
+                elif words[0] == 'localpref':
+                    path['local_preference'] = int(words[-1])
+                elif words[0] == 'weight':
+                    path['weight'] = int(words[-1])
+                elif words[0] in ('valid', 'best'):
+                    path[words[0]] = True
+                elif words[0] in ('internal', 'external', 'local', 'confed-internal', 'confed-external'):
+                    path['type'] = words[0]
+        elif path is not None and stripped.lower().startswith('community: '):
+            path['communities'] = stripped.split()[1:]
+        elif path is not None and stripped.lower().startswith('extended community: '):
+            path['extended_communities'] = stripped.split()[2:]
+        elif path is not None and stripped.lower().startswith('large community: '):
+            path['large_communities'] = stripped.split()[2:]
+
+        previous = line
+
+    return result
+
+
+def parse_route(output):
+    """
+    Parses the output of show route <address> (show ip route on IOS).
+
+    Args:
+        output: The output of the command
+
+    Returns:
+        dict: prefix, protocol, distance, metric and the list of the next hops
+    """
+    result = {
+        'prefix': None,
+        'protocol': None,
+        'distance': None,
+        'metric': None,
+        'next_hops': []
+    }
+
+    in_descriptors = False
+    for line in output.splitlines():
+        stripped = line.strip()
+
+        if stripped.startswith('Routing entry for '):
+            result['prefix'] = stripped.split()[3].rstrip(',')
+        elif stripped.startswith('Known via '):
+            match = KNOWN_VIA_RE.match(line)
+            if match:
+                result['protocol'] = match.group('protocol')
+                result['distance'] = int(match.group('distance'))
+                result['metric'] = int(match.group('metric'))
+        elif stripped.startswith('Routing Descriptor Blocks'):
+            in_descriptors = True
+        elif not in_descriptors or not stripped:
+            continue
+        elif stripped.startswith('Route metric is '):
+            if result['next_hops']:
+                result['next_hops'][-1]['metric'] = int(stripped.split()[3].rstrip(','))
+        elif CONNECTED_RE.match(line):
+            result['next_hops'].append({
+                'next_hop': None,
+                'source': None,
+                'interface': CONNECTED_RE.match(line).group('interface'),
+                'metric': None
+            })
+        elif ', from ' in stripped or ', via ' in stripped:
+            match = DESCRIPTOR_RE.match(line)
+            if match:
+                result['next_hops'].append({
+                    'next_hop': match.group('next_hop'),
+                    'source': match.group('source'),
+                    'interface': match.group('interface'),
+                    'metric': None
+                })
+
+    return result
+
+
+ROUTE_ENTRY_RE = re.compile(
+    r'^[A-Za-z*+%&>]{1,3}(?: [A-Za-z0-9*+]{1,3})*\s+(?P<network>[0-9A-Fa-f.:]+)(?:/(?P<length>\d+))?(?:\s|,|$)'
+)
+SUBNETTED_RE = re.compile(r'^\s+\S+/(?P<length>\d+) is subnetted')
+# For instance "Processed 850000 prefixes, 1700000 paths", status codes are never words
+FOOTER_RE = re.compile(r'^[A-Z][a-z]+ ')
+
+
+def _classful(network):
+    """
+    Returns the prefix length implied by the class of an IPv4 network.
+    """
+    first = int(network.split('.')[0])
+    if first < 128:
+        return 8
+    if first < 192:
+        return 16
+    return 24
+
+
+def iter_route_table(output):
+    """
+    Parses the output of show route (show ip route on IOS) without arguments.
+
+    Args:
+        output: The output of the command
+
+    Yields:
+        tuple: The prefix and the text of its entry, continuation lines included
+    """
+    prefix = None
+    lines = []
+    # Length of the networks listed without it, below a "is subnetted" line
+    length = None
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+
+        if line[0].isspace():
+            match = SUBNETTED_RE.match(line)
+            if match:
+                length = match.group('length')
+            elif 'variably subnetted' in line:
+                length = None
+            elif prefix is not None:
+                lines.append(line)
+            continue
+
+        match = ROUTE_ENTRY_RE.match(line)
+        if prefix is not None:
+            yield prefix, '\n'.join(lines)
+            prefix = None
+        if not match:
+            continue
+
+        network = match.group('network')
+        if match.group('length'):
+            prefix = '%s/%s' % (network, match.group('length'))
+        elif ':' in network:
+            continue
+        else:
+            prefix = '%s/%s' % (network, length or _classful(network))
+        lines = [line]
+
+    if prefix is not None:
+        yield prefix, '\n'.join(lines)
+
+
+def iter_bgp_table(output):
+    """
+    Parses the output of show bgp without arguments.
+
+    Args:
+        output: The output of the command
+
+    Yields:
+        tuple: The prefix and the text of its entry, one line per path
+    """
+    # Column where the networks start, found on the header line
+    column = None
+    prefix = None
+    lines = []
+    for line in output.splitlines():
+        if column is None:
+            if 'Network' in line and 'Next Hop' in line:
+                column = line.index('Network')
+            continue
+        if not line.strip():
+            continue
+        if FOOTER_RE.match(line):
+            break
+
+        if len(line) > column and not line[column].isspace() and \
+            (column == 0 or line[column - 1].isspace()):
+            network = line[column:].split()[0]
+            if prefix is not None:
+                yield prefix, '\n'.join(lines)
+            if '/' in network or ':' in network:
+                prefix = network
+            else:
+                prefix = '%s/%d' % (network, _classful(network))
+            lines = [line]
+        elif prefix is not None:
+            # Further paths, or the rest of a line pushed down by a long network
+            lines.append(line)
+
+    if prefix is not None:
+        yield prefix, '\n'.join(lines)
+
+
+def bgp_table_header(output):
+    """
+    Returns the line naming the columns of the output of show bgp, if any.
+    """
+    for line in output.splitlines():
+        if 'Network' in line and 'Next Hop' in line:
+            return line
+    return ''
+
+
+class JSONMixin(object):
+    """
+    Mixin for the application/json drivers.
+
+    Runs the commands of the text/plain driver it's mixed with and parses their
+    output. Commands without a parser return the text as it is. Findreplace rules
+    are not applied, as they mark text up for humans. Parsing is measured as the
+    parse stage of the timer.
+    """
+    structured = True
+
+    def sub(self, text, findreplace=None):
+        return '\n'.join(text.splitlines())
+
+    def show_route(self, address, vrf='global', afi=1, safi=1):
+        output = super(JSONMixin, self).show_route(address, vrf, afi, safi)
+        with self.timer.stage('parse'):
+            return parse_route(output)
+
+    def show_bgp(self, address, vrf='global', afi=1, safi=1):
+        output = super(JSONMixin, self).show_bgp(address, vrf, afi, safi)
+        with self.timer.stage('parse'):
+            return parse_bgp_prefix(output)
+
+    def show_bgp_summary(self, vrf='global', afi=1, safi=1):
+        # The text drivers implement the summary as show_bgp('summary')
+        output = super(JSONMixin, self).show_bgp('summary', vrf, afi, safi)
+        with self.timer.stage('parse'):
+            return parse_bgp_summary(output)
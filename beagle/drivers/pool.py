@@ -0,0 +1,243 @@
+"""
+Pool of authenticated sessions towards the devices.
+
+Sessions are Exscript protocol objects which already went through connect(),
+login() and autoinit(). They are grouped by key (usually transport, hostname,
+driver name and username) so that drivers can borrow an existing session
+instead of building a new one for every command.
+
+Idle sessions are closed by a background thread, which runs while there are
+idle sessions only.
+"""
+
+from __future__ import absolute_import
+
+import threading
+import time
+
+from collections import deque
+
+from beagle.drivers import open_sessions
+from beagle.drivers.errors import RouterBusyError
+
+
+class SessionPool(object):
+    """
+    Thread safe pool of device sessions.
+
+    Attributes:
+        size: Maximum amount of sessions per key, 0 disables pooling
+        idle: Seconds after which an unused session is closed
+        check: Seconds of inactivity after which a session is probed before reuse
+        wait: Seconds to wait for a session when size has been reached
+    """
+    def __init__(self, size=0, idle=60, check=10, wait=30):
+        """
+        Init method of the Class.
+
+        Args:
+            size: Maximum amount of sessions per key, 0 disables pooling
+            idle: Seconds after which an unused session is closed
+            check: Seconds of inactivity after which a session is probed before reuse
+            wait: Seconds to wait for a session when size has been reached
+        """
+        self.size = size
+        self.idle = idle
+        self.check = check
+        self.wait = wait
+
+        self._lock = threading.Condition()
+        # key: deque of (last used timestamp, session)
+        self._idle = dict()
+        # key: amount of sessions, idle or borrowed
+        self._count = dict()
+        # Thread closing the idle sessions, None when there are none
+        self._reaper = None
+        # Wakes the reaper up when the settings change
+        self._wakeup = threading.Event()
+
+    def configure(self, size=0, idle=60, check=10, wait=30):
+        """
+        Changes the pool settings and closes the sessions in excess.
+
+        Args:
+            size: Maximum amount of sessions per key, 0 disables pooling
+            idle: Seconds after which an unused session is closed
+            check: Seconds of inactivity after which a session is probed before reuse
+            wait: Seconds to wait for a session when size has been reached
+        """
+        with self._lock:
+            self.size = size
+            self.idle = idle
+            self.check = check
+            self.wait = wait
+        self._wakeup.set()
+        self.purge()
+
+    @property
+    def enabled(self):
+        """
+        bool: True when sessions are retained between commands
+        """
+        return self.size > 0
+
+    def acquire(self, key, factory):
+        """
+        Borrows a session from the pool, creating a new one if needed.
+
+        Sessions idle for more than check seconds are probed first and replaced
+        if they are not usable anymore.
+
+        Args:
+            key: Tuple identifying the device, the hostname being its second item
+            factory: Callable returning a new authenticated session
+
+        Returns:
+            tuple: The session and a boolean which is True when it has been reused
+
+        Raises:
+            RouterBusyError: No session became available within wait seconds
+        """
+        deadline = time.time() + self.wait
+        while True:
+            with self._lock:
+                sessions = self._idle.get(key)
+                if sessions:
+                    timestamp, session = sessions.pop()
+                elif self._count.get(key, 0) < self.size:
+                    self._count[key] = self._count.get(key, 0) + 1
+                    timestamp, session = None, None
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise RouterBusyError(key[1], 1)
+                    self._lock.wait(remaining)
+                    continue
+
+            if session is None:
+                try:
+                    return factory(), False
+                except Exception:
+                    self._forget(key)
+                    raise
+
+            if time.time() - timestamp < self.check or self._is_alive(session):
+                return session, True
+
+            self._forget(key)
+            self._close(session)
+
+    def release(self, key, session, discard=False):
+        """
+        Gives a session back to the pool.
+
+        Args:
+            key: Hashable identifying the device
+            session: The session returned by acquire()
+            discard: Close the session instead of keeping it for later use
+        """
+        if discard or not self.enabled or not session.is_protocol_authenticated():
+            self._forget(key)
+            self._close(session)
+            return
+
+        with self._lock:
+            self._idle.setdefault(key, deque()).append((time.time(), session))
+            self._lock.notify()
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap)
+                self._reaper.daemon = True
+                self._reaper.start()
+
+    def purge(self, key=None):
+        """
+        Closes idle sessions.
+
+        Args:
+            key: Only close sessions for this key. Default: all of them
+        """
+        sessions = list()
+        with self._lock:
+            keys = [key] if key is not None else list(self._idle.keys())
+            for _ in keys:
+                for _timestamp, session in self._idle.pop(_, ()):
+                    self._count[_] -= 1
+                    sessions.append(session)
+            self._lock.notify_all()
+
+        for session in sessions:
+            self._close(session)
+
+    def _reap(self):
+        """
+        Body of the reaper thread. Closes the idle sessions as soon as they expire.
+        """
+        while True:
+            with self._lock:
+                expiry = [idle[0][0] + self.idle for idle in self._idle.values() if idle]
+                if not expiry:
+                    # Started again by release()
+                    self._reaper = None
+                    return
+                delay = min(expiry) - time.time()
+                self._wakeup.clear()
+
+            if delay > 0:
+                self._wakeup.wait(delay)
+            else:
+                self._evict()
+
+    def _evict(self):
+        """
+        Closes sessions which have been idle for more than idle seconds.
+        """
+        sessions = list()
+        threshold = time.time() - self.idle
+        with self._lock:
+            for key, idle in self._idle.items():
+                # Oldest sessions are on the left
+                while idle and idle[0][0] <= threshold:
+                    sessions.append(idle.popleft()[1])
+                    self._count[key] -= 1
+            if sessions:
+                self._lock.notify_all()
+
+        for session in sessions:
+            self._close(session)
+
+    def _forget(self, key):
+        """
+        Frees the slot of a session which is not going to be pooled again.
+        """
+        with self._lock:
+            self._count[key] -= 1
+            self._lock.notify()
+
+    @staticmethod
+    def _is_alive(session):
+        """
+        Checks whether the session can still be used by sending an empty line.
+        """
+        if not session.is_protocol_authenticated():
+            return False
+        try:
+            session.execute('')
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _close(session):
+        """
+        Disconnects the session ignoring errors.
+        """
+        try:
+            session.send('exit\n')
+            session.send('exit\n')
+        except Exception:
+            pass
+        try:
+            session.close(force=True)
+        except Exception:
+            pass
+        open_sessions.dec(host=session.get_host())
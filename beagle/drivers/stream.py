@@ -0,0 +1,81 @@
+"""
+Incremental buffers to read the output of the commands while they run.
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+from collections import deque
+
+
+class StreamBuffer(object):
+    """
+    File like object which turns data written by the driver into lines.
+
+    It's meant to be used as incremental_buffer by the driver running in a
+    thread while another thread iterates over it. The last unterminated line
+    is the prompt of the device, hence it's never returned.
+
+    Attributes:
+        closed: True when no more data is going to be written
+        error: Exception which interrupted the command, if any
+    """
+    def __init__(self):
+        """
+        Init method of the Class.
+        """
+        self.closed = False
+        self.error = None
+
+        self._lock = threading.Condition()
+        self._lines = deque()
+        self._partial = ''
+
+    def write(self, data):
+        """
+        Appends data to the buffer.
+
+        Args:
+            data: String received from the device
+        """
+        with self._lock:
+            lines = (self._partial + data.replace('\r', '')).split('\n')
+            self._partial = lines.pop()
+            if lines:
+                self._lines.extend(lines)
+                self._lock.notify_all()
+
+    def fail(self, error):
+        """
+        Records the exception which interrupted the command.
+
+        Args:
+            error: The exception
+        """
+        with self._lock:
+            self.error = error
+
+    def close(self):
+        """
+        Signals that no more data is going to be written.
+        """
+        with self._lock:
+            self.closed = True
+            self._lock.notify_all()
+
+    def __iter__(self):
+        """
+        Yields complete lines as soon as they are written until the buffer is closed.
+        """
+        while True:
+            with self._lock:
+                while not self._lines and not self.closed:
+                    self._lock.wait()
+                if not self._lines:
+                    return
+                lines = list(self._lines)
+                self._lines.clear()
+
+            for line in lines:
+                yield line
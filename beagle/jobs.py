@@ -0,0 +1,378 @@
+"""
+Commands running in background, for clients which poll for their output.
+
+The state and the output of the jobs are kept in a spool directory, so that
+every worker of the production server can answer for the jobs started by the
+other ones. Each job is made of two files: <id>.json holds the state, <id>.out
+the lines of output written so far.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from beagle.metrics import Counter, Gauge
+from beagle.runtime import private_directory
+
+
+logger = logging.getLogger(__name__)
+
+pending_jobs = Gauge(
+    'beagle_jobs_pending',
+    'Jobs queued or running in the process'
+)
+
+finished_jobs = Counter(
+    'beagle_jobs_total',
+    'Jobs finished, by outcome',
+    ('command', 'state')
+)
+
+FINISHED = ('success', 'error', 'fail')
+
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# Seconds between two scans of the spool directory for expired jobs
+PURGE_INTERVAL = 60
+
+# Seconds between two checks of the output of the job while waiting
+POLL_INTERVAL = 0.1
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        self.timestamp = datetime.utcnow()
+        self.code = 503
+
+    def __str__(self):
+        return "Too many jobs queued"
+
+    def __repr__(self):
+        return "%s: %s" % (type(self).__name__, "Too many jobs queued")
+
+
+class Job(object):
+    """
+    Handle given to the function running the job.
+
+    Attributes:
+        id: ID of the job
+    """
+    def __init__(self, job_id, path):
+        """
+        Init method of the Class.
+
+        Args:
+            job_id: ID of the job
+            path: Path of the output file
+        """
+        self.id = job_id
+        self._path = path
+        self._stream = None
+
+    def write(self, line):
+        """
+        Appends a line to the output of the job.
+
+        Args:
+            line: The line, without the line terminator
+        """
+        if self._stream is None:
+            self._stream = open(self._path, 'ab')
+        self._stream.write((line + '\n').encode('utf-8'))
+        self._stream.flush()
+
+    def close(self):
+        """
+        Closes the output file.
+        """
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class JobManager(object):
+    """
+    Runs functions in background on a bounded pool of threads and keeps their outcome for a while.
+
+    Attributes:
+        directory: Path of the spool directory
+        workers: Maximum amount of jobs running at the same time in the process
+        queue: Maximum amount of jobs waiting for a worker in the process
+        retention: Seconds finished jobs are kept for
+    """
+    def __init__(self, directory=None, workers=4, queue=64, retention=600):
+        """
+        Init method of the Class.
+
+        Args:
+            directory: Path of the spool directory
+            workers: Maximum amount of jobs running at the same time in the process
+            queue: Maximum amount of jobs waiting for a worker in the process
+            retention: Seconds finished jobs are kept for
+        """
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._purged = 0
+        self.configure(directory, workers, queue, retention)
+
+    def configure(self, directory=None, workers=4, queue=64, retention=600):
+        """
+        Changes the settings. Jobs already submitted keep running.
+
+        The spool directory is created if needed. It must be accessible by the
+        current user only, see private_directory().
+
+        Args:
+            directory: Path of the spool directory
+            workers: Maximum amount of jobs running at the same time in the process
+            queue: Maximum amount of jobs waiting for a worker in the process
+            retention: Seconds finished jobs are kept for
+
+        Raises:
+            IOError: The spool directory is not private
+        """
+        if directory:
+            # The outputs of the routers must not be readable, or forged, by other users
+            private_directory(directory)
+
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self.directory = directory
+            self.workers = workers
+            self.queue = queue
+            self.retention = retention
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _path(self, job_id, extension):
+        return os.path.join(self.directory, '%s.%s' % (job_id, extension))
+
+    def _save(self, state):
+        # Readers never see a partially written state
+        temporary = self._path(state['id'], 'json.%d.tmp' % os.getpid())
+        with open(temporary, 'w') as stream:
+            json.dump(state, stream)
+        os.rename(temporary, self._path(state['id'], 'json'))
+
+    def _load(self, job_id):
+        try:
+            with open(self._path(job_id, 'json')) as stream:
+                state = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if state['state'] not in FINISHED and not self._alive(state['pid']):
+            # The process running the job died
+            state.update({'state': 'fail', 'message': 'Job lost', 'finished': None})
+        return state
+
+    @staticmethod
+    def _alive(pid):
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except OSError as error:
+            # EPERM: the process exists but belongs to someone else
+            return error.errno == 1
+        return True
+
+    def submit(self, function, **state):
+        """
+        Queues function(job) for execution.
+
+        The function writes the output through job.write() and returns a
+        dictionary updating the state of the job, for instance:
+        {'state': 'error', 'message': 'Invalid input'}
+
+        Args:
+            function: The function to be called
+            **state: Attributes of the job, for instance the command
+
+        Returns:
+            dict: The state of the job
+
+        Raises:
+            QueueFullError: The queue of the process is full
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue:
+                raise QueueFullError(retry_after=1)
+            self._pending += 1
+            pending_jobs.inc()
+            executor = self._executor
+
+        state = dict(
+            state, id=uuid.uuid4().hex, state='queued', message=None, output=None,
+            created=time.time(), started=None, finished=None, pid=os.getpid()
+        )
+        try:
+            open(self._path(state['id'], 'out'), 'wb').close()
+            self._save(state)
+            executor.submit(self._run, dict(state), function)
+        except Exception:
+            self._done()
+            raise
+
+        self.purge()
+        return state
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+            pending_jobs.dec()
+
+    def _run(self, state, function):
+        job = Job(state['id'], self._path(state['id'], 'out'))
+        try:
+            state.update({'state': 'running', 'started': time.time()})
+            self._save(state)
+            try:
+                state.update(function(job))
+            except Exception:
+                logger.exception('Job %s failed', state['id'])
+                state.update({'state': 'fail', 'message': 'Internal Server Error'})
+            finally:
+                job.close()
+            state['finished'] = time.time()
+            self._save(state)
+            finished_jobs.inc(command=state.get('command'), state=state['state'])
+        except Exception:
+            logger.exception('Unable to save the state of job %s', state['id'])
+        finally:
+            self._done()
+
+    @staticmethod
+    def _page(data, lines=0, size=0):
+        """
+        Returns the length of the page at the start of data, made of whole lines.
+
+        Args:
+            data: Whole lines of output
+            lines: Maximum amount of lines of the page, 0 means no limit
+            size: Maximum amount of bytes of the page, 0 means no limit. \
+            A longer single line makes a page on its own
+
+        Returns:
+            tuple: The length of the page and whether a limit was reached
+        """
+        end = len(data)
+        full = False
+        if lines:
+            position = -1
+            for _ in range(lines):
+                position = data.find(b'\n', position + 1)
+                if position < 0:
+                    break
+            else:
+                end = position + 1
+                full = True
+        if size and end > size:
+            end = data.rfind(b'\n', 0, size) + 1 or data.find(b'\n') + 1 or end
+            full = True
+        return end, full
+
+    def state(self, job_id):
+        """
+        Returns the state of a job, without reading its output.
+
+        Args:
+            job_id: ID of the job
+
+        Returns:
+            dict: The state of the job. None if the job doesn't exist
+        """
+        if not JOB_ID.match(job_id):
+            return None
+        return self._load(job_id)
+
+    def get(self, job_id, offset=0, wait=0, lines=0, size=0):
+        """
+        Returns the state of a job and a page of the output written after offset.
+
+        Pages are made of whole lines, except for the last line of a finished job.
+
+        Args:
+            job_id: ID of the job
+            offset: Bytes of output already received by the client
+            wait: Seconds to wait for a full page or for the job to finish. Without \
+            limits, for new output
+            lines: Maximum amount of lines of the page, 0 means no limit
+            size: Maximum amount of bytes of the page, 0 means no limit
+
+        Returns:
+            dict: The state of the job, with the output, the offset of the next \
+            output and whether the output is complete. None if the job doesn't exist
+        """
+        if not JOB_ID.match(job_id):
+            return None
+
+        deadline = time.time() + wait
+        data = b''
+        try:
+            stream = open(self._path(job_id, 'out'), 'rb')
+        except (IOError, OSError):
+            return None
+
+        with stream:
+            stream.seek(offset)
+            while True:
+                # The state is saved after the last output, which is read below
+                state = self._load(job_id)
+                if state is None:
+                    return None
+                finished = state['state'] in FINISHED
+                data += stream.read()
+
+                available = data if finished else data[:data.rfind(b'\n') + 1]
+                end, full = self._page(available, lines, size)
+                if finished or full or time.time() >= deadline:
+                    break
+                if available and not lines and not size:
+                    break
+                time.sleep(POLL_INTERVAL)
+
+        if state['output'] is None:
+            state['output'] = data[:end].decode('utf-8', 'replace')
+        state['offset'] = offset + end
+        state['complete'] = finished and end == len(data)
+
+        self.purge()
+        return state
+
+    def purge(self):
+        """
+        Deletes the jobs finished more than retention seconds ago. Runs at most once per PURGE_INTERVAL.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._purged < PURGE_INTERVAL:
+                return
+            self._purged = now
+
+        for filename in os.listdir(self.directory):
+            job_id, _, extension = filename.partition('.')
+            if extension != 'json' or not JOB_ID.match(job_id):
+                continue
+            state = self._load(job_id)
+            if state is None or state['state'] not in FINISHED:
+                continue
+            if (state['finished'] or state['created']) + self.retention > now:
+                continue
+            for extension in ('json', 'out'):
+                try:
+                    os.remove(self._path(job_id, extension))
+                except OSError:
+                    pass
@@ -0,0 +1,287 @@
+"""
+Metrics in the Prometheus text exposition format.
+
+Metrics are registered into REGISTRY when they are created. Recording a value
+only takes a lock and a dictionary lookup.
+"""
+
+from __future__ import absolute_import
+
+import bisect
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+# Monotonic clock with the best available resolution
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class Registry(object):
+    """
+    Collection of metrics.
+    """
+    def __init__(self):
+        """
+        Init method of the Class.
+        """
+        self.metrics = list()
+
+    def register(self, metric):
+        """
+        Adds a metric to the registry.
+
+        Args:
+            metric: The metric object
+        """
+        self.metrics.append(metric)
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics
+        """
+        lines = list()
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for suffix, labels, value in metric.samples():
+                lines.append('%s%s%s %s' % (
+                    metric.name, suffix, _format_labels(labels), _format_value(value)
+                ))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(labels):
+    """
+    Returns the labels in the exposition format.
+    """
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        ) for name, value in labels
+    )
+
+
+def _format_value(value):
+    """
+    Returns the value in the exposition format.
+    """
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class Counter(object):
+    """
+    Monotonically increasing value.
+
+    Attributes:
+        name: Name of the metric
+        documentation: Description of the metric
+        labels: Names of the labels
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, labels=(), registry=REGISTRY):
+        """
+        Init method of the Class.
+
+        Args:
+            name: Name of the metric
+            documentation: Description of the metric
+            labels: Names of the labels
+            registry: Registry the metric is added to
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+        self._lock = threading.Lock()
+        self._values = dict()
+
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        """
+        Returns the values of the labels in the order they have been defined.
+        """
+        return tuple(str(labels[_]) for _ in self.labels)
+
+    def inc(self, amount=1, **labels):
+        """
+        Increases the value.
+
+        Args:
+            amount: The increment
+            **labels: Values of the labels
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """
+        Yields (suffix, labels, value) tuples.
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield '', list(zip(self.labels, key)), value
+
+
+class Gauge(Counter):
+    """
+    Value which can go up and down.
+    """
+    type = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        """
+        Decreases the value.
+
+        Args:
+            amount: The decrement
+            **labels: Values of the labels
+        """
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        """
+        Sets the value.
+
+        Args:
+            value: The new value
+            **labels: Values of the labels
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Counter):
+    """
+    Distribution of observed values over cumulative buckets.
+    """
+    type = 'histogram'
+
+    BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120)
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS, registry=REGISTRY):
+        """
+        Init method of the Class.
+
+        Args:
+            name: Name of the metric
+            documentation: Description of the metric
+            labels: Names of the labels
+            buckets: Upper bounds of the buckets, in increasing order
+            registry: Registry the metric is added to
+        """
+        super(Histogram, self).__init__(name, documentation, labels, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """
+        Records a value.
+
+        Args:
+            value: The observed value
+            **labels: Values of the labels
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket, plus +Inf, plus the sum of the values
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        """
+        Yields (suffix, labels, value) tuples.
+        """
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            labels = list(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'), ), counts):
+                cumulative += count
+                yield '_bucket', labels + [('le', _format_value(float(bound)))], cumulative
+            yield '_sum', labels, counts[-1]
+            yield '_count', labels, cumulative
+
+
+class Timer(object):
+    """
+    Durations of the stages of a single operation, for instance a request.
+
+    Durations are summed by stage and, when a histogram is given, observed into
+    it with the stage as an additional label.
+
+    Attributes:
+        stages: Dictionary mapping the names of the stages to seconds
+        timestamp: UNIX time the Timer has been created at
+    """
+    def __init__(self, histogram=None, **labels):
+        """
+        Init method of the Class.
+
+        Args:
+            histogram: Histogram with a stage label, if any
+            **labels: Values of the other labels of the histogram
+        """
+        self.stages = dict()
+        self.timestamp = time.time()
+        self._start = _clock()
+        self._histogram = histogram
+        self._labels = labels
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the time spent in the with block.
+
+        Args:
+            name: Name of the stage
+        """
+        start = _clock()
+        try:
+            yield
+        finally:
+            self.add(name, _clock() - start)
+
+    def elapsed(self):
+        """
+        Returns the seconds elapsed since the Timer has been created.
+        """
+        return _clock() - self._start
+
+    def add(self, name, seconds):
+        """
+        Records the time spent in a stage.
+
+        Args:
+            name: Name of the stage
+            seconds: Time spent in the stage
+        """
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0) + seconds
+        if self._histogram is not None:
+            self._histogram.observe(seconds, stage=name, **self._labels)
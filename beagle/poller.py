@@ -0,0 +1,289 @@
+"""
+Background refresh of command outputs, served as snapshots.
+
+The processes of the production server share a directory for each poller:
+the process holding the lock of the directory refreshes the snapshots and
+writes them in there, the others read them back in background every
+ELECTION_INTERVAL seconds. When that process dies the lock is dropped and
+another one takes over. Requests are always served from memory.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import heapq
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from beagle.metrics import Counter, Histogram
+from beagle.runtime import lock_file
+
+
+logger = logging.getLogger(__name__)
+
+poll_duration = Histogram(
+    'beagle_poller_duration_seconds',
+    'Time spent refreshing a snapshot',
+    ('router', 'command')
+)
+
+poll_errors = Counter(
+    'beagle_poller_errors_total',
+    'Snapshots which could not be refreshed',
+    ('router', 'command')
+)
+
+# Seconds between attempts to take the lock of the directory
+ELECTION_INTERVAL = 5
+
+
+class Poller(object):
+    """
+    Thread safe scheduler refreshing a snapshot for each key at a set interval.
+
+    Keys are tuples whose first two items are the router id and the command,
+    like the ones of the response cache. First refreshes are spread over the
+    interval, the following ones happen interval seconds plus a random jitter
+    after the previous refresh is done. At most workers refreshes run at the
+    same time. When a refresh fails the previous snapshot is kept.
+
+    With a directory, snapshots are refreshed by a single process at a time and
+    must be picklable.
+
+    Attributes:
+        interval: Seconds between refreshes of the same key, 0 disables the poller
+        jitter: Maximum amount of random seconds added to the interval
+        workers: Maximum amount of refreshes running at the same time
+        max_age: Seconds after which a snapshot is not served anymore
+        directory: Private directory sharing the snapshots with the other \
+        processes, None keeps them in memory
+    """
+    def __init__(self, interval=0, jitter=0, workers=4, max_age=300, directory=None):
+        """
+        Init method of the Class.
+
+        Args:
+            interval: Seconds between refreshes of the same key, 0 disables the poller
+            jitter: Maximum amount of random seconds added to the interval
+            workers: Maximum amount of refreshes running at the same time
+            max_age: Seconds after which a snapshot is not served anymore
+            directory: Private directory sharing the snapshots with the other processes
+        """
+        self.interval = interval
+        self.jitter = jitter
+        self.workers = workers
+        self.max_age = max_age
+        self.directory = directory
+
+        self._lock = threading.Condition()
+        # key: (value, timestamp, file). file tells apart the versions of a shared snapshot
+        self._snapshots = dict()
+        # Incremented on stop(), tells the scheduler threads of older runs to exit
+        self._generation = 0
+
+    def configure(self, interval=0, jitter=0, workers=4, max_age=300, directory=None):
+        """
+        Stops the poller, changes its settings and drops the snapshots.
+
+        Args:
+            interval: Seconds between refreshes of the same key, 0 disables the poller
+            jitter: Maximum amount of random seconds added to the interval
+            workers: Maximum amount of refreshes running at the same time
+            max_age: Seconds after which a snapshot is not served anymore
+            directory: Private directory sharing the snapshots with the other processes
+        """
+        self.stop()
+        with self._lock:
+            self.interval = interval
+            self.jitter = jitter
+            self.workers = workers
+            self.max_age = max_age
+            self.directory = directory
+            self._snapshots.clear()
+
+    @property
+    def enabled(self):
+        """
+        bool: True when snapshots are refreshed in background
+        """
+        return self.interval > 0
+
+    def start(self, keys, function):
+        """
+        Starts refreshing the snapshots in background, replacing the current run if any.
+
+        Args:
+            keys: List of the keys to be refreshed
+            function: Called with the key as argument, returns the new snapshot
+        """
+        self.stop()
+        if not self.enabled or not keys:
+            return
+
+        with self._lock:
+            generation = self._generation
+
+        target = self._schedule if self.directory is None else self._elect
+        thread = threading.Thread(target=target, args=(generation, list(keys), function))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """
+        Stops refreshing the snapshots. Refreshes already running are not interrupted.
+        """
+        with self._lock:
+            self._generation += 1
+            self._lock.notify_all()
+
+    def get(self, key):
+        """
+        Returns the snapshot for key.
+
+        Args:
+            key: The tuple identifying the snapshot
+
+        Returns:
+            tuple: The snapshot and its age in seconds. (None, None) if not found or too old
+        """
+        with self._lock:
+            item = self._snapshots.get(key)
+        if item is None:
+            return None, None
+
+        age = time.time() - item[1]
+        if age > self.max_age:
+            return None, None
+        return item[0], age
+
+    def _path(self, key):
+        """
+        Returns the path of the shared snapshot for key.
+        """
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+    def _read(self, generation, keys):
+        """
+        Reads back the shared snapshots replaced by another process since the last time.
+        """
+        for key in keys:
+            path = self._path(key)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                item = self._snapshots.get(key)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            version = (info.st_ino, info.st_mtime)
+            if time.time() - info.st_mtime > self.max_age or item is not None and item[2] == version:
+                continue
+
+            try:
+                with open(path, 'rb') as stream:
+                    value, timestamp = pickle.load(stream)
+            except Exception:
+                # Written by an older release, or removed in the meantime
+                logger.warning('Unable to read the snapshot of %s', key, exc_info=True)
+                continue
+
+            with self._lock:
+                if generation == self._generation:
+                    self._snapshots[key] = (value, timestamp, version)
+
+    def _write(self, key, item):
+        """
+        Replaces the shared snapshot for key.
+
+        Returns:
+            tuple: item, with the version of the file
+        """
+        path = self._path(key)
+        temporary = '%s.%d' % (path, os.getpid())
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+        with os.fdopen(descriptor, 'wb') as stream:
+            pickle.dump(item[:2], stream, pickle.HIGHEST_PROTOCOL)
+        os.rename(temporary, path)
+        info = os.stat(path)
+        return item[0], item[1], (info.st_ino, info.st_mtime)
+
+    def _elect(self, generation, keys, function):
+        """
+        Body of the election thread. Refreshes the snapshots while holding the lock
+        of the directory, reads back those of the process holding it otherwise.
+        """
+        while True:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                directory = self.directory
+            descriptor = lock_file(os.path.join(directory, 'lock'))
+            if descriptor is not None:
+                break
+            self._read(generation, keys)
+            with self._lock:
+                if generation == self._generation:
+                    self._lock.wait(ELECTION_INTERVAL)
+
+        logger.info('Refreshing the snapshots of %s', directory)
+        try:
+            self._schedule(generation, keys, function)
+        finally:
+            os.close(descriptor)
+
+    def _schedule(self, generation, keys, function):
+        """
+        Body of the scheduler thread. Submits the keys to the workers when they are due.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        now = time.time()
+        # (due timestamp, position, key). Positions prevent comparisons between keys
+        due = [(now + random.uniform(0, self.interval), _, key) for _, key in enumerate(keys)]
+        heapq.heapify(due)
+
+        try:
+            while True:
+                with self._lock:
+                    while generation == self._generation:
+                        now = time.time()
+                        if due and due[0][0] <= now:
+                            _, position, key = heapq.heappop(due)
+                            break
+                        self._lock.wait(due[0][0] - now if due else None)
+                    else:
+                        return
+                executor.submit(self._refresh, generation, due, position, key, function)
+        finally:
+            executor.shutdown(wait=False)
+
+    def _refresh(self, generation, due, position, key, function):
+        """
+        Refreshes the snapshot for key and schedules the next refresh.
+        """
+        start = time.time()
+        try:
+            item = (function(key), time.time(), None)
+            # Snapshots of a stopped run could be stale
+            if self.directory is not None and generation == self._generation:
+                item = self._write(key, item)
+            with self._lock:
+                if generation == self._generation:
+                    self._snapshots[key] = item
+        except Exception:
+            poll_errors.inc(router=key[0], command=key[1])
+            logger.warning('Unable to refresh %s', key, exc_info=True)
+        finally:
+            poll_duration.observe(time.time() - start, router=key[0], command=key[1])
+            with self._lock:
+                if generation == self._generation:
+                    heapq.heappush(due, (
+                        time.time() + self.interval + random.uniform(0, self.jitter), position, key
+                    ))
+                    self._lock.notify_all()
@@ -0,0 +1,290 @@
+"""
+Rate limiter counters shared by the processes running on the host.
+
+The counters of Flask-Limiter are kept by default in the memory of the
+process, hence every worker of the production server enforces the limits on
+its own. SharedMemoryStorage keeps them in a file mapped in memory by all the
+workers instead: it's registered in the limits package as the mmap:// scheme,
+for instance mmap:///var/run/beagle/limiter.
+
+The file is a fixed size hash table. Each slot holds the digest of a key, its
+counter and the time it expires at. Slots are found by linear probing, expired
+ones are reused. Every operation runs while holding an exclusive lock on the
+file, so that increments from different processes are never lost.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from urllib.parse import urlsplit, parse_qs
+except ImportError:
+    from urlparse import urlsplit, parse_qs
+
+from limits.storage import Storage, MemoryStorage
+
+from beagle.runtime import private_directory, runtime_directory
+
+
+MAGIC = b'BEAGLRL1'
+
+# Magic, amount of slots
+HEADER = struct.Struct('<8sQ')
+
+# Digest of the key, counter, expiry timestamp
+SLOT = struct.Struct('<16sqd')
+
+EMPTY = b'\x00' * 16
+
+# Slots looked at before evicting the one which expires first
+PROBES = 32
+
+
+def storage_uri(config):
+    """
+    Returns the URI of the storage of the rate limiter counters.
+
+    Unless the configuration sets one, the production server shares the
+    counters between its workers through a file in its private runtime
+    directory, the development server keeps them in memory.
+
+    Args:
+        config: Dictionary validated against configuration.yml
+
+    Returns:
+        str: The URI
+    """
+    if config['limiter']['storage']:
+        return config['limiter']['storage']
+
+    if config['server']['mode'] == 'production':
+        directory = private_directory(runtime_directory(config['port']))
+        return 'mmap://%s' % os.path.join(directory, 'limiter')
+
+    return 'memory://'
+
+
+class SharedMemoryStorage(Storage):
+    """
+    Rate limiter storage shared by the processes through a memory mapped file.
+
+    Attributes:
+        path: Path of the file
+        slots: Amount of counters the file can hold
+    """
+    # limits < 2 maps a single scheme to the class
+    if isinstance(MemoryStorage.STORAGE_SCHEME, list):
+        STORAGE_SCHEME = ['mmap']
+    else:
+        STORAGE_SCHEME = 'mmap'
+
+    def __init__(self, uri=None, slots=65536, **options):
+        """
+        Init method of the Class.
+
+        Args:
+            uri: mmap:///path/to/file, the amount of slots can be passed as query
+            slots: Amount of counters the file can hold, unless it exists already
+            **options: Passed to the base Class
+
+        Raises:
+            ImportError: fcntl is not available on the platform
+            IOError: The file is a symbolic link or belongs to somebody else
+        """
+        if fcntl is None:
+            raise ImportError('fcntl is required by the mmap:// rate limiter storage')
+
+        super(SharedMemoryStorage, self).__init__(uri, **options)
+
+        location = urlsplit(uri or 'mmap://')
+        query = parse_qs(location.query)
+        self.path = location.path or os.path.join(
+            private_directory(runtime_directory()), 'limiter'
+        )
+        slots = int(query.get('slots', [slots])[0])
+
+        self._lock = threading.Lock()
+        # The file is truncated when it's not a valid table, it must not be someone else's
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        if os.fstat(self._fd).st_uid != os.getuid():
+            os.close(self._fd)
+            raise IOError(errno.EPERM, 'The file belongs to another user', self.path)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self.slots = self._initialize(slots)
+            self._map = mmap.mmap(self._fd, HEADER.size + self.slots * SLOT.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _initialize(self, slots):
+        # Adopts the table created by another process, or creates a new one
+        header = os.read(self._fd, HEADER.size) if os.fstat(self._fd).st_size else b''
+        if len(header) == HEADER.size:
+            magic, existing = HEADER.unpack(header)
+            size = HEADER.size + existing * SLOT.size
+            if magic == MAGIC and existing and os.fstat(self._fd).st_size == size:
+                return existing
+
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, HEADER.size + slots * SLOT.size)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, HEADER.pack(MAGIC, slots))
+        return slots
+
+    @property
+    def base_exceptions(self):
+        return (IOError, OSError, ValueError)
+
+    def _locked(function):
+        def wrapper(self, *args, **kwargs):
+            with self._lock:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    return function(self, *args, **kwargs)
+                finally:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def _offset(self, index):
+        return HEADER.size + index * SLOT.size
+
+    def _find(self, key, now, create=False):
+        """
+        Looks up the slot of the key.
+
+        Args:
+            key: The key
+            now: Current timestamp
+            create: Returns a free slot for the key when it's not found
+
+        Returns:
+            tuple: Index of the slot and whether it holds a live counter for the key,
+                (None, False) when the key is not found and create is False
+        """
+        digest = hashlib.md5(key.encode('utf-8')).digest()
+        start = struct.unpack('<Q', digest[:8])[0] % self.slots
+
+        free = None
+        oldest = None
+        for probe in range(min(PROBES, self.slots)):
+            index = (start + probe) % self.slots
+            slot_digest, _, expiry = SLOT.unpack_from(self._map, self._offset(index))
+            if slot_digest == digest:
+                if expiry > now:
+                    return index, True
+                return (index, False) if create else (None, False)
+            if slot_digest == EMPTY:
+                # Keys are never stored past an empty slot
+                break
+            if expiry <= now and free is None:
+                free = index
+            if oldest is None or expiry < oldest[1]:
+                oldest = (index, expiry)
+        else:
+            index = None
+
+        if not create:
+            return None, False
+        if index is not None and free is None:
+            free = index
+        if free is None:
+            free = oldest[0]
+
+        SLOT.pack_into(self._map, self._offset(free), digest, 0, 0.0)
+        return free, False
+
+    @_locked
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        """
+        Increments the counter of the key.
+
+        Args:
+            key: The key
+            expiry: Seconds after which the counter expires
+            elastic_expiry: Pushes the expiry forward on every increment
+            amount: Amount to add to the counter
+
+        Returns:
+            int: The counter
+        """
+        now = time.time()
+        index, live = self._find(key, now, create=True)
+        offset = self._offset(index)
+        digest, counter, expires = SLOT.unpack_from(self._map, offset)
+        if not live:
+            counter, expires = 0, now + expiry
+        if elastic_expiry:
+            expires = now + expiry
+        SLOT.pack_into(self._map, offset, digest, counter + amount, expires)
+        return counter + amount
+
+    @_locked
+    def get(self, key):
+        """
+        Returns the counter of the key, 0 if it doesn't exist or is expired.
+        """
+        index, live = self._find(key, time.time())
+        if not live:
+            return 0
+        return SLOT.unpack_from(self._map, self._offset(index))[1]
+
+    @_locked
+    def get_expiry(self, key):
+        """
+        Returns the timestamp the counter of the key expires at.
+        """
+        now = time.time()
+        index, live = self._find(key, now)
+        if not live:
+            return now
+        return SLOT.unpack_from(self._map, self._offset(index))[2]
+
+    def check(self):
+        """
+        Returns True if the storage is usable.
+        """
+        return not self._map.closed
+
+    @_locked
+    def reset(self):
+        """
+        Clears all the counters.
+
+        Returns:
+            int: Amount of counters cleared
+        """
+        now = time.time()
+        cleared = 0
+        for index in range(self.slots):
+            digest, _, expiry = SLOT.unpack_from(self._map, self._offset(index))
+            if digest != EMPTY and expiry > now:
+                cleared += 1
+        self._map[HEADER.size:] = b'\x00' * (self.slots * SLOT.size)
+        return cleared
+
+    @_locked
+    def clear(self, key):
+        """
+        Clears the counter of the key.
+        """
+        index, live = self._find(key, time.time())
+        if live:
+            offset = self._offset(index)
+            digest = SLOT.unpack_from(self._map, offset)[0]
+            SLOT.pack_into(self._map, offset, digest, 0, 0.0)
+
+    del _locked
@@ -0,0 +1,133 @@
+"""
+Caching resolver for the hostnames provided by the clients.
+"""
+
+from __future__ import absolute_import
+
+import socket
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class Resolver(object):
+    """
+    Thread safe resolver with positive and negative cache and a deadline per lookup.
+
+    Lookups run in a bounded pool of threads, so that a slow DNS server can't
+    hold the workers for longer than timeout seconds. Concurrent lookups of the
+    same hostname share the same query. When the cache is full, the least
+    recently used hostnames are dropped first.
+
+    Attributes:
+        ttl: Seconds resolved addresses are cached for
+        negative_ttl: Seconds unknown hostnames are cached for
+        timeout: Seconds to wait for a lookup
+        size: Maximum amount of cached hostnames
+    """
+    def __init__(self, ttl=300, negative_ttl=60, timeout=2, size=4096, workers=4):
+        """
+        Init method of the Class.
+
+        Args:
+            ttl: Seconds resolved addresses are cached for
+            negative_ttl: Seconds unknown hostnames are cached for
+            timeout: Seconds to wait for a lookup
+            size: Maximum amount of cached hostnames
+            workers: Maximum amount of lookups running at the same time
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.size = size
+
+        self._lock = threading.Lock()
+        # (hostname, family): (expiration timestamp, address or None)
+        self._cache = OrderedDict()
+        # (hostname, family): future
+        self._pending = dict()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def configure(self, ttl=300, negative_ttl=60, timeout=2, size=4096):
+        """
+        Changes the resolver settings and drops the cached addresses.
+
+        Args:
+            ttl: Seconds resolved addresses are cached for
+            negative_ttl: Seconds unknown hostnames are cached for
+            timeout: Seconds to wait for a lookup
+            size: Maximum amount of cached hostnames
+        """
+        with self._lock:
+            self.ttl = ttl
+            self.negative_ttl = negative_ttl
+            self.timeout = timeout
+            self.size = size
+            self._cache.clear()
+
+    def resolve(self, hostname, family=socket.AF_INET):
+        """
+        Returns the address of hostname.
+
+        Args:
+            hostname: The hostname to be resolved
+            family: Address family, either socket.AF_INET or socket.AF_INET6
+
+        Returns:
+            str: The address
+
+        Raises:
+            SyntaxError: The hostname can't be resolved within timeout seconds
+        """
+        key = (hostname, family)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.time():
+                # Moves the entry to the end, OrderedDict.move_to_end() is not available on Python 2
+                self._cache[key] = self._cache.pop(key)
+                if entry[1] is None:
+                    raise SyntaxError("Unrecognized host or address: %s" % hostname)
+                return entry[1]
+
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._lookup, key)
+
+        try:
+            address = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise SyntaxError("Timed out resolving host: %s" % hostname)
+
+        if address is None:
+            raise SyntaxError("Unrecognized host or address: %s" % hostname)
+        return address
+
+    def _lookup(self, key):
+        """
+        Queries the DNS and stores the result in the cache.
+
+        Args:
+            key: Tuple (hostname, family)
+
+        Returns:
+            str: The address, None if the hostname doesn't exist
+        """
+        hostname, family = key
+        try:
+            address = socket.getaddrinfo(hostname, None, family, socket.SOCK_STREAM)[0][4][0]
+            ttl = self.ttl
+        except (socket.gaierror, socket.herror, UnicodeError, IndexError):
+            address = None
+            ttl = self.negative_ttl
+
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (time.time() + ttl, address)
+            # Least recently used items are on the left
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+            del self._pending[key]
+
+        return address
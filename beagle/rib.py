@@ -0,0 +1,247 @@
+"""
+In memory copies of the routing and BGP tables of the routers.
+
+Tables are stored in path-compressed binary tries (Patricia tries), one per
+address family, answering longest prefix match lookups without touching the
+routers.
+"""
+
+from __future__ import absolute_import
+
+import ipaddress
+import sys
+
+
+class _Node(object):
+    """
+    Node of the trie.
+
+    Attributes:
+        key: Network address as integer, host bits are 0
+        length: Prefix length
+        value: The value stored for the prefix, None for branching nodes
+        left: Child whose next bit is 0
+        right: Child whose next bit is 1
+    """
+    __slots__ = ('key', 'length', 'value', 'left', 'right')
+
+    def __init__(self, key, length, value=None):
+        self.key = key
+        self.length = length
+        self.value = value
+        self.left = None
+        self.right = None
+
+
+class RadixTrie(object):
+    """
+    Path-compressed binary trie mapping prefixes of a single address family to values.
+
+    Nodes only exist for the stored prefixes and for the points where two of
+    them branch, so the trie holds less than two nodes per prefix.
+
+    Attributes:
+        width: Amount of bits of the addresses, 32 for IPv4 and 128 for IPv6
+        prefixes: Amount of stored prefixes
+        nodes: Amount of nodes, including the branching ones
+    """
+    def __init__(self, width):
+        """
+        Init method of the Class.
+
+        Args:
+            width: Amount of bits of the addresses, 32 for IPv4 and 128 for IPv6
+        """
+        self.width = width
+        self.prefixes = 0
+        self.nodes = 1
+        self._root = _Node(0, 0)
+
+    def _bit(self, key, index):
+        """
+        Returns the bit of key at index, 0 being the most significant one.
+        """
+        return (key >> (self.width - 1 - index)) & 1
+
+    def _common(self, a, b, limit):
+        """
+        Returns the length of the common prefix of a and b, up to limit bits.
+        """
+        difference = a ^ b
+        if not difference:
+            return limit
+        return min(self.width - difference.bit_length(), limit)
+
+    def _attach(self, parent, child):
+        """
+        Attaches child to parent, on the side given by the bit following the parent prefix.
+        """
+        if self._bit(child.key, parent.length):
+            parent.right = child
+        else:
+            parent.left = child
+
+    def insert(self, key, length, value):
+        """
+        Stores value for the prefix key/length, replacing the previous value if any.
+
+        Args:
+            key: Network address as integer, host bits must be 0
+            length: Prefix length
+            value: The value, must not be None
+        """
+        node = self._root
+        while True:
+            if node.length == length:
+                if node.value is None:
+                    self.prefixes += 1
+                node.value = value
+                return
+
+            child = node.right if self._bit(key, node.length) else node.left
+            if child is None:
+                self._attach(node, _Node(key, length, value))
+                self.prefixes += 1
+                self.nodes += 1
+                return
+
+            common = self._common(child.key, key, min(child.length, length))
+            if common == child.length:
+                node = child
+                continue
+
+            if common == length:
+                # The new prefix covers the child
+                new = _Node(key, length, value)
+                self.nodes += 1
+            else:
+                # The new prefix and the child branch after common bits
+                mask = ((1 << common) - 1) << (self.width - common)
+                new = _Node(key & mask, common)
+                self._attach(new, _Node(key, length, value))
+                self.nodes += 2
+            self._attach(new, child)
+            self._attach(node, new)
+            self.prefixes += 1
+            return
+
+    def lookup(self, key, length=None):
+        """
+        Returns the longest stored prefix covering key/length.
+
+        Args:
+            key: Address as integer
+            length: Prefix length of the looked up network. None for an address
+
+        Returns:
+            tuple: key, length and value of the prefix. (None, None, None) if not found
+        """
+        if length is None:
+            length = self.width
+
+        best = None
+        node = self._root
+        while node is not None and node.length <= length:
+            shift = self.width - node.length
+            if node.length and key >> shift != node.key >> shift:
+                break
+            if node.value is not None:
+                best = node
+            if node.length == self.width:
+                break
+            node = node.right if self._bit(key, node.length) else node.left
+
+        if best is None:
+            return None, None, None
+        return best.key, best.length, best.value
+
+    def __len__(self):
+        return self.prefixes
+
+    def __getstate__(self):
+        # Pickling the linked nodes recurses for each of them and is slow, the
+        # nodes are flattened in preorder instead
+        nodes = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            nodes.append((node.key, node.length, node.value))
+            for child in (node.right, node.left):
+                if child is not None:
+                    stack.append(child)
+        return self.width, self.prefixes, self.nodes, nodes
+
+    def __setstate__(self, state):
+        self.width, self.prefixes, self.nodes, nodes = state
+
+        self._root = _Node(*nodes[0])
+        # Ancestors of the last node, each node follows its parent in preorder
+        stack = [self._root]
+        for key, length, value in nodes[1:]:
+            node = _Node(key, length, value)
+            while True:
+                parent = stack[-1]
+                shift = self.width - parent.length
+                if parent.length < length and key >> shift == parent.key >> shift:
+                    break
+                stack.pop()
+            self._attach(parent, node)
+            stack.append(node)
+
+
+class RibSnapshot(object):
+    """
+    Read-only copy of a table of a router, built at once from its entries.
+
+    Attributes:
+        header: Text to be shown before the entries, for instance column names
+        prefixes: Amount of prefixes
+        memory: Approximate amount of bytes used by the snapshot
+    """
+    def __init__(self, entries, header=''):
+        """
+        Init method of the Class.
+
+        Args:
+            entries: Iterable of (prefix, text) tuples. Later entries replace earlier ones
+            header: Text to be shown before the entries, for instance column names
+        """
+        self.header = header
+        self._tries = {4: RadixTrie(32), 6: RadixTrie(128)}
+
+        memory = sys.getsizeof(header)
+        for prefix, text in entries:
+            try:
+                network = ipaddress.ip_network(u'%s' % prefix, strict=False)
+            except ValueError:
+                continue
+            self._tries[network.version].insert(
+                int(network.network_address), network.prefixlen, text
+            )
+            memory += sys.getsizeof(text)
+
+        node = sys.getsizeof(_Node(0, 0))
+        self.prefixes = sum(len(_) for _ in self._tries.values())
+        self.memory = memory + node * sum(_.nodes for _ in self._tries.values())
+
+    def lookup(self, address):
+        """
+        Returns the entry of the longest prefix covering address.
+
+        Args:
+            address: Address or prefix
+
+        Returns:
+            tuple: The prefix and the text of its entry. (None, None) if not found
+
+        Raises:
+            ValueError: address is not an address or a prefix
+        """
+        network = ipaddress.ip_network(u'%s' % address, strict=False)
+        trie = self._tries[network.version]
+        key, length, text = trie.lookup(int(network.network_address), network.prefixlen)
+        if text is None:
+            return None, None
+
+        address_class = ipaddress.IPv4Address if network.version == 4 else ipaddress.IPv6Address
+        return '%s/%d' % (address_class(key), length), text
@@ -0,0 +1,116 @@
+"""
+Read-only registry of the routers, built when the configuration is loaded.
+"""
+
+from __future__ import absolute_import
+
+from collections import namedtuple
+
+from beagle.drivers import load_driver
+
+
+class Router(namedtuple('Router', (
+        'id', 'name', 'address', 'transport', 'location', 'asn',
+        'formats', 'vrfs', 'drivers', 'loopbacks'
+))):
+    """
+    A router from the configuration.
+
+    Attributes:
+        id: Identifier of the router, starting from 1
+        name: User friendly name of the router
+        address: Hostname or IP address of the router
+        transport: Transport protocol to connect to the device
+        location: The physical location of the router
+        asn: The ASN of the router
+        formats: Tuple of the names of the formats, in configuration order
+        vrfs: Tuple of the names of the VRFs, in configuration order
+        drivers: Dictionary mapping the formats to the primary classes of the drivers
+        loopbacks: Dictionary mapping the VRFs to the names of the loopback interfaces
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, router_id, router):
+        """
+        Returns the router for the dictionary from the configuration.
+
+        Args:
+            router_id: Identifier of the router
+            router: Router dictionary from the configuration
+
+        Returns:
+            obj: The Router object
+
+        Raises:
+            DriverError: A driver can't be loaded
+        """
+        return cls(
+            id=router_id,
+            name=router['name'],
+            address=router['address'],
+            transport=router['transport'],
+            location=router['location'],
+            asn=router['asn'],
+            formats=tuple(_['format'] for _ in router['formats']),
+            vrfs=tuple(_['name'] for _ in router['vrfs']),
+            # First match wins, as it did when the lists were scanned
+            drivers=dict(
+                (_['format'], load_driver(_['driver'], _['format'])) for _ in reversed(router['formats'])
+            ),
+            loopbacks=dict((_['name'], _['loopback']) for _ in reversed(router['vrfs']))
+        )
+
+
+class RouterRegistry(object):
+    """
+    Immutable collection of the routers, indexed by id.
+
+    Loading a new configuration swaps the whole collection at once, so readers
+    never see a partially built registry and never need a lock.
+    """
+    def __init__(self, routers=None):
+        """
+        Init method of the Class.
+
+        Args:
+            routers: List of router dictionaries from the configuration
+        """
+        self._routers = tuple()
+        if routers:
+            self.load(routers)
+
+    def load(self, routers):
+        """
+        Replaces the routers.
+
+        Args:
+            routers: List of router dictionaries from the configuration
+
+        Raises:
+            DriverError: A driver can't be loaded
+        """
+        self._routers = tuple(
+            Router.from_config(router_id, router) for router_id, router in enumerate(routers, 1)
+        )
+
+    def get(self, router_id):
+        """
+        Returns the router identified by router_id.
+
+        Args:
+            router_id: Identifier of the router
+
+        Returns:
+            obj: The Router object, None if the identifier is not valid
+        """
+        routers = self._routers
+        if not isinstance(router_id, int) or not 0 < router_id <= len(routers):
+            return None
+        return routers[router_id - 1]
+
+    def __iter__(self):
+        return iter(self._routers)
+
+    def __len__(self):
+        return len(self._routers)
@@ -0,0 +1,100 @@
+"""
+Private directory for the files shared by the processes of the server.
+
+The temporary directory is shared with the other users of the host, who can
+create files and directories with any name in it. Files shared by the workers
+are kept in a directory which belongs to the user running beagle and is not
+accessible by anybody else.
+
+Files of the directory also elect the processes doing a job on behalf of the
+others: an exclusive lock on a file is held by a single process at a time and
+is dropped by the kernel when the process dies.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import stat
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def runtime_directory(port=None):
+    """
+    Returns the path of the default private directory.
+
+    It's in $XDG_RUNTIME_DIR when set, in the temporary directory otherwise.
+
+    Args:
+        port: Port of the server, tells apart the servers run by the same user
+
+    Returns:
+        str: The path, see private_directory()
+    """
+    name = 'beagle-%d' % os.getuid()
+    if port is not None:
+        name += '-%d' % port
+    return os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), name)
+
+
+def private_directory(path):
+    """
+    Creates a directory accessible by the current user only, or checks that the existing one is.
+
+    Args:
+        path: Path of the directory
+
+    Returns:
+        str: The path
+
+    Raises:
+        IOError: The directory can't be created, or it belongs to somebody else, \
+        is accessible by other users or is a symbolic link
+    """
+    try:
+        os.makedirs(path, 0o700)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise IOError(errno.EPERM, 'Not a private directory of the current user', path)
+    return path
+
+
+def lock_file(path):
+    """
+    Takes the exclusive lock of a file without waiting, creating the file if needed.
+
+    Locks are held by the open file, hence two threads of the same process
+    can't hold the lock of a file at the same time either.
+
+    Args:
+        path: Path of the file, in a private directory
+
+    Returns:
+        int: The file descriptor holding the lock, closing it releases the lock. \
+        None if the lock is held by somebody else
+
+    Raises:
+        ImportError: fcntl is not available on the platform
+        OSError: The file can't be opened or is a symbolic link
+    """
+    if fcntl is None:
+        raise ImportError('fcntl is required by the locks shared by the processes')
+
+    descriptor = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError) as error:
+        os.close(descriptor)
+        if error.errno not in (errno.EAGAIN, errno.EACCES):
+            raise
+        return None
+    return descriptor
@@ -0,0 +1,101 @@
+"""
+Production server for the package.
+
+Runs the application under gunicorn: a pre-forking master process restarts
+workers which die or stop answering, each worker serves requests from a pool
+of threads. gunicorn is an optional dependency, install it with
+``pip install beagle[production]``.
+
+Workers are forked before the application is configured, so that the
+background threads of the pollers and of the resolver start in every worker.
+Sessions and caches are kept per worker. The workers share the slots of the
+concurrency limiter, the snapshots of the pollers and the loopback addresses
+through the private runtime directory: a single worker at a time refreshes the snapshots, the
+others read them back.
+
+Sending SIGHUP to the master reloads the configuration file and gracefully
+replaces the workers. SIGTERM stops the server gracefully.
+"""
+
+from __future__ import absolute_import
+
+from beagle.beagle import beagle, configure
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+def options(config):
+    """
+    Returns the gunicorn settings for the configuration.
+
+    Args:
+        config: Dictionary validated against configuration.yml
+
+    Returns:
+        dict: The settings
+    """
+    server = config['server']
+
+    # Workers running a command for runtime max seconds are not silent
+    timeout = server['timeout'] or config['runtime']['max'] + 30
+
+    return {
+        'bind': '%s:%d' % (config['host'], config['port']),
+        'worker_class': 'gthread',
+        'workers': server['workers'],
+        'threads': server['threads'],
+        'timeout': timeout,
+        'graceful_timeout': server['graceful_timeout'],
+        'keepalive': server['keepalive'],
+        'max_requests': server['max_requests'],
+        'max_requests_jitter': server['max_requests'] // 10,
+        'preload_app': False,
+        'loglevel': 'debug' if config['debug'] else 'info'
+    }
+
+
+if BaseApplication is not None:
+    class ProductionServer(BaseApplication):
+        """
+        gunicorn application reading its settings from the beagle configuration.
+
+        Attributes:
+            loader: Function returning the configuration. Called again on reload
+        """
+        def __init__(self, loader):
+            """
+            Init method of the Class.
+
+            Args:
+                loader: Function returning the configuration
+            """
+            self.loader = loader
+            super(ProductionServer, self).__init__()
+
+        def load_config(self):
+            for key, value in options(self.loader()).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Runs in the worker, after the fork
+            configure(self.loader())
+            return beagle
+
+
+def serve(loader):
+    """
+    Runs the production server until it's stopped.
+
+    Args:
+        loader: Function returning the configuration, called again on reload
+
+    Raises:
+        ImportError: gunicorn is not installed
+    """
+    if BaseApplication is None:
+        raise ImportError('gunicorn is required by the production server')
+
+    ProductionServer(loader).run()
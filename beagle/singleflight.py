@@ -0,0 +1,71 @@
+"""
+Coalescing of identical concurrent calls.
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+
+class _Call(object):
+    """
+    A call in flight.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs a function once for all the concurrent callers using the same key.
+
+    The first caller runs the function, the others wait for it and receive the
+    same result or exception.
+    """
+    def __init__(self):
+        """
+        Init method of the Class.
+        """
+        self._lock = threading.Lock()
+        self._calls = dict()
+
+    def do(self, key, function, *args):
+        """
+        Runs function(*args) unless a call with the same key is already in flight.
+
+        Args:
+            key: Hashable identifying the call
+            function: The function to be called
+            *args: Arguments for the function
+
+        Returns:
+            tuple: The result of the function and a boolean which is True when \
+            the result comes from a call made by another caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function(*args)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result, False
@@ -0,0 +1,290 @@
+"""
+Load generator for the benchmarks.
+
+Sends requests to the /api/v1 endpoints of a running beagle from several
+threads at once, then reports requests per second and p50/p95/p99 latencies
+for each endpoint. When the counters of the router simulators are given, it
+also reports the amount of sessions beagle opened towards them.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+
+try:
+    from http.client import HTTPConnection, HTTPException
+    from urllib.parse import urlencode, urlsplit
+    from urllib.request import urlopen
+except ImportError:
+    from httplib import HTTPConnection, HTTPException
+    from urllib import urlencode
+    from urllib2 import urlopen
+    from urlparse import urlsplit
+
+
+# Name: (path, takes the id of the router, extra arguments)
+ENDPOINTS = {
+    'ping': ('/api/v1/ping/{address}', True, {}),
+    'traceroute': ('/api/v1/traceroute/{address}', True, {}),
+    'show-route': ('/api/v1/show/route/{address}', True, {}),
+    'show-bgp-summary': ('/api/v1/show/bgp/summary', True, {}),
+    'show-bgp-neighbors': ('/api/v1/show/bgp/neighbors/{neighbor}', True, {}),
+    'show-bgp': ('/api/v1/show/bgp/{address}', True, {}),
+    'stream-ping': ('/api/v1/ping/{address}', True, {'stream': 1}),
+    'fanout-ping': ('/api/v1/fanout/ping/{address}', False, {}),
+    'fanout-traceroute': ('/api/v1/fanout/traceroute/{address}', False, {}),
+    'fanout-show-route': ('/api/v1/fanout/show/route/{address}', False, {}),
+    'fanout-show-bgp-summary': ('/api/v1/fanout/show/bgp/summary', False, {}),
+    'fanout-show-bgp-neighbors': ('/api/v1/fanout/show/bgp/neighbors/{neighbor}', False, {}),
+    'fanout-show-bgp': ('/api/v1/fanout/show/bgp/{address}', False, {}),
+    'routers': ('/api/v1/routers', False, {}),
+    'router': ('/api/v1/routers/{id}', False, {}),
+    'commands': ('/api/v1/commands', False, {})
+}
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a sorted list, None if the list is empty.
+    """
+    if not values:
+        return None
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def sessions(urls):
+    """
+    Returns the sum of the sessions opened so far on the simulators, None without simulators.
+    """
+    if not urls:
+        return None
+    total = 0
+    for url in urls:
+        total += json.loads(urlopen(url, timeout=10).read().decode('utf-8'))['sessions']
+    return total
+
+
+class Synchronized(object):
+    """
+    Iterator which can be shared between threads.
+    """
+    def __init__(self, iterator):
+        self._lock = threading.Lock()
+        self._iterator = iterator
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._iterator)
+
+    next = __next__
+
+
+class Results(object):
+    """
+    Thread safe collection of the latencies, by endpoint.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = dict()
+        self.errors = dict()
+        self.limited = dict()
+
+    def add(self, endpoint, latency, status):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            self.errors.setdefault(endpoint, 0)
+            self.limited.setdefault(endpoint, 0)
+            if status == 429:
+                self.limited[endpoint] += 1
+            elif status is None or status >= 400:
+                self.errors[endpoint] += 1
+
+
+class Worker(threading.Thread):
+    """
+    Sends requests over a persistent connection until the deadline or the budget is reached.
+    """
+    def __init__(self, settings, requests, budget, deadline, results):
+        super(Worker, self).__init__()
+        self.daemon = True
+        self.settings = settings
+        self.requests = requests
+        self.budget = budget
+        self.deadline = deadline
+        self.results = results
+        self._connection = None
+
+    def _path(self, endpoint):
+        path, per_router, extra = ENDPOINTS[endpoint]
+        router = random.choice(self.settings.ids)
+        if self.settings.random_addresses:
+            address = '1.%d.%d.1' % (random.randint(0, 255), random.randint(0, 255))
+        else:
+            address = self.settings.address
+        arguments = {'format': self.settings.format}
+        if not self.settings.cache:
+            arguments['cache'] = 0
+        if per_router:
+            arguments['id'] = router
+        elif endpoint.startswith('fanout-'):
+            arguments['ids'] = ','.join('%d' % _ for _ in self.settings.ids)
+        arguments.update(extra)
+        path = path.format(address=address, neighbor=self.settings.neighbor, id=router)
+        return '%s?%s' % (path, urlencode(arguments))
+
+    def _get(self, path):
+        if self._connection is None:
+            location = urlsplit(self.settings.url)
+            self._connection = HTTPConnection(location.netloc, timeout=self.settings.timeout)
+        try:
+            self._connection.request('GET', path)
+            response = self._connection.getresponse()
+            response.read()
+            return response.status
+        except (HTTPException, IOError):
+            self._connection.close()
+            self._connection = None
+            return None
+
+    def run(self):
+        while time.time() < self.deadline and next(self.budget) > 0:
+            endpoint = next(self.requests)
+            path = self._path(endpoint)
+            start = time.time()
+            status = self._get(path)
+            self.results.add(endpoint, time.time() - start, status)
+
+
+def report(results, elapsed, opened):
+    """
+    Returns the results as a dictionary.
+    """
+    endpoints = dict()
+    everything = []
+    for endpoint, latencies in sorted(results.latencies.items()):
+        latencies.sort()
+        everything.extend(latencies)
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'errors': results.errors[endpoint],
+            'rate_limited': results.limited[endpoint],
+            'requests_per_second': len(latencies) / elapsed,
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99)
+        }
+    everything.sort()
+    return {
+        'elapsed': elapsed,
+        'requests': len(everything),
+        'errors': sum(results.errors.values()),
+        'rate_limited': sum(results.limited.values()),
+        'requests_per_second': len(everything) / elapsed,
+        'p50': percentile(everything, 0.50),
+        'p95': percentile(everything, 0.95),
+        'p99': percentile(everything, 0.99),
+        'sessions_opened': opened,
+        'endpoints': endpoints
+    }
+
+
+def print_report(summary):
+    """
+    Prints the results as a table, latencies in milliseconds.
+    """
+    def milliseconds(value):
+        return '%9.1f' % (value * 1000) if value is not None else '%9s' % '-'
+
+    row = '%-26s %8s %7s %7s %9s %9s %9s %9s'
+    print(row % ('endpoint', 'requests', 'errors', '429', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    lines = sorted(summary['endpoints'].items()) + [('total', summary)]
+    for endpoint, values in lines:
+        print(row % (
+            endpoint, values['requests'], values['errors'], values['rate_limited'],
+            '%.1f' % values['requests_per_second'], milliseconds(values['p50']),
+            milliseconds(values['p95']), milliseconds(values['p99'])
+        ))
+    if summary['sessions_opened'] is not None:
+        print('router sessions opened: %d' % summary['sessions_opened'])
+
+
+def main():
+    """
+    Main function for the module.
+
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks a running beagle')
+    parser.add_argument('--url', default='http://127.0.0.1:5000',
+                        help='address of beagle (default: http://127.0.0.1:5000)')
+    parser.add_argument('--ids', default='1',
+                        help='IDs of the routers, divided by comma (default: 1)')
+    parser.add_argument('--endpoints', default=','.join(sorted(ENDPOINTS)),
+                        help='endpoints to be requested in turn, divided by comma (default: all)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='requests sent at the same time (default: 8)')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='seconds the benchmark lasts (default: 30)')
+    parser.add_argument('--requests', type=int, default=0,
+                        help='stop after this amount of requests, 0 means no limit (default: 0)')
+    parser.add_argument('--timeout', type=float, default=120,
+                        help='seconds after which a request is failed (default: 120)')
+    parser.add_argument('--address', default='1.0.0.1',
+                        help='address looked up by the commands (default: 1.0.0.1)')
+    parser.add_argument('--random-addresses', action='store_true',
+                        help='look up a random address of 1.0.0.0/8 for each request')
+    parser.add_argument('--neighbor', default='192.0.2.1',
+                        help='neighbor looked up by show bgp neighbors (default: 192.0.2.1)')
+    parser.add_argument('--format', default='text/plain', help='format requested (default: text/plain)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='ask beagle to run every command on the routers')
+    parser.add_argument('--stats', action='append', default=[],
+                        help='counters URL of a simulator, can be repeated')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    settings = parser.parse_args()
+
+    settings.ids = [int(_) for _ in settings.ids.split(',')]
+    endpoints = [_.strip() for _ in settings.endpoints.split(',') if _.strip()]
+    unknown = [_ for _ in endpoints if _ not in ENDPOINTS]
+    if unknown:
+        sys.exit('Unknown endpoints: %s' % ', '.join(unknown))
+
+    requests = Synchronized(itertools.cycle(endpoints))
+    if settings.requests:
+        budget = Synchronized(itertools.chain(range(settings.requests, 0, -1), itertools.repeat(0)))
+    else:
+        budget = itertools.repeat(1)
+
+    results = Results()
+    before = sessions(settings.stats)
+    start = time.time()
+    workers = [
+        Worker(settings, requests, budget, start + settings.duration, results)
+        for _ in range(settings.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    after = sessions(settings.stats)
+
+    summary = report(results, elapsed, after - before if settings.stats else None)
+    if settings.json:
+        print(json.dumps(summary, indent=4, sort_keys=True))
+    else:
+        print_report(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,540 @@
+"""
+Router simulator for the benchmarks.
+
+Listens for telnet and SSH sessions and behaves like an IOS or IOS-XR device
+to the beagle drivers: it asks for credentials, shows the prompt and answers
+the commands sent by the drivers with outputs shaped like the real ones.
+Login delay, per-command latency and output sizes are configurable, and the
+full routing and BGP tables can be made as big as the ones of a router
+carrying the Internet table.
+
+Counters of the sessions and of the commands are exposed as JSON over HTTP,
+so that the load generator can report how many sessions beagle opened.
+
+SSH requires paramiko, which is installed with Exscript.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+import ipaddress
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+PROMPTS = {
+    'ios': 'router#',
+    'iosxr': 'RP/0/RSP0/CPU0:router#'
+}
+
+ADDRESS_RE = re.compile(r'^[0-9A-Fa-f.:]+(?:/\d+)?$')
+LOOPBACK_RE = re.compile(r'^show (ipv4|ipv6) interface (\S+)')
+
+
+class Statistics(object):
+    """
+    Thread safe counters of the simulator.
+
+    Attributes:
+        sessions: Sessions which went through the login
+        active: Sessions currently open
+        commands: Commands answered
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sessions = 0
+        self.active = 0
+        self.commands = 0
+
+    def opened(self):
+        with self._lock:
+            self.sessions += 1
+            self.active += 1
+
+    def closed(self):
+        with self._lock:
+            self.active -= 1
+
+    def command(self):
+        with self._lock:
+            self.commands += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'sessions': self.sessions,
+                'active': self.active,
+                'commands': self.commands
+            }
+
+
+class Outputs(object):
+    """
+    Generates the outputs of the commands for a flavor of router.
+
+    Tables are generated once and reused, as building multi megabyte outputs
+    for each command would measure the simulator instead of beagle.
+
+    Attributes:
+        flavor: ios or iosxr
+        prefixes: Amount of prefixes of the full routing and BGP tables
+        neighbors: Amount of BGP neighbors
+        size: Minimum size in bytes of the outputs of the other commands
+    """
+    def __init__(self, flavor='ios', prefixes=1000, neighbors=10, size=0):
+        self.flavor = flavor
+        self.prefixes = prefixes
+        self.neighbors = neighbors
+        self.size = size
+
+        self._lock = threading.Lock()
+        self._tables = dict()
+
+    def _networks(self, afi):
+        """
+        Yields prefixes/length tuples spread over the unicast space of afi.
+        """
+        rng = random.Random(afi)
+        for index in range(self.prefixes):
+            # Networks are 1024 addresses (IPv4) or a /48 (IPv6) apart, so they never overlap
+            if afi == 4:
+                length = rng.choice((22, 23, 24, 24, 24))
+                network = ipaddress.IPv4Network(((0x01000000 + (index << 10)) & 0xffffffff, length))
+            else:
+                length = rng.choice((48, 48, 56, 64))
+                network = ipaddress.IPv6Network(((0x2001 << 112) | (index << 80), length))
+            yield network
+
+    def _pad(self, text):
+        """
+        Pads text with comment lines up to the configured size.
+        """
+        padding = []
+        missing = self.size - len(text)
+        index = 0
+        while missing > 0:
+            line = '! padding line %d of the simulated output' % index
+            padding.append(line)
+            missing -= len(line) + 2
+            index += 1
+        if padding:
+            text += '\r\n' + '\r\n'.join(padding)
+        return text
+
+    def _table(self, kind, afi):
+        """
+        Returns the full routing (kind route) or BGP (kind bgp) table for afi.
+        """
+        with self._lock:
+            if (kind, afi) in self._tables:
+                return self._tables[(kind, afi)]
+
+            lines = []
+            if kind == 'route':
+                lines.append('Codes: C - connected, S - static, B - BGP, O - OSPF')
+                lines.append('')
+                lines.append('Gateway of last resort is 192.0.2.1 to network 0.0.0.0')
+                lines.append('')
+                for index, network in enumerate(self._networks(afi)):
+                    lines.append('B    %s [20/0] via 192.0.2.%d, 3w2d' % (network, index % 250 + 1))
+            else:
+                lines.append('BGP router identifier 192.0.2.254, local AS number 64496')
+                lines.append('')
+                lines.append('   Network          Next Hop            Metric LocPrf Weight Path')
+                for index, network in enumerate(self._networks(afi)):
+                    network = '%s' % network
+                    if len(network) > 16:
+                        lines.append('*> %s' % network)
+                        network = ''
+                    lines.append('*> %-16s 192.0.2.%-11d %6d %6d %6d 6449%d %d i' % (
+                        network, index % 250 + 1, 0, 100, 0, index % 10, 64500 + index % 500
+                    ))
+                    lines.append('*  %-16s 192.0.2.%-11d %6d %6d %6d 6449%d i' % (
+                        '', (index + 1) % 250 + 1, 0, 100, 0, (index + 1) % 10
+                    ))
+                lines.append('')
+                lines.append('Processed %d prefixes, %d paths' % (self.prefixes, self.prefixes * 2))
+
+            self._tables[(kind, afi)] = '\r\n'.join(lines)
+            return self._tables[(kind, afi)]
+
+    def _summary(self):
+        lines = [
+            'BGP router identifier 192.0.2.254, local AS number 64496',
+            'BGP table version is 1000, main routing table version 1000',
+            '',
+            'Neighbor        V           AS MsgRcvd MsgSent   TblVer  InQ OutQ  Up/Down  State/PfxRcd'
+        ]
+        for index in range(self.neighbors):
+            lines.append('192.0.2.%-7d 4 %12d %7d %7d %8d %4d %4d %8s %12d' % (
+                index + 1, 64497 + index, 1000 + index, 900 + index, 1000, 0, 0, '3w2d',
+                self.prefixes // max(self.neighbors, 1)
+            ))
+        return '\r\n'.join(lines)
+
+    def _bgp_prefix(self, prefix):
+        return '\r\n'.join([
+            'BGP routing table entry for %s, version 1000' % prefix,
+            'Paths: (2 available, best #1, table default)',
+            '  Advertised to update-groups:',
+            '     1',
+            '  64497 64500',
+            '    192.0.2.1 (metric 10) from 192.0.2.1 (192.0.2.1)',
+            '      Origin IGP, metric 0, localpref 100, valid, external, best',
+            '      Community: 64496:100 64496:200',
+            '  64498 64500',
+            '    192.0.2.2 (metric 20) from 192.0.2.2 (192.0.2.2)',
+            '      Origin IGP, metric 0, localpref 100, valid, external',
+            '      Community: 64496:100'
+        ])
+
+    def _route(self, prefix):
+        return '\r\n'.join([
+            'Routing entry for %s' % prefix,
+            '  Known via "bgp 64496", distance 20, metric 0',
+            '  Tag 64497, type external',
+            '  Last update from 192.0.2.1 3w2d ago',
+            '  Routing Descriptor Blocks:',
+            '  * 192.0.2.1, from 192.0.2.1, 3w2d ago',
+            '      Route metric is 0, traffic share count is 1',
+            '      AS Hops 2'
+        ])
+
+    def _neighbor(self, address):
+        return '\r\n'.join([
+            'BGP neighbor is %s,  remote AS 64497, external link' % address,
+            '  BGP version 4, remote router ID %s' % address,
+            '  BGP state = Established, up for 3w2d',
+            '  Last read 00:00:12, last write 00:00:18, hold time is 180, keepalive interval is 60 seconds',
+            '  Message statistics:',
+            '    InQ depth is 0',
+            '    OutQ depth is 0'
+        ])
+
+    def _ping(self, address):
+        return '\r\n'.join([
+            'Type escape sequence to abort.',
+            'Sending 5, 100-byte ICMP Echos to %s, timeout is 2 seconds:' % address,
+            '!!!!!',
+            'Success rate is 100 percent (5/5), round-trip min/avg/max = 1/1/2 ms'
+        ])
+
+    def _traceroute(self, address):
+        lines = [
+            'Type escape sequence to abort.',
+            'Tracing the route to %s' % address,
+            ''
+        ]
+        for hop in range(1, 9):
+            lines.append('  %d 198.51.100.%d %d msec %d msec %d msec' % (hop, hop, hop, hop, hop + 1))
+        lines.append('  9 %s 9 msec 9 msec 10 msec' % address)
+        return '\r\n'.join(lines)
+
+    def _loopback(self, afi, interface):
+        if afi == 'ipv4':
+            return '\r\n'.join([
+                '%s is up, line protocol is up' % interface,
+                '  Internet address is 192.0.2.254/32'
+            ])
+        return '\r\n'.join([
+            '%s is up, line protocol is up' % interface,
+            '  IPv6 is enabled, link-local address is fe80::1',
+            '  Global unicast address(es):',
+            '    2001:db8::254, subnet is 2001:db8::254/128'
+        ])
+
+    def answer(self, command):
+        """
+        Returns the output of command, None if the command is not recognized.
+        """
+        words = command.split()
+        if not words:
+            return ''
+        last = words[-1]
+        afi = 6 if 'ipv6' in words or ':' in last else 4
+
+        match = LOOPBACK_RE.match(command)
+        if match:
+            return self._loopback(*match.groups())
+        if words[0] == 'ping':
+            return self._pad(self._ping(words[words.index('source') - 1] if 'source' in words else last))
+        if words[0] == 'traceroute':
+            return self._pad(self._traceroute(words[words.index('source') - 1] if 'source' in words else last))
+        if words[0] != 'show' or len(words) < 2:
+            return None
+        if 'summary' in words:
+            return self._pad(self._summary())
+        if 'neighbors' in words:
+            return self._pad(self._neighbor(last))
+        if 'route' in words:
+            if ADDRESS_RE.match(last):
+                return self._pad(self._route(last))
+            return self._table('route', afi)
+        if words[1] == 'bgp':
+            if ADDRESS_RE.match(last):
+                return self._pad(self._bgp_prefix(last))
+            return self._table('bgp', afi)
+        return None
+
+
+class Session(object):
+    """
+    The command line of a simulated router, on top of a byte stream.
+
+    Args:
+        read: Function returning the next byte, empty when the stream is closed
+        write: Function sending bytes
+        settings: Parsed command line arguments of the simulator
+        outputs: Outputs object
+        statistics: Statistics object
+        authenticate: Asks for credentials, False when the transport already did
+    """
+    def __init__(self, read, write, settings, outputs, statistics, authenticate=True):
+        self.read = read
+        self.write = write
+        self.settings = settings
+        self.outputs = outputs
+        self.statistics = statistics
+        self.authenticate = authenticate
+        self.prompt = PROMPTS[settings.flavor]
+        self._skip_lf = False
+
+    def _line(self):
+        """
+        Returns the next line sent by the client. Lines end with CR, LF or CRLF.
+        """
+        buffer = bytearray()
+        while True:
+            char = self.read()
+            if not char:
+                raise EOFError()
+            if char == b'\xff':
+                # Telnet negotiation, discarded
+                self.read()
+                self.read()
+                continue
+            if char == b'\n' and self._skip_lf:
+                self._skip_lf = False
+                continue
+            self._skip_lf = char == b'\r'
+            if char in (b'\r', b'\n'):
+                return buffer.decode('utf-8', 'replace')
+            if char != b'\x00':
+                buffer.extend(char)
+
+    def _send(self, text):
+        self.write(text.encode('utf-8'))
+
+    def _output(self, text):
+        """
+        Sends text after the configured latency, in chunks like a real terminal.
+        """
+        latency = self.settings.latency + random.uniform(0, self.settings.jitter)
+        if latency > 0:
+            time.sleep(latency)
+        data = text.encode('utf-8')
+        for start in range(0, len(data), 16384):
+            self.write(data[start:start + 16384])
+
+    def run(self):
+        """
+        Runs the session until the client exits or disconnects.
+        """
+        try:
+            if self.authenticate:
+                self._send('\r\nUser Access Verification\r\n\r\nUsername: ')
+                self._send(self._line() + '\r\nPassword: ')
+                self._line()
+            if self.settings.login_delay > 0:
+                time.sleep(self.settings.login_delay)
+            self.statistics.opened()
+        except (EOFError, socket.error):
+            return
+
+        try:
+            self._send('\r\n' + self.prompt)
+            while True:
+                command = self._line().strip()
+                self._send(command + '\r\n')
+                if command in ('exit', 'quit', 'logout'):
+                    return
+                # Already privileged, the terminal settings are implied
+                if command and command != 'enable' and not command.startswith(('terminal', 'term ')):
+                    self.statistics.command()
+                    output = self.outputs.answer(command)
+                    if output is None:
+                        output = "% Invalid input detected at '^' marker."
+                    if output:
+                        self._output(output + '\r\n')
+                self._send(self.prompt)
+        except (EOFError, socket.error):
+            pass
+        finally:
+            self.statistics.closed()
+
+
+class ThreadingServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def telnet_server(settings, outputs, statistics):
+    """
+    Returns the telnet server, not started yet.
+    """
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            stream = self.request.makefile('rb', 0)
+            Session(
+                lambda: stream.read(1), self.request.sendall, settings, outputs, statistics
+            ).run()
+
+    return ThreadingServer((settings.bind, settings.telnet_port), Handler)
+
+
+def ssh_server(settings, outputs, statistics):
+    """
+    Returns the SSH server, not started yet.
+    """
+    import paramiko
+
+    if settings.host_key:
+        host_key = paramiko.RSAKey(filename=settings.host_key)
+    else:
+        host_key = paramiko.RSAKey.generate(2048)
+
+    class Interface(paramiko.ServerInterface):
+        def __init__(self):
+            self.shell = threading.Event()
+
+        def check_channel_request(self, kind, chanid):
+            if kind == 'session':
+                return paramiko.OPEN_SUCCEEDED
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+        def get_allowed_auths(self, username):
+            return 'password'
+
+        def check_auth_password(self, username, password):
+            return paramiko.AUTH_SUCCESSFUL
+
+        def check_channel_pty_request(self, *args):
+            return True
+
+        def check_channel_shell_request(self, channel):
+            self.shell.set()
+            return True
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            transport = paramiko.Transport(self.request)
+            transport.add_server_key(host_key)
+            interface = Interface()
+            try:
+                transport.start_server(server=interface)
+                channel = transport.accept(30)
+                if channel is None or not interface.shell.wait(30):
+                    return
+                Session(
+                    lambda: channel.recv(1), channel.sendall, settings, outputs, statistics,
+                    authenticate=False
+                ).run()
+            except (EOFError, socket.error, paramiko.SSHException):
+                pass
+            finally:
+                transport.close()
+
+    return ThreadingServer((settings.bind, settings.ssh_port), Handler)
+
+
+def statistics_server(settings, statistics):
+    """
+    Returns the HTTP server exposing the counters, not started yet.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(statistics.as_dict()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', '%d' % len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return HTTPServer((settings.bind, settings.stats_port), Handler)
+
+
+def main():
+    """
+    Main function for the module.
+
+    Starts the telnet, SSH and statistics servers
+    """
+    parser = argparse.ArgumentParser(description='Simulates IOS and IOS-XR routers')
+    parser.add_argument('--flavor', choices=sorted(PROMPTS), default='ios',
+                        help='kind of router simulated (default: ios)')
+    parser.add_argument('--bind', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--telnet-port', type=int, default=23,
+                        help='telnet port, 0 disables telnet (default: 23)')
+    parser.add_argument('--ssh-port', type=int, default=0,
+                        help='SSH port, 0 disables SSH (default: 0)')
+    parser.add_argument('--host-key', help='RSA host key for SSH, generated if not set')
+    parser.add_argument('--stats-port', type=int, default=8023,
+                        help='HTTP port of the counters, 0 disables them (default: 8023)')
+    parser.add_argument('--login-delay', type=float, default=0,
+                        help='seconds spent before showing the first prompt (default: 0)')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds spent before each output (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='maximum random seconds added to the latency (default: 0)')
+    parser.add_argument('--output-size', type=int, default=0,
+                        help='minimum size in bytes of the outputs, tables excluded (default: 0)')
+    parser.add_argument('--table-prefixes', type=int, default=1000,
+                        help='prefixes of the full routing and BGP tables (default: 1000)')
+    parser.add_argument('--neighbors', type=int, default=10,
+                        help='amount of BGP neighbors (default: 10)')
+    settings = parser.parse_args()
+
+    statistics = Statistics()
+    outputs = Outputs(settings.flavor, settings.table_prefixes, settings.neighbors, settings.output_size)
+
+    servers = []
+    if settings.telnet_port:
+        servers.append(telnet_server(settings, outputs, statistics))
+    if settings.ssh_port:
+        servers.append(ssh_server(settings, outputs, statistics))
+    if settings.stats_port:
+        servers.append(statistics_server(settings, statistics))
+    if not servers:
+        sys.exit('Nothing to listen on')
+
+    for server in servers:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        sys.stderr.write('Listening on %s:%d\n' % server.server_address[:2])
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,9 @@ setup(
 		'html/*'
 	]},
 	install_requires=reqs,
+	extras_require={
+		'production': ['gunicorn>=19.9'],
+	},
 	include_package_data=True,
 	entry_points={
 		'console_scripts': [